@@ -0,0 +1,30 @@
+"""Limits and helpers for creating many quotes at once (``POST /api/quotes/bulk``, imports).
+
+Every item is validated on its own and reported by its index, so a bad row
+does not stop the good ones; the valid quotes are then written in batches of
+:data:`BULK_BATCH_SIZE` rows per INSERT instead of one round trip each.
+"""
+import os
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Mapping, TypeVar
+
+BULK_MAX_QUOTES = int(os.environ.get('BULK_MAX_QUOTES', '5000'))
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', '500'))
+BULK_TOO_MANY = f'Máximo {BULK_MAX_QUOTES} cotizaciones por solicitud'
+
+# Summed into total_cost whenever a quote is created
+COST_FIELDS = ('facility_fee', 'equipment_costs', 'anesthesia_fee', 'other_costs')
+
+T = TypeVar('T')
+
+
+def chunked(items: Iterable[T], size: int = BULK_BATCH_SIZE) -> Iterator[List[T]]:
+    """Split ``items`` (any iterable, read lazily) into lists of ``size``."""
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def total_cost(quote: Mapping[str, Any]) -> float:
+    """Sum of the cost fields of a quote, as create_quote computes it; ValueError/TypeError if one is not a number."""
+    return sum(float(quote.get(field) or 0) for field in COST_FIELDS)
@@ -0,0 +1,125 @@
+"""Procedure and surgeon catalogs: the distinct names of the quotes, for pickers.
+
+An entry's key is the fold()ed name (see :mod:`.search`), which the Django
+quotes already carry (``procedure_name_search``/``surgeon_name_search``).
+So near-duplicates such as "Apendicectomía" and "apendicectomia" are one
+entry, shown with the spelling seen first. Both backends count quotes in and out of the catalogs
+on every write, and bump a catalog's version only when one of its entries
+appears or goes away.
+
+Autocomplete is answered from a :class:`PrefixIndex` of each catalog kept
+in memory by every worker (:class:`CatalogIndex`) and rebuilt only when
+the catalog's version changes: a binary search, not a query.
+"""
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .search import fold
+
+DEFAULT_AUTOCOMPLETE_LIMIT = 10
+MAX_AUTOCOMPLETE_LIMIT = 50
+
+
+def name_counts(names: Iterable[Optional[str]]) -> Dict[str, Tuple[str, int]]:
+    """``{key: (name as first seen, number of times)}`` of ``names``; empty ones are left out."""
+    counts = Counter()
+    first = {}
+    for name in names:
+        key = fold(name)
+        if key:
+            counts[key] += 1
+            first.setdefault(key, name.strip())
+    return {key: (first[key], count) for key, count in counts.items()}
+
+
+def autocomplete_limit(limit: Optional[str]) -> int:
+    """Parse a ``limit`` parameter, capped at ``MAX_AUTOCOMPLETE_LIMIT``. ValueError if it is not a positive integer."""
+    if limit in (None, ''):
+        return DEFAULT_AUTOCOMPLETE_LIMIT
+    try:
+        size = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError('limit debe ser un número entero') from None
+    if size < 1:
+        raise ValueError('limit debe ser mayor que cero')
+    return min(size, MAX_AUTOCOMPLETE_LIMIT)
+
+
+class PrefixIndex:
+    """Catalog names found by a prefix of the name, or of any of its words.
+
+    Keys and their word suffixes ("dr. perez lopez", "perez lopez", "lopez")
+    are kept in sorted lists, so a lookup is a bisect plus ``limit`` steps.
+    Whole-name matches come first, then the others, each alphabetically.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        """``entries``: ``(key, name)`` pairs, keys fold()ed."""
+        entries = sorted(entries)
+        suffixes = sorted(
+            (' '.join(words[i:]), key, name)
+            for key, name in entries
+            for words in [key.split(' ')]
+            for i in range(1, len(words))
+        )
+        self._keys = [key for key, _ in entries]
+        self._names = [name for _, name in entries]
+        self._suffixes = [suffix for suffix, _, _ in suffixes]
+        self._suffix_entries = [(key, name) for _, key, name in suffixes]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def names(self) -> List[str]:
+        """Every name, sorted by key."""
+        return list(self._names)
+
+    def search(self, prefix: str, limit: int = DEFAULT_AUTOCOMPLETE_LIMIT) -> List[str]:
+        prefix = fold(prefix)
+        if not prefix:
+            return self._names[:limit]
+        results = []
+        seen = set()
+        start = bisect_left(self._keys, prefix)
+        for key, name in zip(self._keys[start:start + limit], self._names[start:start + limit]):
+            if not key.startswith(prefix):
+                break
+            results.append(name)
+            seen.add(key)
+        position = bisect_left(self._suffixes, prefix)
+        while len(results) < limit and position < len(self._suffixes) and self._suffixes[position].startswith(prefix):
+            key, name = self._suffix_entries[position]
+            if key not in seen:
+                results.append(name)
+                seen.add(key)
+            position += 1
+        return results
+
+
+class CatalogIndex:
+    """An index of one catalog in this process, tagged with the catalog version it was built from.
+
+    A :class:`PrefixIndex` by default; ``build`` makes another kind of index
+    from the ``(key, name)`` entries (e.g. :class:`~.trigrams.TrigramIndex`).
+
+    Callers read the catalog's current version (one indexed lookup), and
+    reload the entries only when :meth:`stale` says so::
+
+        if index.stale(version):
+            index.update(version, entries)
+        index.current.search(prefix)
+    """
+
+    def __init__(self, build=PrefixIndex):
+        self._build = build
+        self.version = None
+        self.current = build([])
+
+    def stale(self, version) -> bool:
+        return version != self.version
+
+    def update(self, version, entries: Iterable[Tuple[str, str]]):
+        # Swapped in whole, so concurrent readers see the old index or the new one
+        self.current = self._build(entries)
+        self.version = version
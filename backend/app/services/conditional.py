@@ -0,0 +1,56 @@
+"""Validators for conditional GETs of quote resources.
+
+A quote's ETag is derived from its ``version``, bumped by every write to it;
+the ETag of a list of quotes (or of the dashboard) from the quotes change
+counter, bumped by every write to any quote, and the request's parameters.
+Both are cheap to read, so a client whose copy is current gets its 304
+before any quote is loaded or serialized.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag (quoted) of the representation identified by ``parts``."""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _utc(value: datetime) -> datetime:
+    # Mongo hands back naive datetimes that are in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_utc(value), usegmt=True)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header lists ``etag`` (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(','))
+    return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}
+
+
+def is_fresh(if_none_match: Optional[str], if_modified_since: Optional[str], etag: str,
+             last_modified: Optional[datetime] = None) -> bool:
+    """Whether the client's copy is current, so a GET can be answered 304.
+
+    If-Modified-Since only counts when there is no If-None-Match.
+    """
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have whole seconds
+    return _utc(last_modified).replace(microsecond=0) <= _utc(since)
@@ -0,0 +1,248 @@
+"""Background PDF import jobs.
+
+An upload is written to ``IMPORT_JOBS_DIR`` and recorded in a local SQLite
+job table, and the HTTP request returns the job id right away. An
+:class:`ImportJobRunner` then extracts the PDF in a worker process,
+reporting pages as they are done, and hands the parsed quote to a
+stack-specific ``save`` callback. Both ``server.py`` and the Django ``quotes``
+app use this module, so neither needs an outside queue service.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+
+from .pdf_service import process_pdf, spool_to_disk
+
+IMPORT_JOBS_DIR = Path(os.environ.get('IMPORT_JOBS_DIR', Path(__file__).resolve().parents[2] / 'data' / 'import_jobs'))
+IMPORT_JOB_WORKERS = int(os.environ.get('IMPORT_JOB_WORKERS', str(os.cpu_count() or 1)))
+# Jobs left in "processing" longer than this (e.g. by a killed worker) are picked up again
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get('IMPORT_JOB_STALE_SECONDS', '900'))
+
+QUEUED = 'queued'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    quote_id TEXT,
+    result TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+)
+"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ImportJobStore:
+    """SQLite table of import jobs plus the directory holding their uploaded files."""
+
+    def __init__(self, directory: Path = IMPORT_JOBS_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / 'jobs.sqlite3'
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def file_path(self, job_id: str) -> Path:
+        return self.directory / f'{job_id}.pdf'
+
+    def create(self, filename: str, fileobj: BinaryIO) -> Dict[str, Any]:
+        """Record a queued job for an upload; raises ``UploadTooLarge`` for oversized files."""
+        job_id = str(uuid.uuid4())
+        os.replace(spool_to_disk(fileobj, str(self.directory)), self.file_path(job_id))
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO import_jobs (id, filename, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, filename, QUEUED, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM import_jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def claim(self, job_id: str) -> bool:
+        """Move a queued job to processing; False if another worker got it first."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE import_jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?',
+                (PROCESSING, _now(), job_id, QUEUED),
+            )
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id: str):
+        """Put a claimed job back in the queue, e.g. when it could not be started."""
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE import_jobs SET state = ?, updated_at = ? WHERE id = ? AND state = ?',
+                (QUEUED, _now(), job_id, PROCESSING),
+            )
+
+    def set_progress(self, job_id: str, pages_done: int, pages_total: int):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE import_jobs SET pages_done = ?, pages_total = ?, updated_at = ? WHERE id = ?',
+                (pages_done, pages_total, _now(), job_id),
+            )
+
+    def finish(self, job_id: str, result: Dict[str, Any], quote_id: Optional[str] = None):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE import_jobs SET state = ?, quote_id = ?, result = ?, updated_at = ? WHERE id = ?',
+                (DONE if result['success'] else FAILED, quote_id, json.dumps(result), _now(), job_id),
+            )
+        try:
+            self.file_path(job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def pending(self) -> List[str]:
+        """Queued jobs plus processing jobs that have not moved in ``IMPORT_JOB_STALE_SECONDS``."""
+        stale = datetime.fromtimestamp(time.time() - IMPORT_JOB_STALE_SECONDS, timezone.utc).isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE import_jobs SET state = ? WHERE state = ? AND updated_at < ?',
+                (QUEUED, PROCESSING, stale),
+            )
+            rows = conn.execute('SELECT id FROM import_jobs WHERE state = ? ORDER BY created_at', (QUEUED,)).fetchall()
+        return [row['id'] for row in rows]
+
+
+def run_import_job(store_directory: str, job_id: str) -> Dict[str, Any]:
+    """Extract and parse the file of one job; runs in a worker process."""
+    store = ImportJobStore(store_directory)
+    job = store.get(job_id)
+    return process_pdf(
+        (job['filename'], str(store.file_path(job_id))),
+        on_page=lambda done, total: store.set_progress(job_id, done, total),
+    )
+
+
+class ImportJobRunner:
+    """Runs import jobs on a process pool and saves each parsed quote with ``save``.
+
+    ``save(quote_data)`` stores a successfully parsed quote and returns its id.
+    It is called from a pool callback thread, not from the request that
+    created the job.
+    """
+
+    def __init__(self, store: ImportJobStore, save: Callable[[Dict[str, Any]], str], max_workers: int = IMPORT_JOB_WORKERS):
+        self.store = store
+        self.save = save
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._resumed = False
+
+    def create(self, filename: str, fileobj: BinaryIO) -> Dict[str, Any]:
+        """Store an upload as a new job and start processing it."""
+        job = self.store.create(filename, fileobj)
+        self.submit(job['id'])
+        return job
+
+    def _live_pool(self, broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+        # Called with the lock held. As in PDFWorkQueue, a worker that dies
+        # (OOM kill) breaks the pool for good: drop it and start a new one
+        pool = self._pool
+        if pool is not None and (pool is broken or pool._broken):
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = pool = None
+        if pool is None:
+            self._pool = pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return pool
+
+    def resume(self):
+        """Start the jobs a previous run left queued, or stuck processing after a crash.
+
+        Call at startup, so jobs clients are already polling go on without
+        waiting for a new upload; only the first call does anything, unless
+        a job could not be started since.
+        """
+        with self._lock:
+            if self._resumed:
+                return
+            self._resumed = True
+        for job_id in self.store.pending():
+            self._start(job_id)
+
+    def submit(self, job_id: str):
+        self.resume()
+        self._start(job_id)
+
+    def _start(self, job_id: str):
+        if not self.store.claim(job_id):
+            return
+        try:
+            with self._lock:
+                pool = self._live_pool()
+            try:
+                future = pool.submit(run_import_job, str(self.store.directory), job_id)
+            except BrokenExecutor:
+                # Broke since it was checked: once more, on a new pool
+                with self._lock:
+                    pool = self._live_pool(broken=pool)
+                future = pool.submit(run_import_job, str(self.store.directory), job_id)
+        except Exception:
+            # Queued again rather than left processing; the next submit resumes it
+            self.store.requeue(job_id)
+            with self._lock:
+                self._resumed = False
+            raise
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+
+    def _finish(self, job_id: str, future):
+        quote_id = None
+        try:
+            result = future.result()
+        except Exception as e:
+            logging.error(f"Error processing import job {job_id}: {e}")
+            result = {"success": False, "message": f"Error procesando PDF: {str(e)}", "extracted_data": None, "errors": [str(e)], "cache_hit": False}
+        if result["success"]:
+            try:
+                quote_id = self.save(result["extracted_data"])
+            except Exception as e:
+                logging.error(f"Error saving quote from import job {job_id}: {e}")
+                result.update(success=False, message="Error validando datos", errors=[str(e)])
+        self.store.finish(job_id, {
+            "success": result["success"],
+            "message": result["message"],
+            "quotes_created": 1 if quote_id else 0,
+            "extracted_data": result["extracted_data"],
+            "errors": result["errors"],
+            "cache_hit": result["cache_hit"],
+        }, quote_id)
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
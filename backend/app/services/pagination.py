@@ -0,0 +1,48 @@
+"""Keyset pagination helpers shared by the FastAPI and Django quote listings.
+
+Quotes are listed newest first, ordered by ``(created_at, id)`` descending.
+A page ends with an opaque cursor that encodes the key of its last quote;
+the next page starts strictly after that key, so each page costs one index
+range scan no matter how deep it is.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised for a ``cursor`` or ``limit`` that cannot be used."""
+
+
+def encode_cursor(created_at, quote_id) -> str:
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps([created_at, str(quote_id)], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Return the ``(created_at isoformat, id)`` key encoded in ``cursor``."""
+    try:
+        created_at, quote_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Cursor inválido') from None
+    return created_at, str(quote_id)
+
+
+def page_size(limit: Optional[str]) -> int:
+    """Parse a ``limit`` parameter, capped at ``MAX_PAGE_SIZE``."""
+    if limit in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidCursor('limit debe ser un número entero') from None
+    if size < 1:
+        raise InvalidCursor('limit debe ser mayor que cero')
+    return min(size, MAX_PAGE_SIZE)
@@ -0,0 +1,122 @@
+"""Content-addressed cache of PDF extraction results.
+
+Uploads are keyed by the SHA-256 of their bytes together with the extraction
+mode and the layout templates in use (see ``pdf_service.extraction_key``), as
+both can limit the text that is read. Each entry keeps the text pdfplumber
+extracted and the ``quote_data`` parsed from it, tagged with the
+``RULES_VERSION`` of the parser that produced it. A repeat upload skips
+extraction entirely; after a rules change only the (cheap) parse is redone.
+
+Entries live in a local SQLite file so every API worker and worker process
+shares them, and the least recently used entries are evicted beyond
+``PDF_CACHE_MAX_ENTRIES`` (``0`` disables the cache).
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+PDF_CACHE_PATH = Path(os.environ.get('PDF_CACHE_PATH', Path(__file__).resolve().parents[2] / 'data' / 'pdf_cache.sqlite3'))
+PDF_CACHE_MAX_ENTRIES = int(os.environ.get('PDF_CACHE_MAX_ENTRIES', '1000'))
+
+_SCHEMA = (
+    # Entries keyed by the content hash alone may hold early-exit or template text
+    'DROP TABLE IF EXISTS pdf_cache',
+    """
+    CREATE TABLE IF NOT EXISTS pdf_extractions (
+        key TEXT PRIMARY KEY,
+        text TEXT NOT NULL,
+        rules_version TEXT,
+        quote_data TEXT,
+        last_used REAL NOT NULL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS pdf_extractions_last_used ON pdf_extractions (last_used)',
+)
+
+
+def content_hash(source) -> str:
+    """SHA-256 of raw bytes, a file path or a seekable binary file, read in chunks."""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PDFCache:
+    """LRU cache of ``key -> (text, rules_version, quote_data)`` in SQLite."""
+
+    def __init__(self, path: Path = PDF_CACHE_PATH, max_entries: int = PDF_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            if not self._ready:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with sqlite3.connect(self.path, timeout=30) as conn:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    for statement in _SCHEMA:
+                        conn.execute(statement)
+                self._ready = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[str], Optional[Dict[str, Any]]]]:
+        """Return ``(text, rules_version, quote_data)`` and mark the entry as used."""
+        if not self.enabled:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute('SELECT text, rules_version, quote_data FROM pdf_extractions WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    return None
+                conn.execute('UPDATE pdf_extractions SET last_used = ? WHERE key = ?', (time.time(), key))
+        except (sqlite3.Error, OSError) as e:
+            # A broken cache must never fail an upload; fall back to extracting
+            logging.warning(f"PDF cache lookup failed: {e}")
+            return None
+        text, rules_version, quote_data = row
+        return text, rules_version, json.loads(quote_data) if quote_data else None
+
+    def put(self, key: str, text: str, rules_version: str, quote_data: Dict[str, Any]):
+        if not self.enabled:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO pdf_extractions (key, text, rules_version, quote_data, last_used) VALUES (?, ?, ?, ?, ?)',
+                    (key, text, rules_version, json.dumps(quote_data), time.time()),
+                )
+                conn.execute(
+                    'DELETE FROM pdf_extractions WHERE key IN '
+                    '(SELECT key FROM pdf_extractions ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,),
+                )
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"PDF cache store failed: {e}")
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM pdf_extractions')
+
+
+pdf_cache = PDFCache()
@@ -1,211 +1,557 @@
 import pdfplumber
 import io
-import re
+import json
+import os
 import logging
-from typing import Dict, Any
+import tempfile
+import threading
+import zipfile
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, Future, ProcessPoolExecutor, wait
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-def extract_text_from_pdf(pdf_content: bytes) -> str:
-    """Extract text from PDF using pdfplumber"""
+from .pdf_cache import PDFCache, content_hash, pdf_cache
+from .pdf_templates import TemplateRegistry, pdf_templates
+from .quote_parser import PARSED_COST_FIELDS, REQUIRED_FIELDS, RULES_VERSION, missing_required, parse_quote_from_text
+from .sandbox import SANDBOX_AVAILABLE, SandboxCrashed, SandboxMemoryError, SandboxTimeout, iter_limited, run_limited
+
+# Upper bound on the PDFs accepted by one batch upload (loose files or ZIP members)
+MAX_BATCH_FILES = int(os.environ.get('PDF_BATCH_MAX_FILES', '500'))
+
+# Largest single PDF accepted, and largest request body of a batch upload
+PDF_MAX_UPLOAD_BYTES = int(os.environ.get('PDF_MAX_UPLOAD_MB', '50')) * 1024 * 1024
+PDF_MAX_BATCH_UPLOAD_BYTES = int(os.environ.get('PDF_MAX_BATCH_UPLOAD_MB', '1024')) * 1024 * 1024
+# Multipart framing around the file itself when checking Content-Length
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+# Admission control for PDF uploads: PDFs processed at once per API worker,
+# how many more may wait for a free slot, and the Retry-After sent beyond that
+PDF_MAX_CONCURRENCY = int(os.environ.get('PDF_MAX_CONCURRENCY', str(os.cpu_count() or 1)))
+PDF_MAX_QUEUE = int(os.environ.get('PDF_MAX_QUEUE', str(PDF_MAX_CONCURRENCY * 2)))
+PDF_RETRY_AFTER_SECONDS = int(os.environ.get('PDF_RETRY_AFTER_SECONDS', '5'))
+
+# Stop reading pages once procedure, duration and costs have all been found
+PDF_EARLY_EXIT = os.environ.get('PDF_EARLY_EXIT', 'False').lower() in ('1', 'true', 'yes')
+# Characters of the previous page searched together with each new page when
+# looking for fields page by page, so fields split across a page break count
+PAGE_OVERLAP = 500
+
+# Fields reported by streamed extraction as soon as they are recognized; the
+# three fees are reported together as "costs"
+STREAMED_FIELDS = (
+    "patient_id", "patient_age", "patient_phone", "patient_email",
+    "procedure_name", "surgeon_name", "surgery_duration_hours", "anesthesia_type",
+)
+
+# Per-document extraction budget. Extraction runs in a child process that is
+# killed past the deadline or the memory allowance; PDF_SANDBOX=False runs it
+# in-process (only the page limit then applies)
+PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', '500'))
+PDF_EXTRACT_TIMEOUT_SECONDS = float(os.environ.get('PDF_EXTRACT_TIMEOUT_SECONDS', '60'))
+PDF_EXTRACT_MEMORY_BYTES = int(os.environ.get('PDF_EXTRACT_MEMORY_MB', '1024')) * 1024 * 1024
+PDF_SANDBOX = SANDBOX_AVAILABLE and os.environ.get('PDF_SANDBOX', 'True').lower() in ('1', 'true', 'yes')
+
+# A PDF handed to the pipeline: raw bytes, a path on disk or a seekable binary file
+PDFSource = Union[bytes, str, os.PathLike, BinaryIO]
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds ``PDF_MAX_UPLOAD_BYTES``."""
+
+class PDFBudgetExceeded(Exception):
+    """Raised when a PDF goes over the page, time or memory budget of one document."""
+
+def spool_to_disk(fileobj: BinaryIO, directory: Optional[str] = None, max_bytes: Optional[int] = None,
+                  suffix: str = '.pdf') -> str:
+    """Copy ``fileobj`` to a temporary file in chunks and return its path.
+
+    Stops reading and removes the partial copy as soon as ``max_bytes``
+    (default ``PDF_MAX_UPLOAD_BYTES``) is exceeded. The caller owns (and must
+    delete) the returned file.
+    """
+    max_bytes = max_bytes or PDF_MAX_UPLOAD_BYTES
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=suffix, delete=False) as target:
+        written = 0
+        try:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge()
+                target.write(chunk)
+        except BaseException:
+            target.close()
+            os.unlink(target.name)
+            raise
+    return target.name
+
+def _open_pdf(source: PDFSource):
+    if isinstance(source, bytes):
+        pdf = pdfplumber.open(io.BytesIO(source))
+    else:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        pdf = pdfplumber.open(source)
+    if len(pdf.pages) > PDF_MAX_PAGES:
+        pdf.close()
+        raise PDFBudgetExceeded(f"El PDF tiene más de {PDF_MAX_PAGES} páginas")
+    return pdf
+
+def iter_page_text(pdf_content: PDFSource, on_page: Optional[Callable[[int, int], None]] = None) -> Iterator[str]:
+    """Yield the text of each page in order, extracting lazily.
+
+    Pages without a text layer yield ``""``. ``on_page(pages_done, pages_total)``
+    is called as each page is extracted.
+    """
+    with _open_pdf(pdf_content) as pdf:
+        total = len(pdf.pages)
+        for number, page in enumerate(pdf.pages, start=1):
+            text = page.extract_text() or ""
+            # Drop the page's parsed objects so long documents don't pile them up
+            page.flush_cache()
+            if on_page:
+                on_page(number, total)
+            yield text
+
+def _page_window(pages: List[str]) -> str:
+    """The last page plus the tail of the one before it."""
+    return pages[-2][-PAGE_OVERLAP:] + "\n" + pages[-1] if len(pages) > 1 else pages[-1]
+
+def extract_text_from_pdf(pdf_content: PDFSource, on_page: Optional[Callable[[int, int], None]] = None, early_exit: Optional[bool] = None) -> str:
+    """Extract text from PDF using pdfplumber
+
+    ``on_page(pages_done, pages_total)`` is called after each page. With
+    ``early_exit`` (default ``PDF_EARLY_EXIT``) the remaining pages are skipped
+    as soon as every field in ``REQUIRED_FIELDS`` has been seen.
+    """
+    if early_exit is None:
+        early_exit = PDF_EARLY_EXIT
+    pages = []
     try:
-        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
+        found = set()
+        for text in iter_page_text(pdf_content, on_page):
+            pages.append(text)
+            if early_exit:
+                found.update(set(REQUIRED_FIELDS) - set(missing_required(parse_quote_from_text(_page_window(pages)))))
+                if len(found) == len(REQUIRED_FIELDS):
+                    break
+    except (PDFBudgetExceeded, MemoryError):
+        raise
     except Exception as e:
         logging.error(f"Error extracting text from PDF: {e}")
         return ""
+    return "\n".join(pages)
+
+def extract_template_text(pdf_content: PDFSource, templates: Optional[TemplateRegistry] = None) -> Optional[Tuple[str, int]]:
+    """Return ``(text, pages_total)`` from the regions of a known layout, or ``None`` for unknown ones."""
+    templates = templates or pdf_templates
+    if not templates.templates:
+        return None
+    try:
+        with _open_pdf(pdf_content) as pdf:
+            template = templates.match(pdf)
+            if template is None:
+                return None
+            return templates.extract(pdf, template), len(pdf.pages)
+    except (PDFBudgetExceeded, MemoryError):
+        raise
+    except Exception as e:
+        logging.error(f"Error extracting PDF template regions: {e}")
+        return None
+
+def _extract_text(pdf_content: PDFSource, on_page: Optional[Callable[[int, int], None]], templates: Optional[TemplateRegistry]) -> str:
+    from_template = extract_template_text(pdf_content, templates)
+    if from_template:
+        text, pages_total = from_template
+        if not missing_required(parse_quote_from_text(text)):
+            if on_page:
+                on_page(pages_total, pages_total)
+            return text
+    return extract_text_from_pdf(pdf_content, on_page)
+
+@contextmanager
+def _budget_errors():
+    try:
+        yield
+    except SandboxTimeout:
+        raise PDFBudgetExceeded(f"La extracción superó el tiempo límite de {PDF_EXTRACT_TIMEOUT_SECONDS:g} segundos") from None
+    except SandboxMemoryError:
+        raise PDFBudgetExceeded(f"La extracción superó el límite de memoria de {PDF_EXTRACT_MEMORY_BYTES // (1024 * 1024)} MB") from None
+    except SandboxCrashed as e:
+        raise PDFBudgetExceeded(f"La extracción terminó inesperadamente ({e})") from None
+
+def extract_text_within_budget(pdf_content: PDFSource, on_page: Optional[Callable[[int, int], None]] = None, templates: Optional[TemplateRegistry] = None) -> str:
+    """Extract the text of a PDF (from its template regions for known layouts) within the per-document budget.
+
+    Raises :class:`PDFBudgetExceeded` for documents over ``PDF_MAX_PAGES``,
+    ``PDF_EXTRACT_TIMEOUT_SECONDS`` or ``PDF_EXTRACT_MEMORY_MB``.
+    """
+    if not PDF_SANDBOX:
+        return _extract_text(pdf_content, on_page, templates)
+    with _budget_errors():
+        return run_limited(
+            _extract_text, pdf_content, on_page, templates,
+            timeout=PDF_EXTRACT_TIMEOUT_SECONDS, memory_bytes=PDF_EXTRACT_MEMORY_BYTES,
+        )
+
+def recognized_fields(quote_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The ``STREAMED_FIELDS`` (and ``costs``) that ``quote_data`` has values for."""
+    fields = {name: quote_data[name] for name in STREAMED_FIELDS if quote_data.get(name)}
+    if "costs" not in missing_required(quote_data):
+        fields["costs"] = {name: quote_data.get(name, 0) for name in PARSED_COST_FIELDS}
+    return fields
+
+def iter_extraction_events(pdf_content: PDFSource, templates: Optional[TemplateRegistry] = None) -> Iterator[Tuple[str, Any]]:
+    """Extract a PDF page by page, yielding progress as it goes.
+
+    Yields ``("page", {"page", "pages_total"})`` after each page and
+    ``("field", {"field", "value", "page"})`` the first time a field is
+    recognized, then ``("text", full_text)`` last. Known layouts are read from
+    their template regions in one step.
+    """
+    from_template = extract_template_text(pdf_content, templates)
+    if from_template:
+        text, pages_total = from_template
+        quote_data = parse_quote_from_text(text)
+        if not missing_required(quote_data):
+            yield "page", {"page": pages_total, "pages_total": pages_total}
+            for field, value in recognized_fields(quote_data).items():
+                yield "field", {"field": field, "value": value, "page": None}
+            yield "text", text
+            return
+
+    progress = [0, 0]
+
+    def on_page(done, total):
+        progress[:] = [done, total]
+
+    pages = []
+    seen = set()
+    for text in iter_page_text(pdf_content, on_page):
+        pages.append(text)
+        page, pages_total = progress
+        yield "page", {"page": page, "pages_total": pages_total}
+        for field, value in recognized_fields(parse_quote_from_text(_page_window(pages))).items():
+            if field not in seen:
+                seen.add(field)
+                yield "field", {"field": field, "value": value, "page": page}
+    yield "text", "\n".join(pages)
+
+def _iter_extraction_within_budget(pdf_content: PDFSource, templates: Optional[TemplateRegistry] = None) -> Iterator[Tuple[str, Any]]:
+    if not PDF_SANDBOX:
+        yield from iter_extraction_events(pdf_content, templates)
+        return
+    with _budget_errors():
+        yield from iter_limited(
+            iter_extraction_events, pdf_content, templates,
+            timeout=PDF_EXTRACT_TIMEOUT_SECONDS, memory_bytes=PDF_EXTRACT_MEMORY_BYTES,
+        )
+
+def extraction_key(pdf_content: PDFSource, templates: Optional[TemplateRegistry] = None) -> str:
+    """PDF cache key: the content hash plus the settings the extracted text depends on.
+
+    Early exit and template regions give less than the full text, so text
+    extracted with another mode or another set of templates is never reused.
+    """
+    mode = 'early-exit' if PDF_EARLY_EXIT else 'full'
+    return f"{content_hash(pdf_content)}:{mode}:{(templates or pdf_templates).fingerprint()}"
+
+def _cached_quote(cache: PDFCache, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    cached = cache.get(key)
+    if not cached:
+        return None
+    text, rules_version, quote_data = cached
+    if rules_version != RULES_VERSION or quote_data is None:
+        quote_data = parse_quote_from_text(text)
+        cache.put(key, text, RULES_VERSION, quote_data)
+    return text, quote_data
+
+def extract_and_parse(pdf_content: PDFSource, on_page: Optional[Callable[[int, int], None]] = None, cache: Optional[PDFCache] = None, templates: Optional[TemplateRegistry] = None) -> Tuple[str, Optional[Dict[str, Any]], bool]:
+    """Return ``(text, quote_data, cache_hit)`` for a PDF, reusing cached work for identical bytes.
+
+    Known layouts are read from their template regions only; when that misses
+    a required field the whole document is extracted instead. ``quote_data``
+    is ``None`` when no text could be extracted.
+    """
+    cache = cache or pdf_cache
+    key = extraction_key(pdf_content, templates)
+    cached = _cached_quote(cache, key)
+    if cached:
+        return cached + (True,)
+
+    text = extract_text_within_budget(pdf_content, on_page, templates)
+    if not text.strip():
+        return text, None, False
+    quote_data = parse_quote_from_text(text)
+    cache.put(key, text, RULES_VERSION, quote_data)
+    return text, quote_data, False
 
-def parse_quote_from_text(text: str) -> Dict[str, Any]:
-    """Parse quote information from extracted text using regex patterns"""
-    quote_data = {
-        "patient_id": None,
-        "patient_age": None,
-        "patient_phone": None,
-        "patient_email": None,
-        "procedure_name": "",
-        "procedure_code": None,
-        "procedure_description": None,
-        "surgeon_name": "",
-        "surgeon_specialty": None,
-        "facility_fee": 0.0,
-        "equipment_costs": 0.0,
-        "anesthesia_fee": 0.0,
-        "other_costs": 0.0,
-        "surgery_duration_hours": 0,
-        "anesthesia_type": "",
-        "additional_equipment": [],
-        "additional_materials": [],
-        "is_ambulatory": True,
-        "hospital_nights": 0,
-        "created_by": "Importación PDF",
-        "notes": "Cotización importada desde PDF",
-        "surgical_package": {
-            "medications_included": [],
-            "postoperative_care": [],
-            "hospital_stay_nights": 0,
-            "special_equipment": [],
-            "dietary_plan": False,
-            "additional_services": []
-        }
-    }
-    
-    # Clean text for better parsing
-    text = text.replace('\n', ' ').replace('\t', ' ')
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    # Patient ID patterns
-    patient_id_patterns = [
-        r'(?:paciente|patient|id|expediente|número)[\s:]*([A-Z0-9\-]+)',
-        r'ID[\s:]*([A-Z0-9\-]+)',
-        r'No\.?\s*([A-Z0-9\-]+)'
-    ]
-    for pattern in patient_id_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            quote_data["patient_id"] = match.group(1).strip()
-            break
-    
-    # Age patterns
-    age_patterns = [
-        r'(?:edad|age|años)[\s:]*(\d{1,3})',
-        r'(\d{1,3})\s*(?:años|years old)'
-    ]
-    for pattern in age_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            quote_data["patient_age"] = int(match.group(1))
-            break
-    
-    # Phone patterns
-    phone_patterns = [
-        r'(?:teléfono|telefono|phone|tel)[\s:]*([0-9\-\s\(\)]+)',
-        r'(\(?[0-9]{3}\)?[-.\s]?[0-9]{3}[-.\s]?[0-9]{4})'
-    ]
-    for pattern in phone_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            phone = re.sub(r'[^\d]', '', match.group(1))
-            if len(phone) >= 10:
-                quote_data["patient_phone"] = match.group(1).strip()
-            break
-    
-    # Email patterns
-    email_pattern = r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-    match = re.search(email_pattern, text)
-    if match:
-        quote_data["patient_email"] = match.group(1).strip()
-    
-    # Procedure name patterns
-    procedure_patterns = [
-        r'(?:procedimiento|procedure|cirugía|surgery|operación)[\s:]*([^$\d\n]{10,80})',
-        r'(?:reemplazo|replacement|bypass|apendicectomía|appendectomy)[\s\w]*',
-        r'(?:artroscopia|laparoscopia|endoscopia)[\s\w]*'
-    ]
-    for pattern in procedure_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            procedure = match.group(0).strip()
-            if len(procedure) > 5:
-                quote_data["procedure_name"] = procedure[:80]
-                break
-    
-    # Surgeon name patterns
-    surgeon_patterns = [
-        r'(?:dr\.?|doctor|dra\.?|doctora|cirujano|surgeon)[\s]*([A-Za-záéíóúñÁÉÍÓÚÑ\s]{5,40})',
-        r'médico[\s:]*([A-Za-záéíóúñÁÉÍÓÚÑ\s]{5,40})'
-    ]
-    for pattern in surgeon_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            surgeon = match.group(1).strip()
-            if len(surgeon) > 3:
-                quote_data["surgeon_name"] = surgeon[:40]
-                break
-    
-    # Duration patterns
-    duration_patterns = [
-        r'(?:duración|duration|tiempo)[\s:]*(\d+)[\s]*(?:horas?|hours?|hrs?)',
-        r'(\d+)[\s]*(?:horas?|hours?|hrs?)[\s]*(?:de[\s]*)?(?:cirugía|surgery|operación)',
-        r'(?:cirugía|surgery)[\s]*(?:de[\s]*)?(\d+)[\s]*(?:horas?|hours?|hrs?)'
-    ]
-    for pattern in duration_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
+class TooManyBatchFiles(Exception):
+    """Raised when a batch upload holds more than ``MAX_BATCH_FILES`` files."""
+
+def spool_batch(uploads: Iterable[Tuple[str, BinaryIO]], directory: str, max_files: int = MAX_BATCH_FILES,
+                max_bytes: int = PDF_MAX_BATCH_UPLOAD_BYTES) -> List[Tuple[str, Optional[str]]]:
+    """Return ``(filename, pdf_path)`` for every uploaded PDF and every PDF inside an uploaded ZIP.
+
+    Each PDF is spooled to its own file in ``directory``. Files that are
+    neither come with ``None`` so the caller can report them in the per-file
+    results. Raises :class:`TooManyBatchFiles` beyond ``max_files`` entries,
+    counting a ZIP's members from its directory before anything is extracted,
+    and ``UploadTooLarge`` once a PDF exceeds ``PDF_MAX_UPLOAD_BYTES`` or the
+    PDFs written exceed ``max_bytes`` in all (ZIP members are counted as they
+    decompress, so a small archive cannot fill the disk).
+    """
+    items = []
+    written = 0
+
+    def spool(stream: BinaryIO) -> str:
+        nonlocal written
+        remaining = max_bytes - written
+        if remaining <= 0:
+            raise UploadTooLarge()
+        path = spool_to_disk(stream, directory, min(PDF_MAX_UPLOAD_BYTES, remaining))
+        written += os.path.getsize(path)
+        return path
+
+    def add(filename: str, stream: Optional[BinaryIO] = None):
+        if len(items) >= max_files:
+            raise TooManyBatchFiles()
+        items.append((filename, spool(stream) if stream is not None else None))
+
+    for filename, fileobj in uploads:
+        name = filename.lower()
+        if name.endswith('.pdf'):
+            add(filename, fileobj)
+        elif name.endswith('.zip'):
             try:
-                hours = int(match.group(1))
-                if 1 <= hours <= 24:
-                    quote_data["surgery_duration_hours"] = hours
-                    break
-            except:
+                archive = zipfile.ZipFile(fileobj)
+            except zipfile.BadZipFile:
+                add(filename)
                 continue
-    
-    # Anesthesia type patterns
-    anesthesia_patterns = [
-        r'(?:anestesia|anesthesia)[\s]*(?:general|epidural|regional|local|sedación)',
-        r'(?:bloqueo|block)[\s]*(?:epidural|regional)',
-        r'(?:sedación|sedation)[\s]*(?:básica|basic)?'
-    ]
-    for pattern in anesthesia_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            quote_data["anesthesia_type"] = match.group(0).strip()
-            break
-    
-    # Cost patterns (Mexican Pesos)
-    cost_patterns = {
-        "facility_fee": [
-            r'(?:instalaciones|facilities|hospital)[\s:$]*(\$?[\d,]+\.?\d*)',
-            r'(?:costo.*hospital)[\s:$]*(\$?[\d,]+\.?\d*)'
-        ],
-        "equipment_costs": [
-            r'(?:equipos|equipment|instrumental)[\s:$]*(\$?[\d,]+\.?\d*)',
-            r'(?:materiales|supplies)[\s:$]*(\$?[\d,]+\.?\d*)'
-        ],
-        "anesthesia_fee": [
-            r'(?:anestesia|anesthesia)[\s:$]*(\$?[\d,]+\.?\d*)'
-        ]
-    }
-    
-    for cost_type, patterns in cost_patterns.items():
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                cost_str = match.group(1).replace('$', '').replace(',', '')
-                try:
-                    quote_data[cost_type] = float(cost_str)
-                    break
-                except ValueError:
-                    continue
-    
-    # Extract medications and services from text
-    medication_keywords = ['antibiótico', 'analgésico', 'antiinflamatorio', 'medicamento', 'fármaco']
-    for keyword in medication_keywords:
-        if keyword in text.lower():
-            quote_data["surgical_package"]["medications_included"].append(keyword.title())
-    
-    # Extract special equipment
-    equipment_keywords = ['prótesis', 'implante', 'stent', 'marcapasos', 'dispositivo', 'laparoscopia', 'artroscopia']
-    for keyword in equipment_keywords:
-        if keyword in text.lower():
-            quote_data["additional_equipment"].append(keyword.title())
-    
-    # Hospital stay patterns
-    nights_patterns = [
-        r'(\d+)\s*(?:noches?|nights?|días?|days?)\s*(?:hospitalización|hospital)',
-        r'(?:hospitalización|hospital)[\s:]*(\d+)\s*(?:noches?|días?)',
-        r'(?:ambulatori[ao]|outpatient)'
-    ]
-    for pattern in nights_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            if 'ambulatori' in match.group(0).lower() or 'outpatient' in match.group(0).lower():
-                quote_data["is_ambulatory"] = True
-                quote_data["hospital_nights"] = 0
-            else:
-                nights = int(match.group(1)) if match.group(1).isdigit() else 0
-                quote_data["hospital_nights"] = nights
-                quote_data["is_ambulatory"] = nights == 0
-            break
-    
-    return quote_data
+            with archive:
+                members = [
+                    member for member in archive.infolist()
+                    if not member.is_dir() and not os.path.basename(member.filename).startswith('.')
+                ]
+                if len(items) + len(members) > max_files:
+                    raise TooManyBatchFiles()
+                for member in members:
+                    if member.filename.lower().endswith('.pdf'):
+                        with archive.open(member) as stream:
+                            add(member.filename, stream)
+                    else:
+                        add(member.filename)
+        else:
+            add(filename)
+    return items
+
+def _new_result(filename: str) -> Dict[str, Any]:
+    return {"filename": filename, "success": False, "extracted_data": None, "errors": None, "cache_hit": False}
+
+def _complete_result(result: Dict[str, Any], quote_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validate ``quote_data`` into ``result``, filling the defaults of a savable quote."""
+    if quote_data is None:
+        result.update(message="No se pudo extraer texto del PDF", errors=["PDF vacío o no se pudo procesar"])
+        return result
+
+    result["extracted_data"] = quote_data
+
+    if not quote_data["procedure_name"]:
+        result.update(message="Información insuficiente en el PDF", errors=["No se pudo identificar el procedimiento"])
+        return result
+    if quote_data["surgery_duration_hours"] == 0:
+        result.update(message="Información insuficiente en el PDF", errors=["No se pudo identificar la duración de la cirugía en horas"])
+        return result
+
+    if not quote_data["anesthesia_type"]:
+        quote_data["anesthesia_type"] = "Anestesia General"  # Default
+    quote_data["total_cost"] = (quote_data["facility_fee"] +
+                                quote_data["equipment_costs"] +
+                                quote_data["anesthesia_fee"] +
+                                quote_data["other_costs"])
+
+    result.update(success=True, message="Cotización creada exitosamente desde PDF")
+    return result
+
+def process_pdf(item: Tuple[str, Optional[PDFSource]], on_page: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """Extract, parse and validate one PDF.
+
+    Runs in a worker process, so pass the PDF as a path rather than bytes or
+    a file there. ``extracted_data`` of a successful result is ready to be
+    saved.
+    """
+    filename, content = item
+    result = _new_result(filename)
+    if content is None:
+        result.update(message="Solo se permiten archivos PDF", errors=["Tipo de archivo no soportado"])
+        return result
+
+    try:
+        _, quote_data, result["cache_hit"] = extract_and_parse(content, on_page)
+        return _complete_result(result, quote_data)
+    except PDFBudgetExceeded as e:
+        result.update(message="El PDF excede los límites de procesamiento", errors=[str(e)])
+        return result
+    except Exception as e:
+        logging.error(f"Error processing PDF {filename}: {e}")
+        result.update(message=f"Error procesando PDF: {str(e)}", errors=[str(e)])
+        return result
+
+def iter_process_pdf(item: Tuple[str, PDFSource]) -> Iterator[Tuple[str, Any]]:
+    """Streaming :func:`process_pdf`: yields ``page`` and ``field`` events while
+    the PDF is extracted, then ``("result", result)`` with the same result
+    :func:`process_pdf` returns.
+    """
+    filename, content = item
+    result = _new_result(filename)
+    try:
+        cache = pdf_cache
+        key = extraction_key(content)
+        cached = _cached_quote(cache, key)
+        if cached:
+            quote_data = cached[1]
+            result["cache_hit"] = True
+            for field, value in recognized_fields(quote_data).items():
+                yield "field", {"field": field, "value": value, "page": None}
+        else:
+            text = ""
+            for kind, data in _iter_extraction_within_budget(content):
+                if kind == "text":
+                    text = data
+                else:
+                    yield kind, data
+            quote_data = None
+            if text.strip():
+                quote_data = parse_quote_from_text(text)
+                cache.put(key, text, RULES_VERSION, quote_data)
+        _complete_result(result, quote_data)
+    except PDFBudgetExceeded as e:
+        result.update(message="El PDF excede los límites de procesamiento", errors=[str(e)])
+    except Exception as e:
+        logging.error(f"Error processing PDF {filename}: {e}")
+        result.update(message=f"Error procesando PDF: {str(e)}", errors=[str(e)])
+    yield "result", result
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+class PDFQueueFull(Exception):
+    """Raised by :meth:`PDFWorkQueue.submit` when every slot and queue position is taken."""
+
+class PDFWorkQueue:
+    """Process pool for PDF work that refuses new jobs instead of queueing without bound.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more
+    wait for a free worker; ``submit`` raises :class:`PDFQueueFull` beyond that
+    so callers can shed load right away. A pool broken by a dead worker is
+    replaced on the next submission; only the jobs it held fail.
+    """
+
+    def __init__(self, max_workers: int = PDF_MAX_CONCURRENCY, max_queue: int = PDF_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PDFQueueFull()
+            pool = self._live_pool()
+            self._pending += 1
+        try:
+            try:
+                future = pool.submit(fn, *args)
+            except BrokenExecutor:
+                # Broke since it was checked: once more, on a new pool
+                with self._lock:
+                    pool = self._live_pool(broken=pool)
+                future = pool.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def map(self, fn, items: Iterable) -> List:
+        """Run ``fn`` over ``items`` on the pool; results come back in the same order.
+
+        Takes as many free places as it can, up to ``max_workers``, and keeps
+        that many items running until all are done, so a batch shares the pool
+        (and its bound) with single uploads. Raises :class:`PDFQueueFull` if
+        no place is free.
+        """
+        items = list(items)
+        if not items:
+            return []
+        with self._lock:
+            free = self.max_workers + self.max_queue - self._pending
+            if free <= 0:
+                raise PDFQueueFull()
+            places = min(free, self.max_workers, len(items))
+            pool = self._live_pool()
+            self._pending += places
+        results = [None] * len(items)
+        running = {}
+        try:
+            next_index = 0
+            while next_index < len(items) or running:
+                while next_index < len(items) and len(running) < places:
+                    running[pool.submit(fn, items[next_index])] = next_index
+                    next_index += 1
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+            return results
+        finally:
+            for future in running:
+                future.cancel()
+            with self._lock:
+                self._pending -= places
+
+    def _live_pool(self, broken: Optional[ProcessPoolExecutor] = None) -> ProcessPoolExecutor:
+        # Called with the lock held. A worker that dies (OOM kill, crash in
+        # pdfminer) breaks the whole pool for good: drop it and start a new one
+        pool = self._pool
+        if pool is not None and (pool is broken or pool._broken):
+            pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = pool = None
+        if pool is None:
+            self._pool = pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return pool
+
+    def reserve(self):
+        """Take a place for work that runs outside the pool, such as a streamed extraction.
+
+        Raises :class:`PDFQueueFull` like :meth:`submit`; call :meth:`release` when done.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise PDFQueueFull()
+            self._pending += 1
+
+    def release(self):
+        self._release(None)
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+def process_pdf_batch(items: Iterable[Tuple[str, Optional[PDFSource]]], queue: PDFWorkQueue) -> List[Dict[str, Any]]:
+    """Run :func:`process_pdf` over ``items`` on the pool of ``queue`` (see :meth:`PDFWorkQueue.map`).
+
+    Results come back in the same order as ``items``; raises
+    :class:`PDFQueueFull` when the queue has no free place.
+    """
+    return queue.map(process_pdf, items)
@@ -0,0 +1,137 @@
+"""Per-hospital PDF layout templates.
+
+Hospitals that send quotes regularly use the same layout every time. A
+:class:`LayoutTemplate` recognizes such a layout from a cheap fingerprint (the
+``Producer`` metadata and/or text in the first page's header band) and names
+the regions holding the quote data, so only those regions are extracted
+instead of every page in full. Documents no template recognizes go through the
+generic full-text path in ``pdf_service``.
+
+Templates are read from the JSON file at ``PDF_TEMPLATES_PATH``, a list of
+objects such as::
+
+    {
+        "name": "hospital-angeles",
+        "producer": "Angeles Reportes",
+        "header": "hospital angeles",
+        "regions": [
+            {"page": 0, "bbox": [0, 90, 595, 300]},
+            {"page": -1, "bbox": [0, 400, 595, 700], "table": true}
+        ]
+    }
+
+``bbox`` is ``[x0, top, x1, bottom]`` in PDF points from the top-left corner,
+as in ``pdfplumber``; ``page`` is a 0-based index (negative counts from the
+end). Table regions are read with ``extract_table()`` and flattened to one
+line per row.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+PDF_TEMPLATES_PATH = Path(os.environ.get('PDF_TEMPLATES_PATH', Path(__file__).resolve().parents[2] / 'data' / 'pdf_templates.json'))
+# Height of the first-page band whose text is matched against ``header``
+HEADER_BAND_POINTS = 100
+
+
+class Region(NamedTuple):
+    bbox: Tuple[float, float, float, float]
+    page: int = 0
+    table: bool = False
+
+
+class LayoutTemplate(NamedTuple):
+    """A known layout: how to recognize it and where its data lives.
+
+    ``producer`` and ``header`` are case-insensitive substrings of the PDF's
+    ``Producer`` metadata and first-page header text; every one given must
+    match.
+    """
+    name: str
+    regions: Tuple[Region, ...]
+    producer: Optional[str] = None
+    header: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'LayoutTemplate':
+        if not (data.get('producer') or data.get('header')):
+            raise ValueError(f"Template {data.get('name')!r} needs a producer or header to match on")
+        return cls(
+            name=data['name'],
+            regions=tuple(Region(tuple(r['bbox']), r.get('page', 0), r.get('table', False)) for r in data['regions']),
+            producer=data.get('producer'),
+            header=data.get('header'),
+        )
+
+
+def _table_text(table: Optional[List[List[Optional[str]]]]) -> str:
+    return "\n".join(" ".join(cell for cell in row if cell) for row in table or [])
+
+
+class TemplateRegistry:
+    """Ordered list of templates; the first one matching a document wins."""
+
+    def __init__(self, templates: Optional[List[LayoutTemplate]] = None):
+        self.templates = list(templates or [])
+
+    @classmethod
+    def load(cls, path: Path = PDF_TEMPLATES_PATH) -> 'TemplateRegistry':
+        """Read templates from ``path``; a missing or invalid file gives an empty registry."""
+        try:
+            with open(path, encoding='utf-8') as f:
+                return cls([LayoutTemplate.from_dict(data) for data in json.load(f)])
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring PDF templates in {path}: {e}")
+            return cls()
+
+    def register(self, template: LayoutTemplate):
+        self.templates.append(template)
+
+    def fingerprint(self) -> str:
+        """Short hash of the templates; it changes whenever one is added, removed or edited."""
+        return hashlib.sha256(json.dumps(self.templates).encode()).hexdigest()[:16]
+
+    def match(self, pdf) -> Optional[LayoutTemplate]:
+        """Template for an open ``pdfplumber`` document, or ``None`` for an unknown layout."""
+        if not self.templates or not pdf.pages:
+            return None
+        producer = str((pdf.metadata or {}).get('Producer') or '').lower()
+        header = None
+        for template in self.templates:
+            if template.producer and template.producer.lower() not in producer:
+                continue
+            if template.header:
+                if header is None:
+                    first = pdf.pages[0]
+                    band = (first.bbox[0], first.bbox[1], first.bbox[2], min(first.bbox[1] + HEADER_BAND_POINTS, first.bbox[3]))
+                    header = (first.crop(band).extract_text() or '').lower()
+                if template.header.lower() not in header:
+                    continue
+            return template
+        return None
+
+    def extract(self, pdf, template: LayoutTemplate) -> str:
+        """Text of ``template``'s regions in ``pdf``, in the order they are declared."""
+        parts = []
+        for region in template.regions:
+            try:
+                page = pdf.pages[region.page]
+            except IndexError:
+                continue
+            # Clamp to the page so a template drawn for a slightly larger paper size still applies
+            x0, top, x1, bottom = region.bbox
+            px0, ptop, px1, pbottom = page.bbox
+            bbox = (max(x0, px0), max(top, ptop), min(x1, px1), min(bottom, pbottom))
+            if bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+                continue
+            cropped = page.crop(bbox)
+            parts.append(_table_text(cropped.extract_table()) if region.table else cropped.extract_text() or "")
+        return "\n".join(parts)
+
+
+pdf_templates = TemplateRegistry.load()
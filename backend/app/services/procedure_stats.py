@@ -0,0 +1,149 @@
+"""Running pricing statistics per procedure.
+
+Pricing suggestions are requested on every keystroke of the procedure field,
+so instead of averaging every matching quote on each request both backends
+keep one row per procedure (keyed by :func:`procedure_key`) with the
+count, sums, minimum and maximum of its quotes, updated as quotes are saved
+and deleted. A suggestion then only reads the rows of the matching
+procedures: the one whose key equals the key of the name asked for, else
+those whose key starts with it (the name being typed), else the most
+similar one by trigrams (see :mod:`.trigrams`).
+
+Each row also keeps a :class:`~.quantile_sketch.TDigest` per cost field
+(``sketches``, stored as ``{field: TDigest.to_dict()}``), from which the
+suggestion reports percentiles that, unlike the averages, one outlier quote
+does not skew. Sketches merge, so the rows of several procedures combine
+into one suggestion. They cannot forget a value: when a quote leaves a
+procedure, its sketches are rebuilt from the quotes that remain.
+"""
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .quantile_sketch import TDigest
+from .search import canonical
+
+# Cost fields summed and sketched per procedure; suggestions average them and report their quantiles
+SUMMED_FIELDS = ('facility_fee', 'equipment_costs', 'total_cost')
+QUANTILES = (('p25', 0.25), ('median', 0.5), ('p75', 0.75), ('p90', 0.9))
+
+
+# Bumped whenever procedure_key() changes, so that stored keys get recomputed
+PROCEDURE_KEY_VERSION = 2
+
+
+def procedure_key(procedure_name: Optional[str]) -> str:
+    """Canonical key of a procedure name: lowercase, without accents, punctuation or stop words.
+
+    "Apendicectomía", "apendicectomia" and "Bypass gástrico (en Y de Roux)"
+    vs "bypass gastrico en y roux" each get one key.
+    """
+    return canonical(procedure_name)
+
+
+def matching_rows(key: str, rows: Iterable[Mapping[str, Any]], key_field: str = 'key') -> Tuple[List[Mapping[str, Any]], Optional[str]]:
+    """``(rows, match)`` of a suggestion from the stats rows whose key (``key_field``) starts with ``key``.
+
+    The row whose key equals ``key`` alone if there is one (``match`` is
+    ``'exact'``), else all of them as candidates (``'prefix'``, see
+    :func:`pricing_suggestion`); ``match`` is None when there are none.
+    """
+    rows = list(rows)
+    exact = [row for row in rows if row[key_field] == key]
+    if exact:
+        return exact, 'exact'
+    return rows, 'prefix' if rows else None
+
+
+def quote_totals(quotes: Iterable[Mapping[str, Any]], totals: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Group quotes (dicts of their fields) by procedure key into stats rows.
+
+    Each row has ``procedure_name`` (as first seen), ``quote_count``,
+    ``sum_<field>`` for :data:`SUMMED_FIELDS`, ``min_total_cost`` /
+    ``max_total_cost`` and ``sketches`` (``{field: TDigest}``). Pass the
+    result back as ``totals`` to keep adding quotes to it.
+    """
+    totals = {} if totals is None else totals
+    for quote in quotes:
+        key = procedure_key(quote.get('procedure_name'))
+        total_cost = quote.get('total_cost') or 0
+        row = totals.get(key)
+        if row is None:
+            row = totals[key] = {
+                'procedure_name': quote.get('procedure_name') or '',
+                'quote_count': 0,
+                **{f'sum_{field}': 0.0 for field in SUMMED_FIELDS},
+                'min_total_cost': total_cost,
+                'max_total_cost': total_cost,
+                'sketches': {field: TDigest() for field in SUMMED_FIELDS},
+            }
+        row['quote_count'] += 1
+        for field in SUMMED_FIELDS:
+            row[f'sum_{field}'] += quote.get(field) or 0
+            row['sketches'][field].add(quote.get(field) or 0)
+        row['min_total_cost'] = min(row['min_total_cost'], total_cost)
+        row['max_total_cost'] = max(row['max_total_cost'], total_cost)
+    return totals
+
+
+def dump_sketches(sketches: Mapping[str, TDigest]) -> Dict[str, Dict[str, Any]]:
+    return {field: sketch.to_dict() for field, sketch in sketches.items()}
+
+
+def merge_sketches(*stored: Optional[Mapping[str, Any]]) -> Dict[str, TDigest]:
+    """Merge sketches given as ``{field: TDigest or its dict}`` into fresh ``{field: TDigest}``."""
+    merged = {field: TDigest() for field in SUMMED_FIELDS}
+    for sketches in stored:
+        for field, sketch in (sketches or {}).items():
+            if field in merged:
+                merged[field].merge(sketch if isinstance(sketch, TDigest) else TDigest.from_dict(sketch))
+    return merged
+
+
+def combine_stats(rows: Iterable[Mapping[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Combine the stored stats rows of several procedures into one; None when there are none."""
+    rows = list(rows)
+    if not rows:
+        return None
+    return {
+        'quote_count': sum(row['quote_count'] for row in rows),
+        **{f'sum_{field}': sum(row[f'sum_{field}'] for row in rows) for field in SUMMED_FIELDS},
+        'min_total_cost': min(row['min_total_cost'] for row in rows),
+        'max_total_cost': max(row['max_total_cost'] for row in rows),
+        'sketches': merge_sketches(*(row.get('sketches') for row in rows)),
+    }
+
+
+def pricing_suggestion(procedure_name: str, rows: Iterable[Mapping[str, Any]], match: Optional[str] = None) -> Dict[str, Any]:
+    """Build the pricing suggestion response from the stats rows of the matching procedures.
+
+    ``match`` tells how they matched (see :func:`matching_rows`; or
+    ``'similar'``). An exact or similar match combines its rows' stats; a
+    prefix match only lists the procedures that start like the name in
+    ``matched_procedures``, since pooling the prices of different procedures
+    (every "Bypass ..." for "bypass") would suggest a price none of them has.
+    """
+    rows = list(rows)
+    stats = combine_stats(rows) if match != 'prefix' else None
+    count = (stats or {}).get('quote_count') or 0
+
+    def average(field):
+        return round(stats[f'sum_{field}'] / count, 2) if count else 0
+
+    sketches = (stats or {}).get('sketches') or {}
+
+    def quantiles(field):
+        sketch = sketches.get(field)
+        return {name: round(sketch.quantile(q) or 0, 2) if sketch and count else 0 for name, q in QUANTILES}
+
+    return {
+        'procedure_name': procedure_name,
+        'avg_facility_fee': average('facility_fee'),
+        'avg_equipment_costs': average('equipment_costs'),
+        'avg_total_cost': average('total_cost'),
+        'quote_count': count,
+        'suggested_total': average('total_cost'),
+        'min_total_cost': round(stats['min_total_cost'], 2) if count else 0,
+        'max_total_cost': round(stats['max_total_cost'], 2) if count else 0,
+        'quantiles': {field: quantiles(field) for field in SUMMED_FIELDS},
+        'match': match if rows else None,
+        'matched_procedures': sorted(row['procedure_name'] for row in rows),
+    }
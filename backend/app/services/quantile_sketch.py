@@ -0,0 +1,127 @@
+"""A mergeable quantile sketch (merging t-digest).
+
+A :class:`TDigest` summarises any number of values in at most a few times
+``compression`` centroids, keeping the tails (p1, p99) more precise than the
+middle. Two digests merge into one that describes the union of their values,
+so a digest can be kept per procedure, per month or per any other slice and
+combined on read. Values cannot be removed: when one is, rebuild the digest
+from the values that remain.
+
+Small sets of values (fewer than about ``compression / 2``) are kept exactly.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_COMPRESSION = 100
+# Values are buffered and merged into the centroids in batches of this many
+BUFFER_SIZE = 500
+
+
+class TDigest:
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        # [mean, weight] pairs sorted by mean
+        self._centroids: List[List[float]] = []
+        self._buffer: List[List[float]] = []
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], compression: float = DEFAULT_COMPRESSION) -> 'TDigest':
+        digest = cls(compression)
+        for value in values:
+            digest.add(value)
+        return digest
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TDigest':
+        digest = cls(data.get('compression', DEFAULT_COMPRESSION))
+        digest._centroids = [list(c) for c in data.get('centroids', [])]
+        if digest._centroids:
+            digest.min, digest.max = data['min'], data['max']
+        return digest
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._compress()
+        return {'compression': self.compression, 'min': self.min, 'max': self.max, 'centroids': self._centroids}
+
+    @property
+    def count(self) -> float:
+        return sum(w for _, w in self._centroids) + sum(w for _, w in self._buffer)
+
+    def add(self, value: float, weight: float = 1.0):
+        value = float(value)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._buffer.append([value, weight])
+        if len(self._buffer) >= BUFFER_SIZE:
+            self._compress()
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """Add ``other``'s values to this digest and return it."""
+        if other.min is None:
+            return self
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._buffer.extend([m, w] for m, w in other._centroids + other._buffer)
+        self._compress()
+        return self
+
+    def _k(self, q: float) -> float:
+        # k1 scale function: centroids near q=0 and q=1 stay small
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k: float) -> float:
+        k = min(k, self.compression / 4)
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        items = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in items)
+        merged = [list(items[0])]
+        done = 0.0
+        q_limit = self._q(self._k(0) + 1)
+        for mean, weight in items[1:]:
+            current = merged[-1]
+            if (done + current[1] + weight) / total <= q_limit:
+                current[0] += (mean - current[0]) * weight / (current[1] + weight)
+                current[1] += weight
+            else:
+                done += current[1]
+                q_limit = self._q(self._k(done / total) + 1)
+                merged.append([mean, weight])
+        self._centroids = merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the value below which a fraction ``q`` (0..1) of the values fall; None when empty."""
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        if all(w == 1 for _, w in centroids):
+            # Every value is still kept on its own: interpolate between neighbours, as numpy does
+            position = q * (len(centroids) - 1)
+            low = int(position)
+            high = min(low + 1, len(centroids) - 1)
+            return _interpolate(position, low, low + 1, centroids[low][0], centroids[high][0])
+        total = sum(w for _, w in centroids)
+        target = q * total
+        # Each centroid sits at the middle of the ranks it covers
+        cumulative = 0.0
+        previous_mean, previous_center = self.min, 0.0
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                return _interpolate(target, previous_center, center, previous_mean, mean)
+            cumulative += weight
+            previous_mean, previous_center = mean, center
+        return _interpolate(target, previous_center, total, previous_mean, self.max)
+
+
+def _interpolate(x, x0, x1, y0, y1):
+    if x1 <= x0:
+        return y1
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
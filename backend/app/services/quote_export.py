@@ -0,0 +1,121 @@
+"""CSV and NDJSON export of quotes, written as the rows are read.
+
+Both backends feed :func:`iter_export` (or :func:`aiter_export`) with quotes
+read through a database cursor and stream what it yields, so memory
+use does not depend on the number of quotes exported.
+
+A record has the :data:`QUOTE_FIELDS` and a nested ``surgical_package``
+(:data:`PACKAGE_FIELDS`, or None). NDJSON writes it as is, one JSON object
+per line. CSV flattens the package into ``surgical_package.<field>``
+columns, writes lists as JSON and starts with a BOM so that spreadsheets
+read the accents right.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Mapping, Optional
+
+QUOTE_FIELDS = (
+    'id', 'patient_id', 'patient_age', 'patient_phone', 'patient_email',
+    'procedure_name', 'procedure_code', 'procedure_description', 'surgeon_name', 'surgeon_specialty',
+    'surgery_duration_hours', 'anesthesia_type', 'additional_equipment', 'additional_materials',
+    'is_ambulatory', 'hospital_nights', 'facility_fee', 'equipment_costs', 'anesthesia_fee', 'other_costs',
+    'total_cost', 'created_at', 'created_by', 'status', 'notes',
+)
+PACKAGE_FIELDS = (
+    'medications_included', 'postoperative_care', 'hospital_stay_nights', 'special_equipment',
+    'dietary_plan', 'additional_services',
+)
+CSV_COLUMNS = QUOTE_FIELDS + tuple(f'surgical_package.{field}' for field in PACKAGE_FIELDS)
+
+# format: (content type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+INVALID_FORMAT = f"Formato no soportado; use {' o '.join(EXPORT_FORMATS)}"
+# Rows joined into each chunk of the response
+EXPORT_BATCH_ROWS = 500
+
+
+def export_record(quote: Mapping[str, Any]) -> Dict[str, Any]:
+    """Pick the exported fields of a quote (a dict with a nested ``surgical_package``)."""
+    package = quote.get('surgical_package')
+    return {
+        **{field: quote.get(field) for field in QUOTE_FIELDS},
+        'surgical_package': {field: package.get(field) for field in PACKAGE_FIELDS} if package else None,
+    }
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _CSVLines:
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def __call__(self, row: List[Any]) -> str:
+        self.writer.writerow(row)
+        line = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line
+
+
+def _lines(export_format: str):
+    """(header, function from record to line) of a format"""
+    if export_format == 'ndjson':
+        return '', lambda record: json.dumps(record, ensure_ascii=False, default=_json_default) + '\n'
+    to_line = _CSVLines()
+
+    def csv_line(record):
+        package = record['surgical_package'] or {}
+        return to_line([_csv_value(record[field]) for field in QUOTE_FIELDS] + [_csv_value(package.get(field)) for field in PACKAGE_FIELDS])
+    return '\ufeff' + to_line(list(CSV_COLUMNS)), csv_line
+
+
+def iter_export(quotes: Iterable[Mapping[str, Any]], export_format: str) -> Iterator[str]:
+    """Yield the export of ``quotes`` (see :func:`export_record`) in chunks of EXPORT_BATCH_ROWS rows."""
+    header, line = _lines(export_format)
+    chunk = [header]
+    for quote in quotes:
+        chunk.append(line(export_record(quote)))
+        if len(chunk) >= EXPORT_BATCH_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+async def aiter_export(quotes: AsyncIterable[Mapping[str, Any]], export_format: str) -> AsyncIterator[str]:
+    """:func:`iter_export` over an async iterable, such as a Motor cursor."""
+    header, line = _lines(export_format)
+    chunk = [header]
+    async for quote in quotes:
+        chunk.append(line(export_record(quote)))
+        if len(chunk) >= EXPORT_BATCH_ROWS:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export_filename(export_format: str, today: Optional[date] = None) -> str:
+    return f"cotizaciones-{(today or date.today()).isoformat()}.{EXPORT_FORMATS[export_format][1]}"
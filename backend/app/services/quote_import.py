@@ -0,0 +1,169 @@
+"""Streaming import of quotes from CSV or NDJSON files.
+
+:func:`iter_records` reads a file line by line, never the whole of it, and
+turns each row into a quote dict as the API takes it (with a nested
+``surgical_package``). Both backends validate these records and write them
+IMPORT_BATCH_ROWS at a time, one transaction and a few multi-row INSERTs
+per batch (``quotes.imports`` and ``server.py``).
+
+The layout is that of :mod:`.quote_export`, so an export imports back as
+is. CSV files from spreadsheets may also be ``;`` or tab separated and in
+Windows-1252, list cells may be JSON or ``;`` separated, and empty cells
+take the field's default.
+
+:class:`ImportLog` writes the error file of an import: one NDJSON line per
+rejected row, a progress line after each batch and a summary at the end.
+"""
+import csv
+import io
+import json
+import os
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .quote_export import EXPORT_FORMATS, INVALID_FORMAT
+
+IMPORT_BATCH_ROWS = int(os.environ.get('IMPORT_BATCH_ROWS', '5000'))
+IMPORT_MAX_UPLOAD_BYTES = int(os.environ.get('IMPORT_MAX_UPLOAD_MB', '512')) * 1024 * 1024
+
+IMPORT_SUFFIXES = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+PACKAGE_PREFIX = 'surgical_package.'
+LIST_FIELDS = {
+    'additional_equipment', 'additional_materials',
+    'medications_included', 'postoperative_care', 'special_equipment', 'additional_services',
+}
+BOOLEAN_FIELDS = {'is_ambulatory', 'dietary_plan'}
+BOOLEANS = {'true': True, 'false': False, '1': True, '0': False, 'sí': True, 'si': True, 'no': False}
+
+# (row number in the file, record or None, parse error or None)
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def import_format(filename: Optional[str], requested: Optional[str] = None) -> str:
+    """The format of an import: ``requested`` if given, else from the file extension. ValueError if unknown."""
+    if requested:
+        if requested not in EXPORT_FORMATS:
+            raise ValueError(INVALID_FORMAT)
+        return requested
+    try:
+        return IMPORT_SUFFIXES[Path(filename or '').suffix.lower()]
+    except KeyError:
+        raise ValueError(INVALID_FORMAT) from None
+
+
+def _encoding(stream: BinaryIO) -> str:
+    # Spreadsheets save CSV in UTF-8 or, on Windows, in Windows-1252; look at the start of the file
+    head = stream.read(64 * 1024)
+    stream.seek(0)
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A character cut at the end of the sample is fine
+        if e.start < len(head) - 3:
+            return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _list_cell(value: str):
+    if value.startswith('['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return [part.strip() for part in value.split(';') if part.strip()]
+
+
+def _cell(field: str, value: str):
+    if field in LIST_FIELDS:
+        return _list_cell(value)
+    if field in BOOLEAN_FIELDS:
+        # Left as is when not recognised, for validation to reject
+        return BOOLEANS.get(value.lower(), value)
+    return value
+
+
+def _csv_record(row: Dict[Optional[str], Any]) -> Dict[str, Any]:
+    record = {}
+    package = {}
+    for column, value in row.items():
+        # None: cells beyond the header; a list of them under the None column
+        if column is None or value is None:
+            continue
+        value = value.strip()
+        if not value:
+            continue
+        column = column.strip()
+        if column.startswith(PACKAGE_PREFIX):
+            field = column[len(PACKAGE_PREFIX):]
+            package[field] = _cell(field, value)
+        else:
+            record[column] = _cell(column, value)
+    if package:
+        record['surgical_package'] = package
+    return record
+
+
+def _csv_rows(text: io.TextIOBase) -> Iterator[Row]:
+    header = text.readline()
+    # The delimiter spreadsheets used: the most frequent of , ; and tab in the header
+    delimiter = max(',;\t', key=header.count)
+    reader = csv.DictReader(text, fieldnames=next(csv.reader([header], delimiter=delimiter), []), delimiter=delimiter)
+    for row in reader:
+        if any(value and value.strip() for key, value in row.items() if key is not None):
+            yield reader.line_num + 1, _csv_record(row), None
+
+
+def _ndjson_rows(text: io.TextIOBase) -> Iterator[Row]:
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'JSON inválido: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield number, None, 'Se esperaba un objeto JSON por línea'
+            continue
+        yield number, record, None
+
+
+def iter_records(stream: BinaryIO, import_format: str) -> Iterator[Row]:
+    """Yield ``(row number, record, error)`` for each row of a seekable binary file, reading it as it goes."""
+    text = io.TextIOWrapper(stream, encoding=_encoding(stream) if import_format == 'csv' else 'utf-8-sig', newline='')
+    try:
+        yield from (_csv_rows if import_format == 'csv' else _ndjson_rows)(text)
+    finally:
+        # Leave the caller's file open
+        text.detach()
+
+
+class ImportLog:
+    """Counts an import and formats the lines of its error file (NDJSON).
+
+    ``{"row": n, "errors": {...}}`` for each rejected row, ``{"progress":
+    {...}}`` after each batch and ``{"result": {...}}`` at the end.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _line(data: Dict[str, Any]) -> str:
+        return json.dumps(data, ensure_ascii=False, default=str) + '\n'
+
+    def reject(self, row: int, errors: Dict[str, List[str]]) -> str:
+        self.rejected += 1
+        return self._line({'row': row, 'errors': errors})
+
+    def counts(self) -> Dict[str, int]:
+        return {'rows': self.rows, 'quotes_created': self.created, 'rejected': self.rejected}
+
+    def progress(self) -> str:
+        return self._line({'progress': self.counts()})
+
+    def result(self) -> str:
+        message = f'{self.created} de {self.rows} cotizaciones importadas'
+        return self._line({'result': {'success': bool(self.created), 'message': message, **self.counts()}})
@@ -0,0 +1,270 @@
+"""Shared quote extraction engine.
+
+``server.py``, ``app.services.pdf_service`` and the Django ``quotes`` app all
+parse imported PDFs through :func:`parse_quote_from_text`. Every field rule is
+declared once in ``FIELD_RULES`` and compiled at import time.
+
+Parsing normalizes and lowercases the document once and then makes one pass
+over the rule table. Patterns are written in lowercase and run case-sensitively
+against the lowered text, which lets ``re`` use its fast literal search instead
+of case-folding every character. A pattern whose leading keywords do not occur
+in the document at all is skipped without being run.
+"""
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Bump whenever a rule below changes so stored parse results can be told apart.
+RULES_VERSION = "1"
+
+_WHITESPACE = re.compile(r'\s+')
+_NON_DIGIT = re.compile(r'[^\d]')
+_LEADING_ALTERNATION = re.compile(r'^\(\?:([^()\[\]]+)\)')
+_LEADING_LITERAL = re.compile(r'^[a-záéíóúñ ]+')
+
+
+class FieldRule(NamedTuple):
+    """Patterns for one field, tried in priority order.
+
+    ``apply`` receives the first match of a pattern and returns the updates to
+    merge into the quote, or ``None`` to fall through to the next pattern.
+    ``requires`` is a literal that must appear in the text for any pattern of
+    the rule to be tried.
+    """
+    name: str
+    patterns: Tuple[str, ...]
+    apply: Callable[[re.Match, str], Optional[Dict[str, Any]]]
+    requires: Optional[str] = None
+
+
+def _strip_group(field: str, group: int = 1, min_len: int = 0, max_len: Optional[int] = None):
+    def apply(match, text):
+        value = text[match.start(group):match.end(group)].strip()
+        if len(value) <= min_len:
+            return None
+        return {field: value[:max_len] if max_len else value}
+    return apply
+
+
+def _int_group(field: str, low: Optional[int] = None, high: Optional[int] = None):
+    def apply(match, text):
+        try:
+            value = int(match.group(1))
+        except (TypeError, ValueError):
+            return None
+        if low is not None and not (low <= value <= high):
+            return None
+        return {field: value}
+    return apply
+
+
+def _money_group(field: str):
+    def apply(match, text):
+        try:
+            return {field: float(match.group(1).replace('$', '').replace(',', ''))}
+        except ValueError:
+            return None
+    return apply
+
+
+def _phone(match, text):
+    phone = match.group(1)
+    # The first phone-looking match decides, even when it is too short to keep.
+    if len(_NON_DIGIT.sub('', phone)) >= 10:
+        return {"patient_phone": phone.strip()}
+    return {}
+
+
+def _hospital_stay(match, text):
+    found = match.group(0)
+    if 'ambulatori' in found or 'outpatient' in found:
+        return {"is_ambulatory": True, "hospital_nights": 0}
+    nights = int(match.group(1)) if match.group(1).isdigit() else 0
+    return {"hospital_nights": nights, "is_ambulatory": nights == 0}
+
+
+# Patterns are matched against lowercased text, so write them in lowercase.
+FIELD_RULES: Tuple[FieldRule, ...] = (
+    FieldRule("patient_id", (
+        r'(?:paciente|patient|id|expediente|número)[\s:]*([a-z0-9\-]+)',
+        r'id[\s:]*([a-z0-9\-]+)',
+        r'no\.?\s*([a-z0-9\-]+)',
+    ), _strip_group("patient_id")),
+    FieldRule("patient_age", (
+        r'(?:edad|age|años)[\s:]*(\d{1,3})',
+        r'(\d{1,3})\s*(?:años|years old)',
+    ), _int_group("patient_age")),
+    FieldRule("patient_phone", (
+        r'(?:teléfono|telefono|phone|tel)[\s:]*([0-9\-\s\(\)]+)',
+        r'(\(?[0-9]{3}\)?[-.\s]?[0-9]{3}[-.\s]?[0-9]{4})',
+    ), _phone),
+    FieldRule("patient_email", (
+        r'([a-z0-9._%+-]+@[a-z0-9.-]+\.[a-z]{2,})',
+    ), _strip_group("patient_email"), requires='@'),
+    FieldRule("procedure_name", (
+        r'(?:procedimiento|procedure|cirugía|surgery|operación)[\s:]*([^$\d\n]{10,80})',
+        r'(?:reemplazo|replacement|bypass|apendicectomía|appendectomy)[\s\w]*',
+        r'(?:artroscopia|laparoscopia|endoscopia)[\s\w]*',
+    ), _strip_group("procedure_name", group=0, min_len=5, max_len=80)),
+    FieldRule("surgeon_name", (
+        r'(?:dr\.?|doctor|dra\.?|doctora|cirujano|surgeon)[\s]*([a-záéíóúñ\s]{5,40})',
+        r'médico[\s:]*([a-záéíóúñ\s]{5,40})',
+    ), _strip_group("surgeon_name", min_len=3, max_len=40)),
+    FieldRule("surgery_duration_hours", (
+        r'(?:duración|duration|tiempo)[\s:]*(\d+)[\s]*(?:horas?|hours?|hrs?)',
+        r'(\d+)[\s]*(?:horas?|hours?|hrs?)[\s]*(?:de[\s]*)?(?:cirugía|surgery|operación)',
+        r'(?:cirugía|surgery)[\s]*(?:de[\s]*)?(\d+)[\s]*(?:horas?|hours?|hrs?)',
+    ), _int_group("surgery_duration_hours", 1, 24)),
+    FieldRule("anesthesia_type", (
+        r'(?:anestesia|anesthesia)[\s]*(?:general|epidural|regional|local|sedación)',
+        r'(?:bloqueo|block)[\s]*(?:epidural|regional)',
+        r'(?:sedación|sedation)[\s]*(?:básica|basic)?',
+    ), _strip_group("anesthesia_type", group=0)),
+    # Cost patterns (Mexican Pesos)
+    FieldRule("facility_fee", (
+        r'(?:instalaciones|facilities|hospital)[\s:$]*(\$?[\d,]+\.?\d*)',
+        r'(?:costo.*hospital)[\s:$]*(\$?[\d,]+\.?\d*)',
+    ), _money_group("facility_fee")),
+    FieldRule("equipment_costs", (
+        r'(?:equipos|equipment|instrumental)[\s:$]*(\$?[\d,]+\.?\d*)',
+        r'(?:materiales|supplies)[\s:$]*(\$?[\d,]+\.?\d*)',
+    ), _money_group("equipment_costs")),
+    FieldRule("anesthesia_fee", (
+        r'(?:anestesia|anesthesia)[\s:$]*(\$?[\d,]+\.?\d*)',
+    ), _money_group("anesthesia_fee")),
+    FieldRule("total_cost", (
+        r'(?:total|costo total|total cost)[\s:$]*(\$?[\d,]+\.?\d*)',
+        r'(?:suma|amount)[\s:$]*(\$?[\d,]+\.?\d*)',
+    ), _money_group("total_cost")),
+    FieldRule("hospital_stay", (
+        r'(\d+)\s*(?:noches?|nights?|días?|days?)\s*(?:hospitalización|hospital)',
+        r'(?:hospitalización|hospital)[\s:]*(\d+)\s*(?:noches?|días?)',
+        r'(?:ambulatori[ao]|outpatient)',
+    ), _hospital_stay),
+)
+
+MEDICATION_KEYWORDS = ('antibiótico', 'analgésico', 'antiinflamatorio', 'medicamento', 'fármaco')
+EQUIPMENT_KEYWORDS = ('prótesis', 'implante', 'stent', 'marcapasos', 'dispositivo', 'laparoscopia', 'artroscopia')
+
+# What an imported quote needs; early-exit extraction stops once all are found.
+REQUIRED_FIELDS = ("procedure_name", "surgery_duration_hours", "costs")
+# ``costs`` is not a key of its own: it is present when any of these is non-zero
+PARSED_COST_FIELDS = ("facility_fee", "equipment_costs", "anesthesia_fee")
+
+
+def _leading_literals(pattern: str) -> Optional[Tuple[str, ...]]:
+    """Literal prefixes one of which every match of ``pattern`` starts with.
+
+    Returns ``None`` when the pattern does not begin with plain keywords.
+    """
+    alternation = _LEADING_ALTERNATION.match(pattern)
+    alternatives = alternation.group(1).split('|') if alternation else [pattern]
+    literals = []
+    for alternative in alternatives:
+        literal = _LEADING_LITERAL.match(alternative)
+        if not literal:
+            return None
+        literals.append(literal.group(0))
+    return tuple(literals)
+
+
+class _CompiledRule(NamedTuple):
+    rule: FieldRule
+    patterns: Tuple[Tuple[re.Pattern, Optional[Tuple[str, ...]]], ...]
+
+
+_COMPILED_RULES = tuple(
+    _CompiledRule(rule, tuple((re.compile(p), _leading_literals(p)) for p in rule.patterns))
+    for rule in FIELD_RULES
+)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse every run of whitespace (newlines and tabs included) to one space."""
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def empty_quote() -> Dict[str, Any]:
+    return {
+        "patient_id": None,
+        "patient_age": None,
+        "patient_phone": None,
+        "patient_email": None,
+        "procedure_name": "",
+        "procedure_code": None,
+        "procedure_description": None,
+        "surgeon_name": "",
+        "surgeon_specialty": None,
+        "facility_fee": 0.0,
+        "equipment_costs": 0.0,
+        "anesthesia_fee": 0.0,
+        "other_costs": 0.0,
+        "surgery_duration_hours": 0,
+        "anesthesia_type": "",
+        "additional_equipment": [],
+        "additional_materials": [],
+        "is_ambulatory": True,
+        "hospital_nights": 0,
+        "created_by": "Importación PDF",
+        "notes": "Cotización importada desde PDF",
+        "surgical_package": {
+            "medications_included": [],
+            "postoperative_care": [],
+            "hospital_stay_nights": 0,
+            "special_equipment": [],
+            "dietary_plan": False,
+            "additional_services": []
+        }
+    }
+
+
+def parse_quote_from_text(text: str) -> Dict[str, Any]:
+    """Parse quote information from extracted text using the shared rule table"""
+    quote_data = empty_quote()
+
+    text = normalize_text(text)
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters (e.g. 'İ') grow when lowercased; spans taken from
+        # the lowered text would no longer line up with the original.
+        text = lowered
+
+    total_cost = 0.0
+    for compiled in _COMPILED_RULES:
+        rule = compiled.rule
+        if rule.requires and rule.requires not in lowered:
+            continue
+        for regex, literals in compiled.patterns:
+            if literals and not any(literal in lowered for literal in literals):
+                continue
+            match = regex.search(lowered)
+            if not match:
+                continue
+            updates = rule.apply(match, text)
+            if updates is None:
+                continue
+            if rule.name == "total_cost":
+                total_cost = updates["total_cost"]
+            else:
+                quote_data.update(updates)
+            break
+
+    # If no individual costs found but total exists, distribute proportionally
+    if total_cost > 0 and (quote_data["facility_fee"] + quote_data["equipment_costs"] + quote_data["anesthesia_fee"]) == 0:
+        quote_data["facility_fee"] = total_cost * 0.6  # 60% facilities
+        quote_data["equipment_costs"] = total_cost * 0.3  # 30% equipment
+        quote_data["anesthesia_fee"] = total_cost * 0.1  # 10% anesthesia
+
+    # Extract medications and special equipment mentioned anywhere in the text
+    quote_data["surgical_package"]["medications_included"] = [
+        keyword.title() for keyword in MEDICATION_KEYWORDS if keyword in lowered
+    ]
+    quote_data["additional_equipment"] = [
+        keyword.title() for keyword in EQUIPMENT_KEYWORDS if keyword in lowered
+    ]
+    return quote_data
+
+
+def missing_required(quote_data: Dict[str, Any]) -> List[str]:
+    """Names of ``REQUIRED_FIELDS`` still empty in ``quote_data``."""
+    has_costs = bool(sum(quote_data.get(name, 0) for name in PARSED_COST_FIELDS))
+    return [field for field in REQUIRED_FIELDS if not (has_costs if field == "costs" else quote_data.get(field))]
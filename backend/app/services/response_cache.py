@@ -0,0 +1,291 @@
+"""Read-through cache of API responses shared by every worker process.
+
+:class:`SQLiteCache` is a Django cache backend that keeps its entries in a
+local SQLite file, so the gunicorn workers of a machine (and the FastAPI
+server, which uses it without Django settings) all see the same entries.
+
+:class:`ResponseCache` sits on any Django cache. Keys carry a generation
+number that every quote write bumps, so a response computed before a write
+is never served after it; old generations simply expire. Hits and misses
+are counted in memory by each process and added to counters in the cache at
+most every ``RESPONSE_CACHE_STATS_SECONDS`` (and when the stats are read), so
+a cached read does not take the SQLite write lock.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+RESPONSE_CACHE_PATH = Path(os.environ.get('RESPONSE_CACHE_PATH', Path(__file__).resolve().parents[2] / 'data' / 'response_cache.sqlite3'))
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))
+RESPONSE_CACHE_STATS_SECONDS = float(os.environ.get('RESPONSE_CACHE_STATS_SECONDS', '10'))
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)',
+)
+
+_MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    """Django cache backend on a local SQLite file; ``LOCATION`` is the file path.
+
+    Honours ``TIMEOUT`` and the ``MAX_ENTRIES`` / ``CULL_FREQUENCY`` options
+    like Django's file and database caches.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = Path(location)
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            if not self._ready:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with sqlite3.connect(self.path, timeout=30) as conn:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    for statement in _SCHEMA:
+                        conn.execute(statement)
+                self._ready = True
+        # Autocommit; statements that must be atomic together use BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _expires(self, timeout):
+        # get_backend_timeout() gives an absolute time, or None for "never"
+        return self.get_backend_timeout(timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT value, expires FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def _store(self, key, value, timeout, only_if_missing):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            if only_if_missing:
+                row = conn.execute('SELECT expires FROM cache_entries WHERE key = ?', (key,)).fetchone()
+                if row is not None and (row[0] is None or row[0] > now):
+                    conn.execute('ROLLBACK')
+                    return False
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)),
+            )
+            self._cull(conn, now)
+            conn.execute('COMMIT')
+            return True
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _cull(self, conn, now):
+        conn.execute('DELETE FROM cache_entries WHERE expires <= ?', (now,))
+        count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._max_entries and self._cull_frequency:
+            # Drop the entries closest to expiring; entries without a timeout go last
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (max(count // self._cull_frequency, 1),),
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._store(self.make_and_validate_key(key, version=version), value, timeout, only_if_missing=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._store(self.make_and_validate_key(key, version=version), value, timeout, only_if_missing=True)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self._expires(timeout), key, time.time()),
+            )
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connect()
+        try:
+            return conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount > 0
+        finally:
+            conn.close()
+
+    def incr(self, key, delta=1, version=None):
+        """Atomically add ``delta`` to a stored number, across processes."""
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT value, expires FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            conn.execute('UPDATE cache_entries SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+            conn.execute('COMMIT')
+            return value
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            conn.close()
+
+    def clear(self):
+        conn = self._connect()
+        try:
+            conn.execute('DELETE FROM cache_entries')
+        finally:
+            conn.close()
+
+
+class ResponseCache:
+    """Versioned read-through cache of endpoint responses on top of a Django cache."""
+
+    GENERATION_KEY = 'responses:generation'
+    COUNTER_KEYS = {'hits': 'responses:hits', 'misses': 'responses:misses'}
+
+    def __init__(self, cache: BaseCache, timeout: Optional[int] = RESPONSE_CACHE_TIMEOUT):
+        self.cache = cache
+        self.timeout = timeout
+        # This process's hits and misses not yet added to the shared counters
+        self._counts = dict.fromkeys(self.COUNTER_KEYS, 0)
+        self._counts_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.timeout)
+
+    def _count(self, counter: str):
+        with self._counts_lock:
+            self._counts[counter] += 1
+            due = time.monotonic() - self._flushed_at >= RESPONSE_CACHE_STATS_SECONDS
+        if due:
+            self.flush_counts()
+
+    def _incr(self, key: str, delta: int):
+        try:
+            self.cache.incr(key, delta)
+        except ValueError:
+            if not self.cache.add(key, delta, timeout=None):
+                self.cache.incr(key, delta)
+
+    def flush_counts(self):
+        """Add this process's hits and misses since the last flush to the counters shared in the cache."""
+        with self._counts_lock:
+            counts, self._counts = self._counts, dict.fromkeys(self.COUNTER_KEYS, 0)
+            self._flushed_at = time.monotonic()
+        try:
+            for counter, count in counts.items():
+                if count:
+                    self._incr(self.COUNTER_KEYS[counter], count)
+        except (sqlite3.Error, OSError) as e:
+            # Only statistics are lost
+            logging.warning(f"Response cache stats flush failed: {e}")
+
+    def _generation(self) -> int:
+        return self.cache.get(self.GENERATION_KEY) or 0
+
+    def _key(self, name: str, params: Dict[str, Any]) -> str:
+        # Hashed so any parameter value (spaces, accents, length) makes a valid key
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f'responses:{name}:{self._generation()}:{digest}'
+
+    def _lookup(self, name: str, params: Dict[str, Any]):
+        # (key, value): value is _MISSING on a miss, key is None if the cache is unusable
+        if not self.enabled:
+            return None, _MISSING
+        try:
+            key = self._key(name, params)
+            value = self.cache.get(key, _MISSING)
+            self._count('misses' if value is _MISSING else 'hits')
+            return key, value
+        except (sqlite3.Error, OSError) as e:
+            # A broken cache must never fail a request; compute the response instead
+            logging.warning(f"Response cache lookup failed: {e}")
+            return None, _MISSING
+
+    def _store(self, key: Optional[str], value):
+        if key is None:
+            return
+        try:
+            self.cache.set(key, value, timeout=self.timeout)
+        except (sqlite3.Error, OSError, pickle.PicklingError) as e:
+            logging.warning(f"Response cache store failed: {e}")
+
+    def get_or_set(self, name: str, params: Dict[str, Any], compute: Callable[[], Any]):
+        """Return the cached response for ``name`` and ``params``, computing and storing it on a miss."""
+        key, value = self._lookup(name, params)
+        if value is _MISSING:
+            value = compute()
+            self._store(key, value)
+        return value
+
+    async def aget_or_set(self, name: str, params: Dict[str, Any], compute: Callable[[], Awaitable[Any]]):
+        """:meth:`get_or_set` for a coroutine ``compute``; SQLite calls run in a thread."""
+        key, value = await asyncio.to_thread(self._lookup, name, params)
+        if value is _MISSING:
+            value = await compute()
+            await asyncio.to_thread(self._store, key, value)
+        return value
+
+    def invalidate(self):
+        """Start a new generation: every response cached so far is ignored. Call after each quote write."""
+        try:
+            try:
+                self.cache.incr(self.GENERATION_KEY)
+            except ValueError:
+                if not self.cache.add(self.GENERATION_KEY, 1, timeout=None):
+                    self.cache.incr(self.GENERATION_KEY)
+        except (sqlite3.Error, OSError) as e:
+            # Without a new generation stale responses could be served; try to drop them all
+            logging.error(f"Response cache invalidation failed: {e}")
+            try:
+                self.cache.clear()
+            except (sqlite3.Error, OSError):
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        self.flush_counts()
+        hits, misses = (self.cache.get(key) or 0 for key in self.COUNTER_KEYS.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0,
+            'generation': self._generation(),
+        }
+
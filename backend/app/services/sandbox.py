@@ -0,0 +1,120 @@
+"""Run a function in a forked child process with a deadline and a memory cap.
+
+PDF extraction is pure Python and has no cancellation points, so the only
+dependable way to stop a runaway document is to run it in a process that can
+be killed. :func:`run_limited` forks a child, caps its address space with
+``RLIMIT_AS`` and kills it when the deadline passes. The return value or
+exception of the function is passed back to the caller; :func:`iter_limited`
+does the same for a generator, passing its items back one at a time.
+
+Forking keeps the child's start-up cost low and lets the function be any
+callable, closures included. On platforms without ``fork`` or the
+``resource`` module :data:`SANDBOX_AVAILABLE` is False and callers should run
+the function directly.
+"""
+import multiprocessing
+import os
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SANDBOX_AVAILABLE = resource is not None and 'fork' in multiprocessing.get_all_start_methods()
+
+
+class SandboxTimeout(Exception):
+    """The function did not finish before the deadline and its process was killed."""
+
+
+class SandboxMemoryError(Exception):
+    """The function ran out of its memory allowance."""
+
+
+class SandboxCrashed(Exception):
+    """The child process died without reporting a result (e.g. killed by a signal)."""
+
+
+def _address_space_in_use() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _child(conn, fn, args, kwargs, memory_bytes):
+    try:
+        if memory_bytes:
+            # The allowance comes on top of what the forked process already maps
+            limit = memory_bytes + (_address_space_in_use() or 0)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        for item in fn(*args, **kwargs):
+            conn.send(('item', item))
+        outcome = ('done', None)
+    except MemoryError:
+        outcome = ('memory', None)
+    except BaseException as e:
+        outcome = ('raise', e)
+    try:
+        conn.send(outcome)
+    except Exception as e:
+        # The exception could not be pickled; report it as text
+        conn.send(('raise', RuntimeError(f'{type(outcome[1]).__name__}: {outcome[1]} ({e})')))
+    finally:
+        conn.close()
+
+
+def iter_limited(fn: Callable[..., Iterable[Any]], *args, timeout: Optional[float] = None, memory_bytes: Optional[int] = None, **kwargs) -> Iterator[Any]:
+    """Iterate ``fn(*args, **kwargs)`` in a forked child, yielding its items as they are produced.
+
+    ``timeout`` covers the whole iteration, including time the caller spends
+    between items. Raises :class:`SandboxTimeout` past it,
+    :class:`SandboxMemoryError` when the child exceeds ``memory_bytes`` of
+    additional address space, :class:`SandboxCrashed` if it dies otherwise,
+    and re-raises any exception ``fn`` raised.
+    """
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_child, args=(sender, fn, args, kwargs, memory_bytes), daemon=True)
+    process.start()
+    sender.close()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while True:
+            if not receiver.poll(None if deadline is None else max(deadline - time.monotonic(), 0)):
+                raise SandboxTimeout()
+            try:
+                kind, value = receiver.recv()
+            except EOFError:
+                kind, value = 'crashed', None
+            if kind != 'item':
+                break
+            yield value
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+    if kind == 'crashed':
+        raise SandboxCrashed(f'exit code {process.exitcode}')
+    if kind == 'memory':
+        raise SandboxMemoryError()
+    if kind == 'raise':
+        raise value
+
+
+def _call(fn, args, kwargs):
+    yield fn(*args, **kwargs)
+
+
+def run_limited(fn: Callable[..., Any], *args, timeout: Optional[float] = None, memory_bytes: Optional[int] = None, **kwargs) -> Any:
+    """Call ``fn(*args, **kwargs)`` in a forked child and return its result.
+
+    Limits and errors are those of :func:`iter_limited`.
+    """
+    for value in iter_limited(_call, fn, args, kwargs, timeout=timeout, memory_bytes=memory_bytes):
+        return value
@@ -0,0 +1,94 @@
+"""Text normalisation shared by the quote searches of both backends.
+
+Full-text search (``/quotes/search``) indexes the quotes by *terms*: their
+words fold()ed, without Spanish stop words and reduced by :func:`stem`. Both
+backends store the terms of a quote in two columns/fields, ``search_names``
+(procedure and surgeon names, ranked higher) and ``search_text``
+(description and notes), and the query goes through the same steps; the
+database indexes and ranks those terms and never stems anything itself.
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+# Words too common to tell quotes apart (already fold()ed)
+SPANISH_STOP_WORDS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'que', 'se', 'su', 'sus', 'u', 'un', 'una', 'unas', 'unos', 'y',
+})
+# Quote fields the search columns are computed from
+SEARCH_SOURCE_FIELDS = ('procedure_name', 'surgeon_name', 'procedure_description', 'notes')
+MAX_SEARCH_OFFSET = 10000
+
+_WORDS = re.compile(r'\w+')
+
+
+def fold(value) -> str:
+    """Lowercase, strip accents and collapse whitespace, for the ``*_search`` columns."""
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', value.lower())
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def canonical(value: Optional[str]) -> str:
+    """fold()ed words of ``value`` without punctuation or Spanish stop words, space-separated."""
+    return ' '.join(word for word in _WORDS.findall(fold(value)) if word not in SPANISH_STOP_WORDS)
+
+
+def stem(word: str) -> str:
+    """Light Spanish stem of a fold()ed word: drops gender and plural endings.
+
+    Savoy's light stemmer (the one of Lucene's SpanishLightStemmer), so that
+    "rodilla"/"rodillas", "laparoscópico"/"laparoscópica" or "tumor"/"tumores"
+    meet, without the aggressive suffix stripping of Snowball that would
+    merge unrelated medical terms. Words under five letters are kept whole.
+    """
+    if len(word) < 5:
+        return word
+    if word[-1] in 'oae':
+        return word[:-1]
+    if word[-1] == 's':
+        if word.endswith('eses'):
+            return word[:-2]
+        if word.endswith('ces'):
+            return word[:-3] + 'z'
+        if word[-2] in 'oae':
+            return word[:-2]
+    return word
+
+
+def search_terms(value: Optional[str]) -> List[str]:
+    """The full-text terms of ``value``, in order."""
+    return [stem(word) for word in _WORDS.findall(fold(value)) if word not in SPANISH_STOP_WORDS]
+
+
+def search_document(*values: Optional[str]) -> str:
+    """The terms of ``values`` as one space-separated string, for ``search_names``/``search_text``."""
+    return ' '.join(term for value in values for term in search_terms(value))
+
+
+def query_terms(query: Optional[str]) -> List[str]:
+    """The distinct terms of a search query; a quote must have all of them to match."""
+    return list(dict.fromkeys(search_terms(query)))
+
+
+def search_offset(offset: Optional[str]) -> int:
+    """Parse an ``offset`` parameter of a search. ValueError if it is not an integer from 0 to MAX_SEARCH_OFFSET."""
+    if offset in (None, ''):
+        return 0
+    try:
+        value = int(offset)
+    except (TypeError, ValueError):
+        raise ValueError('offset debe ser un número entero') from None
+    if not 0 <= value <= MAX_SEARCH_OFFSET:
+        raise ValueError(f'offset debe estar entre 0 y {MAX_SEARCH_OFFSET}')
+    return value
+
+
+def quote_search_fields(quote) -> dict:
+    """``search_names`` and ``search_text`` of a quote (a dict of its fields)."""
+    return {
+        'search_names': search_document(quote.get('procedure_name'), quote.get('surgeon_name')),
+        'search_text': search_document(quote.get('procedure_description'), quote.get('notes')),
+    }
@@ -0,0 +1,62 @@
+"""Trigram similarity of procedure keys, for pricing suggestions of misspelt procedures.
+
+When no procedure key equals or starts with the one asked for (see
+:mod:`.procedure_stats`), the suggestion falls back to the most similar
+procedure: the one sharing the largest part of their trigrams (Jaccard
+similarity, as PostgreSQL's ``pg_trgm``), if at least
+``PRICING_SIMILARITY_THRESHOLD``. So "apendisectomia" finds
+"apendicectomia" and "colecistectomia laparoscopia" finds "colecistectomia
+laparoscopica".
+
+The trigrams of every procedure key are precomputed into a
+:class:`TrigramIndex` (trigram -> keys) that each worker keeps in memory
+(:class:`~.catalog.CatalogIndex`), reloaded only when the procedure catalog
+changes. A lookup walks the postings of the query's trigrams and never
+compares it with every procedure.
+"""
+import os
+from collections import Counter, defaultdict
+from typing import Iterable, List, Set, Tuple
+
+# Set PRICING_SIMILAR_MATCH=False to suggest prices for equal or prefix matches only
+PRICING_SIMILAR_MATCH = os.getenv('PRICING_SIMILAR_MATCH', 'True').lower() in ('1', 'true', 'yes')
+PRICING_SIMILARITY_THRESHOLD = float(os.getenv('PRICING_SIMILARITY_THRESHOLD', '0.4'))
+
+
+def trigrams(key: str) -> Set[str]:
+    """Trigrams of the words of ``key``, each padded as pg_trgm does ("  word ")."""
+    return {padded[i:i + 3] for word in key.split() for padded in [f'  {word} '] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Procedure keys found by trigram similarity to another key."""
+
+    def __init__(self, entries: Iterable[Tuple[str, str]]):
+        """``entries``: ``(key, name)`` pairs."""
+        self._sizes = {}
+        self._postings = defaultdict(list)
+        for key, _ in entries:
+            grams = trigrams(key)
+            if not grams or key in self._sizes:
+                continue
+            self._sizes[key] = len(grams)
+            for gram in grams:
+                self._postings[gram].append(key)
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def similar(self, key: str, threshold: float = PRICING_SIMILARITY_THRESHOLD, limit: int = 1) -> List[Tuple[str, float]]:
+        """Up to ``limit`` ``(key, similarity)`` of at least ``threshold``, most similar first."""
+        grams = trigrams(key)
+        if not grams:
+            return []
+        shared = Counter(other for gram in grams for other in self._postings.get(gram, ()))
+        scored = [
+            (other, count / (len(grams) + self._sizes[other] - count))
+            for other, count in shared.items()
+        ]
+        # Ties go to the alphabetically first key, so every worker answers alike
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return [(other, round(score, 3)) for other, score in scored[:limit] if score >= threshold]
+
@@ -2,4 +2,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Served by an event loop: the read endpoints' async views fit it (see quotes.async_views)
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
 application = get_asgi_application()
@@ -105,6 +105,29 @@ STATIC_URL = '/static/'
 CORS_ALLOW_ALL_ORIGINS = os.getenv('CORS_ALLOW_ALL_ORIGINS', 'True').lower() in ('1', 'true', 'yes')
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '').split(',') if os.getenv('CORS_ALLOWED_ORIGINS') else []
 
+# Serve the most read endpoints with the async views of quotes.async_views
+# rather than the DRF views of quotes.views. backend/asgi.py turns it on
+# unless it is set: under WSGI every async view would go through async_to_sync.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False').lower() in ('1', 'true', 'yes')
+
+# Largest non-file request body; POST /api/quotes/bulk/ takes up to BULK_MAX_QUOTES quotes
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('DATA_UPLOAD_MAX_MB', '20')) * 1024 * 1024
+
+# Responses of the read-mostly endpoints, in a SQLite file every worker shares
+# (see app.services.response_cache). RESPONSE_CACHE_TIMEOUT=0 disables it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': 'app.services.response_cache.SQLiteCache',
+        'LOCATION': os.getenv('RESPONSE_CACHE_PATH', str(BASE_DIR / 'data' / 'response_cache.sqlite3')),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300')),
+        'KEY_PREFIX': 'django',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
@@ -0,0 +1,148 @@
+"""Synthetic quote PDFs for the ingestion benchmark and the tests.
+
+The PDFs are written by hand (no PDF library needed) and are byte-for-byte
+reproducible for a given seed, so timings from different runs and machines
+are measured on the same documents.
+"""
+import io
+import random
+from pathlib import Path
+from typing import List, NamedTuple, Sequence
+
+PAGE_SIZES = (1, 10, 100)
+KINDS = ('text', 'table')
+
+_PROCEDURES = (
+    'Colecistectomía laparoscópica', 'Reemplazo total de rodilla', 'Artroscopia de hombro',
+    'Apendicectomía laparoscópica', 'Bypass gástrico', 'Hernioplastía inguinal',
+)
+_SURGEONS = ('Roberto Martinez Lopez', 'Ana Sofia Herrera', 'Luis Fernando Ortega', 'Maria Elena Castillo')
+_FILLER = (
+    'El paciente recibirá indicaciones preoperatorias por escrito.',
+    'Los honorarios médicos se cotizan por separado.',
+    'Esta cotización tiene vigencia de treinta días naturales.',
+    'Cualquier estudio adicional se cobrará según tabulador vigente.',
+    'Se requiere depósito en garantía al momento del ingreso.',
+)
+LINES_PER_PAGE = 45
+ROWS_PER_PAGE = 25
+
+
+def _escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _write_pdf(streams: Sequence[str]) -> bytes:
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None, '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>']
+    kids = []
+    for body in streams:
+        body = body.encode('cp1252')
+        objects.append('<< /Length %d >>\nstream\n' % len(body) + body.decode('latin-1') + '\nendstream')
+        objects.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        kids.append('%d 0 R' % len(objects))
+    objects[1] = '<< /Type /Pages /Kids [%s] /Count %d >>' % (' '.join(kids), len(kids))
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(('%d 0 obj\n%s\nendobj\n' % (number, obj)).encode('latin-1'))
+    xref = out.tell()
+    out.write(('xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)).encode())
+    for offset in offsets:
+        out.write(('%010d 00000 n \n' % offset).encode())
+    out.write(('trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)).encode())
+    return out.getvalue()
+
+
+def make_pdf(pages: Sequence[Sequence[str]]) -> bytes:
+    """Build a PDF with one text line per entry of each page's line list.
+
+    Line ``n`` of a page spans ``top`` 34 + 12n to 44 + 12n in pdfplumber coordinates.
+    """
+    return _write_pdf([
+        'BT /F1 10 Tf 12 TL 40 800 Td ' + ' '.join('(%s) Tj T*' % _escape(line) for line in lines) + ' ET'
+        for lines in pages
+    ])
+
+
+def make_table_pdf(pages: Sequence[Sequence[Sequence[str]]], column_width: float = 130) -> bytes:
+    """Build a PDF with one ruled table per page, one row per entry of the page's row list."""
+    streams = []
+    for rows in pages:
+        columns = max((len(row) for row in rows), default=0)
+        left, top, height = 40, 800, 16
+        ops = ['0.5 w']
+        for index in range(len(rows) + 1):
+            y = top - index * height
+            ops.append('%d %d m %d %d l S' % (left, y, left + columns * column_width, y))
+        for index in range(columns + 1):
+            x = left + index * column_width
+            ops.append('%d %d m %d %d l S' % (x, top, x, top - len(rows) * height))
+        for index, row in enumerate(rows):
+            for column, cell in enumerate(row):
+                ops.append('BT /F1 9 Tf %d %d Td (%s) Tj ET' % (left + column * column_width + 4, top - (index + 1) * height + 5, _escape(cell)))
+        streams.append('\n'.join(ops))
+    return _write_pdf(streams)
+
+
+def _quote_lines(rng: random.Random) -> List[str]:
+    facility, equipment, anesthesia = (rng.randrange(5, 200) * 500 for _ in range(3))
+    return [
+        'HOSPITAL ANGELES - COTIZACION QUIRURGICA',
+        'Paciente: EXP-%04d-%04d  Edad: %d años  Teléfono: (55) %04d-%04d' % (
+            rng.randrange(2020, 2026), rng.randrange(10000), rng.randrange(18, 90), rng.randrange(10000), rng.randrange(10000)),
+        'Procedimiento: %s' % rng.choice(_PROCEDURES),
+        'Cirujano: Dr. %s' % rng.choice(_SURGEONS),
+        'Duración: %d horas' % rng.randrange(1, 9),
+        'Anestesia general balanceada',
+        'Instalaciones: $%s' % format(facility, ','),
+        'Equipos: $%s' % format(equipment, ','),
+        'Anestesia: $%s' % format(anesthesia, ','),
+        'Total: $%s' % format(facility + equipment + anesthesia, ','),
+    ]
+
+
+def text_document(pages: int, rng: random.Random) -> bytes:
+    """A quote on the first page followed by pages of dense terms and conditions."""
+    first = _quote_lines(rng)
+    content = [first + [rng.choice(_FILLER) for _ in range(LINES_PER_PAGE - len(first))]]
+    for _ in range(pages - 1):
+        content.append([rng.choice(_FILLER) for _ in range(LINES_PER_PAGE)])
+    return make_pdf(content)
+
+
+def table_document(pages: int, rng: random.Random) -> bytes:
+    """The quote as a header table, followed by itemized supply tables on every page."""
+    header = [line.split(': ', 1) if ': ' in line else [line, ''] for line in _quote_lines(rng)]
+    content = []
+    for number in range(pages):
+        rows = header if number == 0 else []
+        rows = rows + [
+            ['Insumo %d-%d' % (number + 1, row), '%d pzas' % rng.randrange(1, 20), '$%s' % format(rng.randrange(1, 500) * 10, ',')]
+            for row in range(ROWS_PER_PAGE - len(rows))
+        ]
+        content.append(rows)
+    return make_table_pdf(content)
+
+
+class CorpusDocument(NamedTuple):
+    name: str
+    kind: str
+    pages: int
+    path: Path
+
+
+def generate_corpus(directory, seed: int = 0, sizes: Sequence[int] = PAGE_SIZES, kinds: Sequence[str] = KINDS) -> List[CorpusDocument]:
+    """Write one PDF per kind and page count into ``directory``."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    documents = []
+    for kind in kinds:
+        build = text_document if kind == 'text' else table_document
+        for pages in sizes:
+            name = f'{kind}-{pages:03d}'
+            path = directory / f'{name}.pdf'
+            path.write_bytes(build(pages, random.Random(f'{seed}:{name}')))
+            documents.append(CorpusDocument(name, kind, pages, path))
+    return documents
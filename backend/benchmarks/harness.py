@@ -0,0 +1,170 @@
+"""PDF ingestion benchmark.
+
+Times the three stages of a PDF upload separately on the synthetic corpus
+from :mod:`benchmarks.corpus`:
+
+* ``extract``  - ``pdf_service.extract_text_from_pdf`` (full document)
+* ``parse``    - ``quote_parser.parse_quote_from_text`` on the extracted text
+* ``endpoint`` - ``POST /api/upload-pdf/`` through the Django app, on a throwaway test database
+
+Each (stage, document) pair runs in a fresh worker process so its peak memory
+can be read from the process's max RSS. The PDF cache is disabled, so every
+run does the full work. Run from ``backend/``::
+
+    python -m benchmarks.harness                  # compare with baselines.json
+    python -m benchmarks.harness --sizes 1,10     # skip the 100-page documents
+    python -m benchmarks.harness --save-baseline  # record this machine's numbers
+
+Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .corpus import KINDS, PAGE_SIZES, CorpusDocument, generate_corpus
+
+STAGES = ('extract', 'parse', 'endpoint')
+BASELINE_PATH = Path(__file__).resolve().parent / 'baselines.json'
+# Parsing one document takes well under a millisecond; time it in loops of this many
+PARSE_LOOP = 20
+
+
+def _disable_pdf_cache():
+    from app.services import pdf_service
+    from app.services.pdf_cache import PDFCache
+    pdf_service.pdf_cache = PDFCache(max_entries=0)
+
+
+def _endpoint_client():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    # An in-memory SQLite test database unless USE_SQLITE=False is exported
+    os.environ.setdefault('USE_SQLITE', 'True')
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework.test import APIClient
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    return APIClient()
+
+
+def _measure(stage: str, path: str, repeat: int) -> Dict[str, Any]:
+    """Run one stage on one document ``repeat`` times; runs in its own worker process."""
+    from app.services.pdf_service import extract_text_from_pdf
+    from app.services.quote_parser import parse_quote_from_text
+    _disable_pdf_cache()
+
+    if stage == 'extract':
+        def run():
+            extract_text_from_pdf(path, early_exit=False)
+    elif stage == 'parse':
+        text = extract_text_from_pdf(path, early_exit=False)
+
+        def run():
+            for _ in range(PARSE_LOOP):
+                parse_quote_from_text(text)
+    else:
+        client = _endpoint_client()
+
+        def run():
+            with open(path, 'rb') as f:
+                resp = client.post('/api/upload-pdf/', {'file': f}, format='multipart')
+            if resp.status_code != 200:
+                raise RuntimeError(f'upload-pdf returned {resp.status_code}: {resp.data}')
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    if stage == 'parse':
+        times = [t / PARSE_LOOP for t in times]
+    # ru_maxrss is in KiB on Linux
+    peak_mb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before, 0) / 1024
+    return {'seconds': min(times), 'peak_mb': peak_mb}
+
+
+def run_benchmark(documents: List[CorpusDocument], stages=STAGES, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    """Return ``{"stage/document": {"docs_per_sec", "ms_per_page", "peak_mb"}}``."""
+    results = {}
+    for stage in stages:
+        for doc in documents:
+            with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+                measured = pool.submit(_measure, stage, str(doc.path), repeat).result()
+            results[f'{stage}/{doc.name}'] = {
+                'docs_per_sec': round(1 / measured['seconds'], 3),
+                'ms_per_page': round(measured['seconds'] * 1000 / doc.pages, 4),
+                'peak_mb': round(measured['peak_mb'], 1),
+            }
+    return results
+
+
+def load_baselines(path: Path = BASELINE_PATH) -> Dict[str, Dict[str, float]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def report(results, baselines, max_regression=None) -> List[str]:
+    """Print a table of ``results`` against ``baselines`` and return the keys slower than allowed."""
+    regressions = []
+    print(f"{'benchmark':<22}{'docs/s':>10}{'ms/page':>11}{'peak MB':>9}{'baseline':>11}{'change':>9}")
+    for key, row in results.items():
+        base = baselines.get(key)
+        change = ''
+        if base:
+            delta = (row['ms_per_page'] - base['ms_per_page']) / base['ms_per_page'] * 100
+            change = f'{delta:+.1f}%'
+            if max_regression is not None and delta > max_regression:
+                regressions.append(key)
+        print(f"{key:<22}{row['docs_per_sec']:>10.2f}{row['ms_per_page']:>11.3f}{row['peak_mb']:>9.1f}"
+              f"{(base['ms_per_page'] if base else float('nan')):>11.3f}{change:>9}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, PAGE_SIZES)), help='page counts to generate (default: %(default)s)')
+    parser.add_argument('--kinds', default=','.join(KINDS), help='document kinds (default: %(default)s)')
+    parser.add_argument('--stages', default=','.join(STAGES), help='stages to time (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement; the fastest counts (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', help='keep the generated PDFs in this directory')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='merge these results into the baseline file')
+    parser.add_argument('--max-regression', type=float, help='exit with status 1 if any ms/page is this many percent above its baseline')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        documents = generate_corpus(
+            args.corpus or scratch, seed=args.seed,
+            sizes=[int(size) for size in args.sizes.split(',')], kinds=args.kinds.split(','),
+        )
+        results = run_benchmark(documents, args.stages.split(','), args.repeat)
+
+    baselines = load_baselines(args.baseline)
+    regressions = report(results, baselines, args.max_regression)
+    if args.save_baseline:
+        baselines.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write('\n')
+    if regressions:
+        print(f"Slower than baseline by more than {args.max_regression}%: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Read endpoint load benchmark: the DRF views of quotes.views against quotes.async_views.
+
+Serves the Django app as one ASGI worker would (``get_asgi_application()`` on
+one event loop, as a uvicorn worker of gunicorn_config.py runs it) and sends
+it ``--concurrency`` requests at a time through httpx's ASGI transport, for
+each read endpoint in turn. Each variant (``ASYNC_READ_VIEWS`` off and on)
+runs in a fresh worker process on its own in-memory SQLite test database of
+``--quotes`` quotes. The response cache is off unless ``--cache`` is given,
+so every request reaches the database. Run from ``backend/``::
+
+    python -m benchmarks.read_load
+    python -m benchmarks.read_load --concurrency 64 --requests 1000
+    python -m benchmarks.read_load --endpoints list,retrieve --cache
+
+Numbers are only comparable between runs on the same machine.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+VARIANTS = ('sync', 'async')
+ENDPOINTS = {
+    'list': '/api/quotes/?limit=50',
+    'retrieve': '/api/quotes/{quote_id}/',
+    'dashboard': '/api/dashboard/',
+    'procedures': '/api/procedures/?prefix=artro&limit=10',
+    'surgeons': '/api/surgeons/',
+    'pricing': '/api/pricing-suggestions/artroscopia de rodilla/',
+}
+PROCEDURES = ('Artroscopia de rodilla', 'Colecistectomía laparoscópica', 'Apendicectomía', 'Hernioplastia inguinal')
+SURGEONS = ('Dra. Pérez', 'Dr. Gómez', 'Dra. Ruiz', 'Dr. Martín', 'Dr. Sánchez')
+
+
+def _seed(count: int) -> str:
+    """Create ``count`` quotes with packages; returns the id of one of them."""
+    from quotes.models import Quote, SurgicalPackage
+    packages = SurgicalPackage.objects.bulk_create([SurgicalPackage(hospital_stay_nights=i % 4) for i in range(count)])
+    quotes = Quote.objects.bulk_create([
+        Quote(
+            procedure_name=PROCEDURES[i % len(PROCEDURES)], surgeon_name=SURGEONS[i % len(SURGEONS)],
+            surgery_duration_hours=1 + i % 3, facility_fee=1000 + i, anesthesia_fee=300, total_cost=1300 + i,
+            surgical_package=package,
+        )
+        for i, package in enumerate(packages)
+    ])
+    return quotes[0].id
+
+
+def _app(variant: str, quotes: int, cache: bool):
+    os.environ['ASYNC_READ_VIEWS'] = str(variant == 'async')
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'backend.settings'
+    # An in-memory SQLite test database unless USE_SQLITE=False is exported
+    os.environ.setdefault('USE_SQLITE', 'True')
+    os.environ['RESPONSE_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'responses.sqlite3')
+    if not cache:
+        os.environ['RESPONSE_CACHE_TIMEOUT'] = '0'
+    import django
+    django.setup()
+    from django.core.asgi import get_asgi_application
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    return get_asgi_application(), _seed(quotes)
+
+
+async def _load(app, paths: Dict[str, str], requests: int, concurrency: int) -> Dict[str, Dict[str, float]]:
+    import httpx
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://testserver') as client:
+        for name, path in paths.items():
+            # Warm up: imports, catalog indexes, connections
+            resp = await client.get(path)
+            if resp.status_code != 200:
+                raise RuntimeError(f'{path} returned {resp.status_code}: {resp.text[:200]}')
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+
+            async def one():
+                async with semaphore:
+                    start = time.perf_counter()
+                    resp = await client.get(path)
+                    latencies.append(time.perf_counter() - start)
+                    resp.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(requests)))
+            elapsed = time.perf_counter() - start
+            quantiles = statistics.quantiles(latencies, n=100)
+            results[name] = {
+                'req_per_sec': round(requests / elapsed, 1),
+                'p50_ms': round(quantiles[49] * 1000, 2),
+                'p95_ms': round(quantiles[94] * 1000, 2),
+            }
+    return results
+
+
+def _measure(variant: str, endpoints: List[str], quotes: int, requests: int, concurrency: int, cache: bool) -> Dict[str, Any]:
+    """Load every endpoint of one variant; runs in its own worker process."""
+    app, quote_id = _app(variant, quotes, cache)
+    paths = {name: ENDPOINTS[name].format(quote_id=quote_id) for name in endpoints}
+    return asyncio.run(_load(app, paths, requests, concurrency))
+
+
+def run_benchmark(endpoints=tuple(ENDPOINTS), variants=VARIANTS, quotes: int = 500, requests: int = 400,
+                  concurrency: int = 32, cache: bool = False) -> Dict[str, Dict[str, float]]:
+    """Return ``{"variant/endpoint": {"req_per_sec", "p50_ms", "p95_ms"}}``."""
+    results = {}
+    for variant in variants:
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+            measured = pool.submit(_measure, variant, list(endpoints), quotes, requests, concurrency, cache).result()
+        for endpoint, row in measured.items():
+            results[f'{variant}/{endpoint}'] = row
+    return results
+
+
+def report(results):
+    print(f"{'benchmark':<22}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for key, row in results.items():
+        print(f"{key:<22}{row['req_per_sec']:>10.1f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='endpoints to load (default: %(default)s)')
+    parser.add_argument('--variants', default=','.join(VARIANTS), help='views to compare (default: %(default)s)')
+    parser.add_argument('--quotes', type=int, default=500, help='quotes in the database (default: %(default)s)')
+    parser.add_argument('--requests', type=int, default=400, help='requests per endpoint (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=32, help='requests in flight at once (default: %(default)s)')
+    parser.add_argument('--cache', action='store_true', help='leave the response cache on')
+    args = parser.parse_args(argv)
+
+    report(run_benchmark(
+        args.endpoints.split(','), args.variants.split(','), args.quotes, args.requests, args.concurrency, args.cache,
+    ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
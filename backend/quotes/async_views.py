@@ -0,0 +1,79 @@
+"""Async views of the most read endpoints, for ASGI workers (see ``ASYNC_READ_VIEWS``).
+
+list_quotes, retrieve_quote, dashboard, procedures, surgeons and
+pricing_suggestions answer exactly as their views in quotes.views, from the
+same functions of quotes.reads. Each runs them in one ``sync_to_async``
+call, so a request makes one trip to Django's database thread rather than
+one per query (which is all Django 4.2's async ORM methods do), and the rest
+of the request stays on the worker's event loop.
+
+DRF 3.15 has no async views, so these are plain Django views: they render
+with DRF's JSONRenderer themselves, which also spares Django the thread hop
+it takes to render a DRF Response under ASGI.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.renderers import JSONRenderer
+
+from . import reads
+from .reads import conditional, quote_validators, quotes_validators
+
+
+class JSONResponse(HttpResponse):
+    """``data`` rendered as DRF renders it, kept on ``.data`` as DRF's Response keeps it."""
+
+    def __init__(self, data, status=status.HTTP_200_OK, **kwargs):
+        super().__init__(JSONRenderer().render(data), content_type='application/json', status=status, **kwargs)
+        self.data = data
+
+
+def _async_get(body):
+    """An async GET view answering with ``body(request, *args, **kwargs)``, a ``(body, status)`` of quotes.reads."""
+    abody = sync_to_async(body)
+
+    # require_GET of Django 4.2 does not take coroutines
+    @wraps(body)
+    async def view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            detail = MethodNotAllowed(request.method).detail
+            return JSONResponse({'detail': detail}, status.HTTP_405_METHOD_NOT_ALLOWED, headers={'Allow': 'GET, HEAD'})
+        data, code = await abody(request, *args, **kwargs)
+        return JSONResponse(data, code)
+    return view
+
+
+@conditional(quotes_validators)
+@_async_get
+def list_quotes(request):
+    return reads.quote_list(request.GET)
+
+
+@conditional(quote_validators)
+@_async_get
+def retrieve_quote(request, quote_id):
+    return reads.quote_detail(quote_id)
+
+
+@_async_get
+def pricing_suggestions(request, procedure_name):
+    return reads.pricing_suggestions(procedure_name)
+
+
+@_async_get
+def procedures(request):
+    return reads.procedures(request.GET)
+
+
+@_async_get
+def surgeons(request):
+    return reads.surgeons(request.GET)
+
+
+@conditional(quotes_validators)
+@_async_get
+def dashboard(request):
+    return reads.dashboard()
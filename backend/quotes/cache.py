@@ -0,0 +1,18 @@
+from django.core.cache import caches
+from django.db import transaction
+
+from app.services.response_cache import ResponseCache
+
+# Read-through cache of the procedures, surgeons, dashboard and pricing suggestion responses
+response_cache = ResponseCache(caches['responses'], timeout=caches['responses'].default_timeout)
+
+
+def invalidate_responses():
+    """Stop serving responses cached before a quote write.
+
+    Called once right away, so later reads in the same transaction miss, and
+    once on commit, so a response computed from the old rows in between is
+    not served either.
+    """
+    response_cache.invalidate()
+    transaction.on_commit(response_cache.invalidate)
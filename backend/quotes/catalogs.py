@@ -0,0 +1,31 @@
+from app.services.catalog import CatalogIndex, PrefixIndex
+from app.services.trigrams import TrigramIndex
+from .models import Procedure, ProcedureStats
+
+# This process's autocomplete index of each catalog model (see app.services.catalog)
+_indexes = {}
+# and trigram index of the ProcedureStats keys (see app.services.trigrams)
+_procedure_trigrams = CatalogIndex(TrigramIndex)
+
+
+def catalog_index(catalog) -> PrefixIndex:
+    """The PrefixIndex of a catalog (Procedure or Surgeon), reloaded if the catalog changed since it was built."""
+    index = _indexes.setdefault(catalog, CatalogIndex())
+    # (value, updated_at): the time tells apart counters rolled back to the same value
+    version = catalog.version()
+    if index.stale(version):
+        index.update(version, catalog.objects.values_list('key', 'name').iterator(chunk_size=2000))
+    return index.current
+
+
+def procedure_trigrams() -> TrigramIndex:
+    """The TrigramIndex of the procedure keys, reloaded if the procedure catalog changed since it was built.
+
+    A new or deleted ProcedureStats row comes with a new or deleted
+    Procedure entry, so the catalog's version tells when the keys changed.
+    """
+    version = Procedure.version()
+    if _procedure_trigrams.stale(version):
+        _procedure_trigrams.update(version, ProcedureStats.objects.values_list('procedure_key', 'procedure_name').iterator(chunk_size=2000))
+    return _procedure_trigrams.current
+
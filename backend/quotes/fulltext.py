@@ -0,0 +1,97 @@
+"""Full-text index of the quotes' ``search_names``/``search_text`` columns (see app.services.search).
+
+The columns hold already stemmed terms, so the databases only have to index
+and rank words:
+
+* SQLite: an external-content FTS5 table, ``quote_fts``, kept in step with
+  ``quotes_quote`` by triggers, so every write reaches it whatever path it
+  takes. Ranked by bm25 with the names weighing twice the text.
+* PostgreSQL: a GIN index over the ``tsvector`` of both columns (names with
+  weight A, text B) under the ``simple`` configuration. Ranked by ts_rank.
+
+SQLite rebuilds a table to alter it, which drops its triggers and renumbers
+its rows: a migration that changes ``quotes_quote`` must call
+:func:`create_fulltext_index` again after doing so (as it must re-create the
+NOCASE indexes of 0002).
+"""
+from django.db import NotSupportedError, connection
+
+from app.services.search import query_terms
+
+SQLITE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS quote_fts USING fts5("
+    "search_names, search_text, content='quotes_quote', content_rowid='rowid', tokenize='unicode61')"
+)
+SQLITE_TRIGGERS = {
+    'quote_fts_insert': (
+        "AFTER INSERT ON quotes_quote BEGIN "
+        "INSERT INTO quote_fts(rowid, search_names, search_text) VALUES (new.rowid, new.search_names, new.search_text); "
+        "END"
+    ),
+    'quote_fts_delete': (
+        "AFTER DELETE ON quotes_quote BEGIN "
+        "INSERT INTO quote_fts(quote_fts, rowid, search_names, search_text) VALUES ('delete', old.rowid, old.search_names, old.search_text); "
+        "END"
+    ),
+    'quote_fts_update': (
+        "AFTER UPDATE OF search_names, search_text ON quotes_quote BEGIN "
+        "INSERT INTO quote_fts(quote_fts, rowid, search_names, search_text) VALUES ('delete', old.rowid, old.search_names, old.search_text); "
+        "INSERT INTO quote_fts(rowid, search_names, search_text) VALUES (new.rowid, new.search_names, new.search_text); "
+        "END"
+    ),
+}
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', search_names), 'A') || setweight(to_tsvector('simple', search_text), 'B')"
+)
+
+
+def create_fulltext_index(schema_editor):
+    """Create (or re-create) the full-text index and fill it from the search columns."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_FTS)
+        for name, body in SQLITE_TRIGGERS.items():
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            schema_editor.execute(f'CREATE TRIGGER {name} {body}')
+        schema_editor.execute("INSERT INTO quote_fts(quote_fts) VALUES ('rebuild')")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS quote_fulltext_idx ON quotes_quote USING gin (({POSTGRES_VECTOR}))')
+
+
+def drop_fulltext_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for name in SQLITE_TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute('DROP TABLE IF EXISTS quote_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS quote_fulltext_idx')
+
+
+def search_quote_ids(query, limit, offset=0):
+    """Ids of the quotes that have every term of ``query``, best match first, then newest.
+
+    Returns at most ``limit`` ids after skipping ``offset``; an empty list
+    when the query has no terms.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite':
+        # Terms are \w+ words; quoted, they are matched as such and all required
+        sql = (
+            "SELECT q.id FROM quote_fts JOIN quotes_quote q ON q.rowid = quote_fts.rowid "
+            "WHERE quote_fts MATCH %s ORDER BY bm25(quote_fts, 2.0, 1.0), q.created_at DESC, q.id DESC LIMIT %s OFFSET %s"
+        )
+        params = [' '.join(f'"{term}"' for term in terms), limit, offset]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"SELECT id FROM quotes_quote, to_tsquery('simple', %s) query WHERE ({POSTGRES_VECTOR}) @@ query "
+            f"ORDER BY ts_rank(({POSTGRES_VECTOR}), query) DESC, created_at DESC, id DESC LIMIT %s OFFSET %s"
+        )
+        params = [' & '.join(terms), limit, offset]
+    else:
+        raise NotSupportedError(f'La búsqueda de texto no está disponible en {connection.vendor}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,229 @@
+"""Import of quotes from CSV/NDJSON files (see app.services.quote_import).
+
+Used by ``POST /api/quotes/import/`` and ``manage.py import_quotes``, which
+take files of hundreds of thousands of rows. A serializer per row, or even
+model instances and ``bulk_create()``, would hold that to a couple of
+thousand rows a second, mostly spent compiling the INSERTs value by value.
+So rows are checked with the model fields' own ``to_python()`` and
+validators into plain dicts, and written with multi-row INSERTs whose
+parameters are converted by one precomputed function per column.
+
+What ``QuoteQuerySet.bulk_create()`` does besides the INSERT (search
+columns, ProcedureStats, catalogs, the change counter) is done here as
+well, in the transaction of each batch.
+"""
+import math
+import uuid
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import DatabaseError, connection, models, transaction
+from django.utils import timezone
+
+from app.services.bulk_quotes import BULK_BATCH_SIZE, chunked, total_cost
+from app.services.procedure_stats import procedure_key
+from app.services.quote_export import PACKAGE_FIELDS, QUOTE_FIELDS
+from app.services.quote_import import IMPORT_BATCH_ROWS, ImportLog, iter_records
+from app.services.search import fold, quote_search_fields
+from .models import CATALOGS, STATS_FIELDS, ProcedureStats, Quote, SurgicalPackage, quotes_changed
+
+REQUIRED = ['This field is required.']
+ID_TAKEN = ['Ya existe una cotización con este id']
+
+# total_cost is always computed, as create_quote does
+_QUOTE_FIELDS = {name: Quote._meta.get_field(name) for name in QUOTE_FIELDS if name != 'total_cost'}
+_PACKAGE_FIELDS = {name: SurgicalPackage._meta.get_field(name) for name in PACKAGE_FIELDS}
+_QUOTE_COLUMNS = Quote._meta.concrete_fields
+_PACKAGE_COLUMNS = SurgicalPackage._meta.concrete_fields
+# Values of the columns a record leaves out (the lists of JSONField defaults
+# are shared, but only ever serialized); quote ids are drawn per row by _save()
+_QUOTE_DEFAULTS = {field.attname: field.get_default() for field in _QUOTE_COLUMNS if not field.primary_key}
+_PACKAGE_DEFAULTS = {field.attname: field.get_default() for field in _PACKAGE_COLUMNS if not field.primary_key}
+# Django gives SQLite's integer columns no range, but SQLite stores at most 64-bit integers
+_INTEGER_VALIDATORS = [MinValueValidator(-2 ** 63), MaxValueValidator(2 ** 63 - 1)]
+
+
+def _clean(fields, data, errors, prefix=''):
+    values = {}
+    for name, value in data.items():
+        field = fields.get(name)
+        # Unknown columns (and read-only ones such as version) are ignored
+        if field is None:
+            continue
+        try:
+            value = field.to_python(value)
+            if value is None:
+                if not field.null:
+                    raise ValidationError(field.error_messages['null'], code='null')
+            elif not field.blank and value in field.empty_values:
+                raise ValidationError(field.error_messages['blank'], code='blank')
+            elif isinstance(value, float) and not math.isfinite(value):
+                raise ValidationError(field.error_messages['invalid'], code='invalid', params={'value': value})
+            else:
+                # Lengths, and the integer range of the database column
+                field.run_validators(value)
+                if isinstance(field, models.IntegerField):
+                    for validator in _INTEGER_VALIDATORS:
+                        validator(value)
+            values[name] = value
+        except ValidationError as e:
+            errors[prefix + name] = e.messages
+    return values
+
+
+def build_quote(record):
+    """``(quote, package, errors)`` for one imported record: dicts of field values, or None.
+
+    ``package`` is None when the quote has none, and both are None when the
+    record is invalid.
+    """
+    errors = {}
+    values = _clean(_QUOTE_FIELDS, record, errors)
+    if 'procedure_name' not in record:
+        errors['procedure_name'] = REQUIRED
+    package = record.get('surgical_package')
+    if isinstance(package, dict):
+        package = _clean(_PACKAGE_FIELDS, package, errors, 'surgical_package.')
+    elif package is not None:
+        errors['surgical_package'] = ['Se esperaba un objeto']
+    if errors:
+        return None, None, errors
+    created_at = values.get('created_at')
+    if created_at is not None and timezone.is_naive(created_at):
+        values['created_at'] = timezone.make_aware(created_at)
+    values['total_cost'] = total_cost(values)
+    return values, package, None
+
+
+def _to_db(field):
+    """Function from a value of ``field`` to its query parameter; None where the value is passed as is."""
+    # connection is a proxy to the thread's connection; look its operations up once
+    ops = connection.ops
+    if isinstance(field, models.JSONField):
+        adapt_json_value, encoder = ops.adapt_json_value, field.encoder
+        return lambda value: adapt_json_value(value, encoder)
+    if isinstance(field, models.DateTimeField):
+        return ops.adapt_datetimefield_value
+    return None
+
+
+def _insert(model, fields, rows):
+    """INSERT ``rows`` (lists of query parameters for ``fields``) into the table of ``model``.
+
+    Returns the primary keys the database gave the rows when ``fields``
+    leaves it out, else an empty list.
+    """
+    returning = model._meta.pk not in fields
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+    # As many rows per statement as the backend takes parameters (999 on SQLite)
+    max_params = connection.features.max_query_params or BULK_BATCH_SIZE * len(fields)
+    ids = []
+    with connection.cursor() as cursor:
+        for chunk in chunked(rows, max(1, min(BULK_BATCH_SIZE, max_params // len(fields)))):
+            sql = (
+                f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+                f"VALUES {', '.join([placeholders] * len(chunk))}"
+            )
+            if returning:
+                sql += f" RETURNING {connection.ops.quote_name(model._meta.pk.column)}"
+            cursor.execute(sql, [value for row in chunk for value in row])
+            if returning:
+                ids.extend(row[0] for row in cursor.fetchall())
+    return ids
+
+
+def _package_ids(packages):
+    """Insert the packages (dicts of field values) and return their ids, in order."""
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # SQLite before 3.35 has no RETURNING
+        created = SurgicalPackage.objects.bulk_create([SurgicalPackage(**package) for package in packages], batch_size=BULK_BATCH_SIZE)
+        return [package.pk for package in created]
+    fields = [field for field in _PACKAGE_COLUMNS if not field.primary_key]
+    columns = [(field.attname, _to_db(field)) for field in fields]
+    rows = []
+    for package in packages:
+        package = {**_PACKAGE_DEFAULTS, **package}
+        rows.append([package[name] if to_db is None else to_db(package[name]) for name, to_db in columns])
+    return _insert(SurgicalPackage, fields, rows)
+
+
+def _save(quotes, fold, key):
+    """Write ``(quote, package)`` pairs from build_quote() in one transaction."""
+    now = timezone.now()
+    columns = [(field.attname, _to_db(field)) for field in _QUOTE_COLUMNS]
+    with transaction.atomic():
+        package_ids = iter(_package_ids([package for _, package in quotes if package is not None]))
+        rows = []
+        written = []
+        for values, package in quotes:
+            values = {
+                **_QUOTE_DEFAULTS, 'created_at': now, **values,
+                'surgical_package_id': next(package_ids) if package is not None else None,
+                'updated_at': now,
+                'procedure_name_search': fold(values['procedure_name']),
+                'surgeon_name_search': fold(values.get('surgeon_name')),
+                'procedure_key': key(values['procedure_name']),
+            }
+            values.update(quote_search_fields(values))
+            if values.get('id') is None:
+                values['id'] = str(uuid.uuid4())
+            rows.append([values[name] if to_db is None else to_db(values[name]) for name, to_db in columns])
+            written.append(values)
+        _insert(Quote, _QUOTE_COLUMNS, rows)
+        ProcedureStats.add({field: values[field] for field in STATS_FIELDS} for values in written)
+        for catalog in CATALOGS:
+            catalog.add(values[catalog.name_field] for values in written)
+        quotes_changed()
+
+
+def import_quotes(stream, import_format):
+    """Import the quotes of a CSV/NDJSON file; yields the lines of its error file (see ImportLog).
+
+    Each batch of IMPORT_BATCH_ROWS rows is validated and then written in
+    one transaction, so an error in one batch leaves the previous ones in.
+    Rows whose id is already taken are rejected, and so are all the rows of
+    a batch the database refuses; the import goes on with the next batch.
+    """
+    log = ImportLog()
+    # Imports repeat the same few procedures and surgeons
+    folded = lru_cache(maxsize=4096)(fold)
+    keys = lru_cache(maxsize=4096)(procedure_key)
+    for batch in chunked(iter_records(stream, import_format), IMPORT_BATCH_ROWS):
+        log.rows += len(batch)
+        valid = []
+        for row, record, error in batch:
+            if error is not None:
+                yield log.reject(row, {'non_field_errors': [error]})
+                continue
+            quote, package, errors = build_quote(record)
+            if errors:
+                yield log.reject(row, errors)
+            else:
+                valid.append((row, quote, package))
+
+        given = [quote['id'] for _, quote, _ in valid if quote.get('id') is not None]
+        taken = set()
+        for chunk in chunked(given, BULK_BATCH_SIZE):
+            taken.update(Quote.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        rows = []
+        quotes = []
+        for row, quote, package in valid:
+            if quote.get('id') is not None:
+                if quote['id'] in taken:
+                    yield log.reject(row, {'id': ID_TAKEN})
+                    continue
+                taken.add(quote['id'])
+            rows.append(row)
+            quotes.append((quote, package))
+        if quotes:
+            try:
+                _save(quotes, folded, keys)
+            except (DatabaseError, ValueError, OverflowError) as e:
+                for row in rows:
+                    yield log.reject(row, {'non_field_errors': [f'Error guardando la cotización: {e}']})
+            else:
+                log.created += len(quotes)
+        yield log.progress()
+    yield log.result()
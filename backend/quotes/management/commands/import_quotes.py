@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.services.quote_import import import_format
+from quotes.imports import import_quotes
+
+
+class Command(BaseCommand):
+    help = 'Import quotes from a CSV or NDJSON file (the layout of the export)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='default: from the file extension')
+        parser.add_argument('--errors', help='where to write rejected rows and progress (default: <path>.errors.ndjson)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = import_format(path, options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        errors_path = options['errors'] or f'{path}.errors.ndjson'
+        result = {}
+        try:
+            with open(path, 'rb') as stream, open(errors_path, 'w', encoding='utf-8') as errors:
+                for line in import_quotes(stream, file_format):
+                    errors.write(line)
+                    entry = json.loads(line)
+                    if 'progress' in entry:
+                        progress = entry['progress']
+                        self.stdout.write(f"{progress['rows']} filas leídas, {progress['quotes_created']} cotizaciones importadas")
+                    elif 'result' in entry:
+                        result = entry['result']
+        except OSError as e:
+            raise CommandError(str(e))
+
+        style = self.style.SUCCESS if not result.get('rejected') else self.style.WARNING
+        self.stdout.write(style(f"{result.get('message')}; {result.get('rejected', 0)} filas rechazadas (ver {errors_path})"))
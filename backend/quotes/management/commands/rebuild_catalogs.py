@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from quotes.models import Procedure, Surgeon
+
+
+class Command(BaseCommand):
+    help = 'Recount the procedure and surgeon catalogs from the stored quotes'
+
+    def handle(self, *args, **options):
+        procedures = Procedure.rebuild()
+        surgeons = Surgeon.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Catálogos recalculados: {procedures} procedimientos, {surgeons} cirujanos'))
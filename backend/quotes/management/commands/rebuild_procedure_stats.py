@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.services.procedure_stats import procedure_key
+from quotes.models import ProcedureStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-procedure pricing statistics from the stored quotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('procedures', nargs='*', help='only these procedures (default: all)')
+
+    def handle(self, *args, **options):
+        keys = {procedure_key(name) for name in options['procedures']} or None
+        count = ProcedureStats.rebuild(keys)
+        self.stdout.write(self.style.SUCCESS(f'Estadísticas recalculadas para {count} procedimientos'))
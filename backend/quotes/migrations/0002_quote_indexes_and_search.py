@@ -0,0 +1,73 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+from app.services.search import fold
+
+# SQLite's LIKE is case-insensitive, so it only uses an index for
+# LIKE 'prefix%' when the index is NOCASE
+SQLITE_LIKE_INDEXES = {
+    'quote_procedure_search_nocase': 'procedure_name_search',
+    'quote_surgeon_search_nocase': 'surgeon_name_search',
+}
+
+
+def fill_search_fields(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    quotes = list(Quote.objects.only('id', 'procedure_name', 'surgeon_name'))
+    for quote in quotes:
+        quote.procedure_name_search = fold(quote.procedure_name)
+        quote.surgeon_name_search = fold(quote.surgeon_name)
+    Quote.objects.bulk_update(quotes, ['procedure_name_search', 'surgeon_name_search'], batch_size=500)
+
+
+def create_sqlite_like_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, column in SQLITE_LIKE_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX "{name}" ON "quotes_quote" ("{column}" COLLATE NOCASE)')
+
+
+def drop_sqlite_like_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in SQLITE_LIKE_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quote',
+            name='procedure_name_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='surgeon_name_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['created_at'], name='quote_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['status'], name='quote_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['procedure_name'], name='quote_procedure_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['surgeon_name'], name='quote_surgeon_name_idx'),
+        ),
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_sqlite_like_indexes, drop_sqlite_like_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0002_quote_indexes_and_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='quote',
+            name='quote_created_at_idx',
+        ),
+        migrations.AddIndex(
+            model_name='quote',
+            index=models.Index(fields=['created_at', 'id'], name='quote_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:08
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def fill_procedure_stats(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    ProcedureStats = apps.get_model('quotes', 'ProcedureStats')
+    rows = Quote.objects.values('procedure_name_search').order_by().annotate(
+        name=Min('procedure_name'),
+        count=Count('id'),
+        sum_facility_fee=Sum('facility_fee'),
+        sum_equipment_costs=Sum('equipment_costs'),
+        sum_total_cost=Sum('total_cost'),
+        low=Min('total_cost'),
+        high=Max('total_cost'),
+    )
+    ProcedureStats.objects.bulk_create([
+        ProcedureStats(
+            procedure_key=row['procedure_name_search'], procedure_name=row['name'], quote_count=row['count'],
+            sum_facility_fee=row['sum_facility_fee'], sum_equipment_costs=row['sum_equipment_costs'], sum_total_cost=row['sum_total_cost'],
+            min_total_cost=row['low'], max_total_cost=row['high'],
+        )
+        for row in rows
+    ], batch_size=500)
+
+
+# Pricing suggestions look procedures up with LIKE 'prefix%'; see 0002
+def create_sqlite_like_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('CREATE INDEX "procedure_stats_key_nocase" ON "quotes_procedurestats" ("procedure_key" COLLATE NOCASE)')
+
+
+def drop_sqlite_like_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP INDEX IF EXISTS "procedure_stats_key_nocase"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0003_quote_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcedureStats',
+            fields=[
+                ('procedure_key', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('procedure_name', models.CharField(max_length=200)),
+                ('quote_count', models.IntegerField(default=0)),
+                ('sum_facility_fee', models.FloatField(default=0.0)),
+                ('sum_equipment_costs', models.FloatField(default=0.0)),
+                ('sum_total_cost', models.FloatField(default=0.0)),
+                ('min_total_cost', models.FloatField(default=0.0)),
+                ('max_total_cost', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_procedure_stats, migrations.RunPython.noop),
+        migrations.RunPython(create_sqlite_like_index, drop_sqlite_like_index),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:12
+
+from django.db import migrations, models
+
+from app.services.procedure_stats import dump_sketches, quote_totals
+
+
+def fill_sketches(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    ProcedureStats = apps.get_model('quotes', 'ProcedureStats')
+    quotes = Quote.objects.values('procedure_name', 'facility_fee', 'equipment_costs', 'total_cost')
+    totals = quote_totals(quotes.iterator(chunk_size=2000))
+    stats = list(ProcedureStats.objects.filter(procedure_key__in=totals))
+    for row in stats:
+        row.sketches = dump_sketches(totals[row.procedure_key]['sketches'])
+    ProcedureStats.objects.bulk_update(stats, ['sketches'], batch_size=500)
+
+
+def create_sqlite_like_index(apps, schema_editor):
+    # SQLite adds or drops a column by rebuilding the table, which loses the index from 0004
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS "procedure_stats_key_nocase" ON "quotes_procedurestats" ("procedure_key" COLLATE NOCASE)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0004_procedure_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_sqlite_like_index),
+        migrations.AddField(
+            model_name='procedurestats',
+            name='sketches',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(create_sqlite_like_index, migrations.RunPython.noop),
+        migrations.RunPython(fill_sketches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:19
+
+from django.db import migrations, models
+
+SQLITE_LIKE_INDEXES = {
+    'quote_procedure_search_nocase': 'procedure_name_search',
+    'quote_surgeon_search_nocase': 'surgeon_name_search',
+}
+
+
+def fill_updated_at(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    Quote.objects.update(updated_at=models.F('created_at'))
+
+
+def create_quotes_counter(apps, schema_editor):
+    ChangeCounter = apps.get_model('quotes', 'ChangeCounter')
+    ChangeCounter.objects.get_or_create(name='quotes')
+
+
+def create_sqlite_like_indexes(apps, schema_editor):
+    # SQLite adds a column by rebuilding the table, which loses the indexes from 0002
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, column in SQLITE_LIKE_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "quotes_quote" ("{column}" COLLATE NOCASE)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0005_procedure_stats_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(migrations.RunPython.noop, create_sqlite_like_indexes),
+        migrations.AddField(
+            model_name='quote',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(create_sqlite_like_indexes, migrations.RunPython.noop),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(create_quotes_counter, migrations.RunPython.noop),
+    ]
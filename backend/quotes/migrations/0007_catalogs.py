@@ -0,0 +1,50 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def fill_catalogs(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    for model_name, name_field, search_field in (
+        ('Procedure', 'procedure_name', 'procedure_name_search'),
+        ('Surgeon', 'surgeon_name', 'surgeon_name_search'),
+    ):
+        Catalog = apps.get_model('quotes', model_name)
+        rows = Quote.objects.exclude(**{search_field: ''}).values(search_field).order_by().annotate(
+            name=Min(name_field), count=Count('id'),
+        )
+        Catalog.objects.bulk_create([
+            Catalog(key=row[search_field], name=row['name'], quote_count=row['count']) for row in rows
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0006_quote_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Procedure',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('quote_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Surgeon',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=200)),
+                ('quote_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(fill_catalogs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:45
+
+from django.db import migrations, models
+
+from app.services.search import SEARCH_SOURCE_FIELDS, quote_search_fields
+from quotes.fulltext import create_fulltext_index, drop_fulltext_index
+
+SQLITE_LIKE_INDEXES = {
+    'quote_procedure_search_nocase': 'procedure_name_search',
+    'quote_surgeon_search_nocase': 'surgeon_name_search',
+}
+
+
+def create_sqlite_like_indexes(apps, schema_editor):
+    # SQLite adds a column by rebuilding the table, which loses the indexes from 0002
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, column in SQLITE_LIKE_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "quotes_quote" ("{column}" COLLATE NOCASE)')
+
+
+def fill_search_columns(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    quotes = []
+    for row in Quote.objects.values('pk', *SEARCH_SOURCE_FIELDS).iterator(chunk_size=2000):
+        quotes.append(Quote(pk=row['pk'], **quote_search_fields(row)))
+    Quote.objects.bulk_update(quotes, ['search_names', 'search_text'], batch_size=500)
+
+
+def create_index(apps, schema_editor):
+    create_fulltext_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    drop_fulltext_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0007_catalogs'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, create_sqlite_like_indexes),
+        migrations.AddField(
+            model_name='quote',
+            name='search_names',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='quote',
+            name='search_text',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(create_sqlite_like_indexes, migrations.RunPython.noop),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_index, drop_index),
+    ]
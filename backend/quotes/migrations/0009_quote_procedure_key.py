@@ -0,0 +1,62 @@
+# Generated by Django 4.2.10 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+from app.services.procedure_stats import SUMMED_FIELDS, dump_sketches, procedure_key, quote_totals
+from quotes.fulltext import create_fulltext_index
+
+SQLITE_LIKE_INDEXES = {
+    'quote_procedure_search_nocase': 'procedure_name_search',
+    'quote_surgeon_search_nocase': 'surgeon_name_search',
+}
+
+
+def recreate_sqlite_indexes(apps, schema_editor):
+    # SQLite adds a column by rebuilding the table, which loses the indexes
+    # from 0002 and the full-text triggers from 0008
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, column in SQLITE_LIKE_INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "quotes_quote" ("{column}" COLLATE NOCASE)')
+    create_fulltext_index(schema_editor)
+
+
+def fill_procedure_keys(apps, schema_editor):
+    Quote = apps.get_model('quotes', 'Quote')
+    quotes = [
+        Quote(pk=pk, procedure_key=procedure_key(name))
+        for pk, name in Quote.objects.values_list('pk', 'procedure_name').iterator(chunk_size=2000)
+    ]
+    Quote.objects.bulk_update(quotes, ['procedure_key'], batch_size=500)
+
+
+def rekey_procedure_stats(apps, schema_editor):
+    # The stats rows were keyed by the fold()ed name; recompute them under the new keys.
+    # (Going back, run rebuild_procedure_stats with the previous code.)
+    Quote = apps.get_model('quotes', 'Quote')
+    ProcedureStats = apps.get_model('quotes', 'ProcedureStats')
+    totals = quote_totals(Quote.objects.values('procedure_name', *SUMMED_FIELDS).iterator(chunk_size=2000))
+    ProcedureStats.objects.all().delete()
+    ProcedureStats.objects.bulk_create([
+        ProcedureStats(procedure_key=key, **{**row, 'sketches': dump_sketches(row['sketches'])})
+        for key, row in totals.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quotes', '0008_quote_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_sqlite_indexes),
+        migrations.AddField(
+            model_name='quote',
+            name='procedure_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=200),
+        ),
+        migrations.RunPython(recreate_sqlite_indexes, migrations.RunPython.noop),
+        migrations.RunPython(fill_procedure_keys, migrations.RunPython.noop),
+        migrations.RunPython(rekey_procedure_stats, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,26 @@
-from django.db import models
+from collections import defaultdict
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
 import uuid
 
+from app.services.bulk_quotes import BULK_BATCH_SIZE, chunked
+from app.services.catalog import name_counts
+from app.services.procedure_stats import SUMMED_FIELDS, dump_sketches, merge_sketches, procedure_key, quote_totals
+from app.services.search import SEARCH_SOURCE_FIELDS, fold, quote_search_fields
+from .cache import invalidate_responses
+
+# Quote fields that ProcedureStats is computed from
+STATS_FIELDS = ('procedure_name',) + SUMMED_FIELDS
+# Columns derived from the others by refresh_search_fields()
+SEARCH_FIELDS = ('procedure_name_search', 'surgeon_name_search', 'procedure_key', 'search_names', 'search_text')
+
+
+def quotes_changed():
+    """Record a write to the quotes table; call inside the write's transaction."""
+    ChangeCounter.bump(ChangeCounter.QUOTES)
+    invalidate_responses()
+
 
 class SurgicalPackage(models.Model):
     medications_included = models.JSONField(default=list, blank=True)
@@ -14,6 +34,70 @@ class SurgicalPackage(models.Model):
         return f"SurgicalPackage {self.id}"
 
 
+class QuoteQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so fill the search columns here
+        objs = list(objs)
+        for obj in objs:
+            obj.refresh_search_fields()
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # Some rows may not have been inserted; count what is really there
+                ProcedureStats.rebuild({obj.procedure_key for obj in created})
+                for catalog in CATALOGS:
+                    catalog.rebuild({getattr(obj, catalog.search_field) for obj in created})
+            else:
+                ProcedureStats.add(obj.stats_values() for obj in created)
+                for catalog in CATALOGS:
+                    catalog.add(getattr(obj, catalog.name_field) for obj in created)
+            quotes_changed()
+        return created
+
+    def update(self, **kwargs):
+        # Every updated quote gets a new version, hence a new ETag
+        kwargs.setdefault('version', F('version') + 1)
+        kwargs.setdefault('updated_at', timezone.now())
+        # Renamed quotes move between catalog entries (ProcedureStats is left to rebuild_procedure_stats)
+        renamed = [catalog for catalog in CATALOGS if catalog.name_field in kwargs]
+        keys = {}
+        for catalog in renamed:
+            name = kwargs[catalog.name_field]
+            if name is None or isinstance(name, str):
+                kwargs.setdefault(catalog.search_field, fold(name))
+        with transaction.atomic():
+            for catalog in renamed:
+                keys[catalog] = set(self.values_list(catalog.search_field, flat=True))
+            # The derived columns mix several fields, so they are recomputed from the rows once updated
+            pks = list(self.values_list('pk', flat=True)) if not set(SEARCH_SOURCE_FIELDS).isdisjoint(kwargs) else None
+            updated = super().update(**kwargs)
+            for catalog in renamed:
+                catalog.rebuild(keys[catalog] | {kwargs.get(catalog.search_field) or ''})
+            if pks is not None:
+                Quote.refresh_search_columns(pks)
+            quotes_changed()
+        return updated
+
+    def delete(self):
+        # Deleting a queryset skips Quote.delete(); recompute the procedures and surgeons it touched
+        with transaction.atomic():
+            keys = defaultdict(set)
+            for procedure, surgeon, stats_key in self.values_list('procedure_name_search', 'surgeon_name_search', 'procedure_key'):
+                keys[Procedure].add(procedure)
+                keys[Surgeon].add(surgeon)
+                keys[ProcedureStats].add(stats_key)
+            deleted = super().delete()
+            ProcedureStats.rebuild(keys[ProcedureStats])
+            for catalog in CATALOGS:
+                catalog.rebuild(keys[catalog])
+            quotes_changed()
+        return deleted
+
+    def with_package(self):
+        """Join the surgical package so serializing quotes costs one query, not N+1."""
+        return self.select_related('surgical_package')
+
+
 class Quote(models.Model):
     id = models.CharField(primary_key=True, max_length=36, default=uuid.uuid4)
 
@@ -55,6 +139,335 @@ class Quote(models.Model):
     created_by = models.CharField(max_length=200, default='system')
     status = models.CharField(max_length=50, default='borrador')
     notes = models.TextField(null=True, blank=True)
+    # Bumped by every save() and update(); the quote's ETag is derived from it
+    version = models.PositiveIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # fold()ed copies of the names, kept up to date by save(), bulk_create() and quotes.imports,
+    # so searches are prefix/equality lookups that can use an index. They are
+    # also the keys of the quote's Procedure and Surgeon catalog entries.
+    # db_index (rather than Meta.indexes) also gets PostgreSQL a
+    # varchar_pattern_ops index for LIKE 'prefix%'.
+    procedure_name_search = models.CharField(max_length=200, default='', editable=False, db_index=True)
+    surgeon_name_search = models.CharField(max_length=200, default='', editable=False, db_index=True)
+    # procedure_key() of the name, without stop words: the quote's ProcedureStats row
+    procedure_key = models.CharField(max_length=200, default='', editable=False, db_index=True)
+    # Stemmed terms of the names and of the description and notes (see
+    # app.services.search), kept up to date by the same writes; full-text
+    # indexed by quotes.fulltext
+    search_names = models.TextField(default='', editable=False)
+    search_text = models.TextField(default='', editable=False)
+
+    objects = QuoteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listing order and keyset pagination key
+            models.Index(fields=['created_at', 'id'], name='quote_created_at_id_idx'),
+            models.Index(fields=['status'], name='quote_status_idx'),
+            models.Index(fields=['procedure_name'], name='quote_procedure_name_idx'),
+            models.Index(fields=['surgeon_name'], name='quote_surgeon_name_idx'),
+        ]
 
     def __str__(self):
         return f"Quote {self.id} - {self.procedure_name}"
+
+    def refresh_search_fields(self):
+        self.procedure_name_search = fold(self.procedure_name)
+        self.surgeon_name_search = fold(self.surgeon_name)
+        self.procedure_key = procedure_key(self.procedure_name)
+        for name, value in quote_search_fields({field: getattr(self, field) for field in SEARCH_SOURCE_FIELDS}).items():
+            setattr(self, name, value)
+
+    def save(self, *args, **kwargs):
+        self.refresh_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | set(SEARCH_FIELDS) | {'version', 'updated_at'}
+        tracks_stats = update_fields is None or not set(STATS_FIELDS).isdisjoint(update_fields)
+        with transaction.atomic():
+            previous = None
+            previous_surgeon = None
+            if not self._state.adding:
+                # Locked so that concurrent saves of a quote each get their own version
+                previous = Quote.objects.select_for_update().filter(pk=self.pk).values('version', 'surgeon_name', *STATS_FIELDS).first()
+            if previous:
+                self.version = previous.pop('version') + 1
+                previous_surgeon = previous.pop('surgeon_name')
+            super().save(*args, **kwargs)
+            # Swap the quote's previous figures for its new ones in ProcedureStats
+            if tracks_stats and previous != self.stats_values():
+                if previous:
+                    ProcedureStats.remove(previous, exclude_pk=self.pk)
+                ProcedureStats.add([self.stats_values()])
+            # Move it between catalog entries when a name changed
+            old_names = {Procedure: previous and previous['procedure_name'], Surgeon: previous_surgeon}
+            for catalog in CATALOGS:
+                name = getattr(self, catalog.name_field)
+                if previous is None or fold(old_names[catalog]) != fold(name):
+                    catalog.remove([old_names[catalog]])
+                    catalog.add([name])
+            quotes_changed()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = Quote.objects.filter(pk=self.pk).values('surgeon_name', *STATS_FIELDS).first()
+            deleted = super().delete(*args, **kwargs)
+            if previous:
+                ProcedureStats.remove(previous)
+                for catalog in CATALOGS:
+                    catalog.remove([previous[catalog.name_field]])
+            quotes_changed()
+        return deleted
+
+    def stats_values(self):
+        return {field: getattr(self, field) for field in STATS_FIELDS}
+
+    @classmethod
+    def refresh_search_columns(cls, pks):
+        """Recompute ``procedure_key``, ``search_names`` and ``search_text`` of the quotes ``pks`` from their stored fields."""
+        for chunk in chunked(pks):
+            for row in cls.objects.filter(pk__in=chunk).values('pk', *SEARCH_SOURCE_FIELDS):
+                # QuerySet.update() itself, as this is not a new version of the quote
+                models.QuerySet.update(
+                    cls.objects.filter(pk=row['pk']),
+                    procedure_key=procedure_key(row['procedure_name']), **quote_search_fields(row),
+                )
+
+
+class ProcedureStats(models.Model):
+    """Running totals of the quotes of one procedure, read by pricing suggestions.
+
+    Kept up to date by ``Quote.save()``, ``Quote.delete()``, the quote
+    queryset's ``bulk_create()`` and ``delete()`` and by imports
+    (``quotes.imports``), in the same transaction as the quote. Adding a quote costs one row update; removing one rereads the
+    procedure's quotes (see ``remove()``). ``QuerySet.update()`` on quotes bypasses it; run
+    ``manage.py rebuild_procedure_stats`` to recompute everything.
+    """
+    # procedure_key() of the procedure name, the same as Quote.procedure_key
+    procedure_key = models.CharField(max_length=200, primary_key=True)
+    procedure_name = models.CharField(max_length=200)
+    quote_count = models.IntegerField(default=0)
+    sum_facility_fee = models.FloatField(default=0.0)
+    sum_equipment_costs = models.FloatField(default=0.0)
+    sum_total_cost = models.FloatField(default=0.0)
+    min_total_cost = models.FloatField(default=0.0)
+    max_total_cost = models.FloatField(default=0.0)
+    # {field: TDigest.to_dict()} for each of SUMMED_FIELDS
+    sketches = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ProcedureStats {self.procedure_key} ({self.quote_count})"
+
+    @classmethod
+    def add(cls, quotes):
+        """Add quotes (dicts of ``STATS_FIELDS``) to the totals of their procedures."""
+        with transaction.atomic():
+            # Sorted so concurrent writers lock rows in the same order
+            for key, totals in sorted(quote_totals(quotes).items()):
+                defaults = {**totals, 'sketches': dump_sketches(totals['sketches'])}
+                stats, created = cls.objects.select_for_update().get_or_create(procedure_key=key, defaults=defaults)
+                if created:
+                    continue
+                stats.quote_count += totals['quote_count']
+                for field in SUMMED_FIELDS:
+                    setattr(stats, f'sum_{field}', getattr(stats, f'sum_{field}') + totals[f'sum_{field}'])
+                stats.min_total_cost = min(stats.min_total_cost, totals['min_total_cost'])
+                stats.max_total_cost = max(stats.max_total_cost, totals['max_total_cost'])
+                stats.sketches = dump_sketches(merge_sketches(stats.sketches, totals['sketches']))
+                stats.save()
+
+    @classmethod
+    def remove(cls, quote, exclude_pk=None):
+        """Take a quote (a dict of ``STATS_FIELDS``) out of its procedure's totals.
+
+        Sketches cannot forget a value, so the procedure's row is recomputed
+        from its other quotes: those stored, less ``exclude_pk``.
+        """
+        key = procedure_key(quote['procedure_name'])
+        with transaction.atomic():
+            stats = cls.objects.select_for_update().filter(procedure_key=key).first()
+            if stats is None:
+                return
+            remaining = Quote.objects.filter(procedure_key=key).exclude(pk=exclude_pk).values(*STATS_FIELDS)
+            totals = quote_totals(remaining.iterator()).get(key)
+            if totals is None:
+                stats.delete()
+                return
+            for name, value in totals.items():
+                if name != 'procedure_name':
+                    setattr(stats, name, value)
+            stats.sketches = dump_sketches(totals['sketches'])
+            stats.save()
+
+    @classmethod
+    def rebuild(cls, keys=None):
+        """Recompute the stats of ``keys`` (every procedure by default) from the quotes.
+
+        Returns the number of procedures written.
+        """
+        quotes = Quote.objects.all()
+        stale = cls.objects.all()
+        if keys is not None:
+            quotes = quotes.filter(procedure_key__in=keys)
+            stale = stale.filter(procedure_key__in=keys)
+        totals = quote_totals(quotes.values(*STATS_FIELDS).iterator(chunk_size=2000))
+        stats = [cls(procedure_key=key, **{**row, 'sketches': dump_sketches(row['sketches'])}) for key, row in totals.items()]
+        with transaction.atomic():
+            stale.delete()
+            cls.objects.bulk_create(stats, batch_size=500)
+            # The procedures' trigram indexes (quotes.catalogs) may have to reload
+            ChangeCounter.bump(ChangeCounter.PROCEDURES)
+            invalidate_responses()
+        return len(stats)
+
+
+class ChangeCounter(models.Model):
+    """A number bumped by every write to a table, from which list ETags are derived.
+
+    Quote writes bump the ``quotes`` counter in their own transaction, so
+    whether any list of quotes may have changed is known from this one row.
+    """
+    QUOTES = 'quotes'
+    PROCEDURES = 'procedures'
+    SURGEONS = 'surgeons'
+
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ChangeCounter {self.name} ({self.value})"
+
+    @classmethod
+    def bump(cls, name):
+        if not cls.objects.filter(name=name).update(value=F('value') + 1, updated_at=timezone.now()):
+            counter, created = cls.objects.get_or_create(name=name, defaults={'value': 1})
+            if not created:
+                cls.objects.filter(name=name).update(value=F('value') + 1, updated_at=timezone.now())
+
+    @classmethod
+    def current(cls, name):
+        """``(value, updated_at)`` of the counter; ``(0, None)`` before its first bump."""
+        return cls.objects.filter(name=name).values_list('value', 'updated_at').first() or (0, None)
+
+
+class CatalogEntry(models.Model):
+    """A distinct procedure or surgeon name of the quotes (see app.services.catalog).
+
+    ``key`` is the fold()ed name, the value of the quotes' ``search_field``,
+    and ``quote_count`` the number of quotes that have it. Counted by the
+    same quote writes as ProcedureStats, in their transaction; an entry with
+    no quotes left is deleted. Adding or deleting an entry bumps the
+    catalog's ChangeCounter, which tells the autocomplete indexes to reload.
+    ``manage.py rebuild_catalogs`` recounts everything.
+    """
+    key = models.CharField(max_length=200, primary_key=True)
+    name = models.CharField(max_length=200)
+    quote_count = models.IntegerField(default=0)
+
+    # Set by each catalog: the Quote field it lists, its fold()ed copy and the ChangeCounter of the catalog
+    name_field = None
+    search_field = None
+    counter = None
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{type(self).__name__} {self.key} ({self.quote_count})"
+
+    @classmethod
+    def version(cls):
+        """Changes with every entry added or deleted; the autocomplete indexes are rebuilt when it does."""
+        return ChangeCounter.current(cls.counter)
+
+    @classmethod
+    def _increment(cls, counts):
+        # One UPDATE per distinct count rather than per entry
+        keys_by_count = defaultdict(list)
+        for key, count in counts.items():
+            keys_by_count[count].append(key)
+        for count, keys in keys_by_count.items():
+            for chunk in chunked(sorted(keys)):
+                cls.objects.filter(key__in=chunk).update(quote_count=F('quote_count') + count)
+
+    @classmethod
+    def add(cls, names):
+        """Count quotes with ``names`` in; names not in the catalog yet become entries."""
+        counts = name_counts(names)
+        if not counts:
+            return
+        with transaction.atomic():
+            existing = set()
+            for chunk in chunked(sorted(counts)):
+                existing.update(cls.objects.filter(key__in=chunk).values_list('key', flat=True))
+            cls._increment({key: counts[key][1] for key in existing})
+            new = [cls(key=key, name=name, quote_count=count) for key, (name, count) in counts.items() if key not in existing]
+            if not new:
+                return
+            try:
+                with transaction.atomic():
+                    cls.objects.bulk_create(new, batch_size=BULK_BATCH_SIZE)
+            except IntegrityError:
+                # Another write added some of them meanwhile
+                for entry in new:
+                    _, created = cls.objects.get_or_create(key=entry.key, defaults={'name': entry.name, 'quote_count': entry.quote_count})
+                    if not created:
+                        cls._increment({entry.key: entry.quote_count})
+            ChangeCounter.bump(cls.counter)
+
+    @classmethod
+    def remove(cls, names):
+        """Count quotes with ``names`` out; entries left without quotes are deleted."""
+        counts = name_counts(names)
+        if not counts:
+            return
+        with transaction.atomic():
+            cls._increment({key: -count for key, (_, count) in counts.items()})
+            deleted = 0
+            for chunk in chunked(sorted(counts)):
+                deleted += cls.objects.filter(key__in=chunk, quote_count__lte=0).delete()[0]
+            if deleted:
+                ChangeCounter.bump(cls.counter)
+
+    @classmethod
+    def rebuild(cls, keys=None):
+        """Recount the entries of ``keys`` (every one by default) from the quotes.
+
+        Entries keep their name; new ones take the smallest spelling. Returns
+        the number of entries written.
+        """
+        quotes = Quote.objects.exclude(**{cls.search_field: ''})
+        stale = cls.objects.all()
+        if keys is not None:
+            quotes = quotes.filter(**{f'{cls.search_field}__in': keys})
+            stale = stale.filter(key__in=keys)
+        names = dict(stale.values_list('key', 'name'))
+        rows = quotes.values(cls.search_field).annotate(count=Count('pk'), first_name=Min(cls.name_field))
+        entries = [
+            cls(key=row[cls.search_field], name=names.get(row[cls.search_field], row['first_name']), quote_count=row['count'])
+            for row in rows
+        ]
+        with transaction.atomic():
+            stale.delete()
+            cls.objects.bulk_create(entries, batch_size=BULK_BATCH_SIZE)
+            if set(names) != {entry.key for entry in entries}:
+                ChangeCounter.bump(cls.counter)
+        return len(entries)
+
+
+class Procedure(CatalogEntry):
+    name_field = 'procedure_name'
+    search_field = 'procedure_name_search'
+    counter = ChangeCounter.PROCEDURES
+
+
+class Surgeon(CatalogEntry):
+    name_field = 'surgeon_name'
+    search_field = 'surgeon_name_search'
+    counter = ChangeCounter.SURGEONS
+
+
+CATALOGS = (Procedure, Surgeon)
@@ -0,0 +1,214 @@
+"""The most read endpoints, computed once for both of their views.
+
+list_quotes, retrieve_quote, dashboard, procedures, surgeons and
+pricing_suggestions are served by the DRF views of quotes.views or, under
+ASGI, the async views of quotes.async_views (see ``ASYNC_READ_VIEWS``). Both
+build their responses with the functions below, which take the request's
+parameters and return ``(body, status)``; the async views run them in one
+``sync_to_async`` call per request. :func:`conditional` answers their
+conditional GETs, for either kind of view.
+"""
+import asyncio
+from datetime import datetime
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+
+from app.services.catalog import autocomplete_limit
+from app.services.conditional import make_etag
+from app.services.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+from app.services.procedure_stats import matching_rows, pricing_suggestion, procedure_key
+from app.services.trigrams import PRICING_SIMILAR_MATCH
+from .cache import response_cache
+from .catalogs import catalog_index, procedure_trigrams
+from .models import ChangeCounter, Procedure, ProcedureStats, Quote, Surgeon, fold
+from .serializers import QuoteSerializer
+
+# As DRF words the 404 of get_object_or_404
+QUOTE_NOT_FOUND = 'No Quote matches the given query.'
+
+
+def _not_modified(request, etag, last_modified):
+    """A 304 if the request's copy matches the validators, else None."""
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified and int(last_modified.timestamp()),
+    )
+
+
+def _with_validators(response, etag, last_modified):
+    response.headers.setdefault('ETag', etag)
+    if last_modified is not None:
+        response.headers.setdefault('Last-Modified', http_date(last_modified.timestamp()))
+    return response
+
+
+def conditional(validators):
+    """Answer GETs 304 when the client's copy is current, like django's ``condition()``.
+
+    ``validators(request, *args, **kwargs)`` returns ``(etag, last_modified)``
+    from one cheap lookup; the view only runs when they do not match the
+    request's If-None-Match / If-Modified-Since. Async views get the same
+    validators, run through ``sync_to_async``.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            avalidators = sync_to_async(validators)
+
+            @wraps(view)
+            async def ainner(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                etag, last_modified = await avalidators(request, *args, **kwargs)
+                if etag is None:
+                    return await view(request, *args, **kwargs)
+                response = _not_modified(request, etag, last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                return _with_validators(response, etag, last_modified)
+            return ainner
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag, last_modified = validators(request, *args, **kwargs)
+            if etag is None:
+                # Nothing to validate against (e.g. an unknown quote): let the view answer
+                return view(request, *args, **kwargs)
+            response = _not_modified(request, etag, last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return _with_validators(response, etag, last_modified)
+        return inner
+    return decorator
+
+
+def variant(request):
+    """Besides the data, what a response depends on: its parameters and format."""
+    return sorted(request.GET.lists()), request.META.get('HTTP_ACCEPT', '')
+
+
+def quotes_validators(request, *args, **kwargs):
+    # Any write to any quote bumps the counter
+    changes, updated_at = ChangeCounter.current(ChangeCounter.QUOTES)
+    return make_etag(request.resolver_match.url_name, changes, *variant(request)), updated_at
+
+
+def quote_validators(request, quote_id):
+    current = Quote.objects.filter(pk=quote_id).values_list('version', 'updated_at').first()
+    if current is None:
+        return None, None
+    version, updated_at = current
+    return make_etag('quote', quote_id, version, *variant(request)), updated_at
+
+
+def filter_quotes(qs, params):
+    """Narrow ``qs`` by the ``procedure_name`` / ``surgeon_name`` parameters of a listing."""
+    procedure_name = params.get('procedure_name')
+    surgeon_name = params.get('surgeon_name')
+    # Prefix matches on the folded columns, ignoring case and accents, so they can use an index
+    if procedure_name:
+        qs = qs.filter(procedure_name_search__startswith=fold(procedure_name))
+    if surgeon_name:
+        qs = qs.filter(surgeon_name_search__startswith=fold(surgeon_name))
+    return qs
+
+
+def quote_list(params):
+    """Body and status of list_quotes for the request's ``params``."""
+    qs = filter_quotes(Quote.objects.with_package().order_by('-created_at', '-id'), params)
+    if 'limit' not in params and 'cursor' not in params:
+        return QuoteSerializer(qs, many=True).data, status.HTTP_200_OK
+
+    try:
+        limit = page_size(params.get('limit'))
+        cursor = params.get('cursor')
+        if cursor:
+            created_at, quote_id = decode_cursor(cursor)
+            created_at = datetime.fromisoformat(created_at)
+            # Everything strictly after (created_at, id) in descending order
+            qs = qs.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=quote_id)
+    except InvalidCursor as e:
+        return {'detail': str(e)}, status.HTTP_400_BAD_REQUEST
+
+    quotes = list(qs[:limit + 1])
+    next_cursor = encode_cursor(quotes[limit - 1].created_at, quotes[limit - 1].id) if len(quotes) > limit else None
+    return {'results': QuoteSerializer(quotes[:limit], many=True).data, 'next_cursor': next_cursor}, status.HTTP_200_OK
+
+
+def quote_detail(quote_id):
+    """Body and status of retrieve_quote."""
+    quote = Quote.objects.with_package().filter(pk=quote_id).first()
+    if quote is None:
+        return {'detail': QUOTE_NOT_FOUND}, status.HTTP_404_NOT_FOUND
+    return QuoteSerializer(quote).data, status.HTTP_200_OK
+
+
+# The endpoints below are read far more often than quotes change; their
+# responses are cached until the next quote write (see quotes.cache)
+
+def _pricing_suggestions(procedure_name):
+    # One row per procedure, kept up to date as quotes change: the one with the
+    # search's key, else those whose key starts with it, else the most similar one
+    key = procedure_key(procedure_name)
+    rows, match = [], None
+    if key:
+        rows, match = matching_rows(key, ProcedureStats.objects.filter(procedure_key__startswith=key).values(), 'procedure_key')
+        similar = procedure_trigrams().similar(key) if not rows and PRICING_SIMILAR_MATCH else []
+        if similar:
+            rows, match = list(ProcedureStats.objects.filter(procedure_key=similar[0][0]).values()), 'similar'
+    return pricing_suggestion(procedure_name, rows, match)
+
+
+def pricing_suggestions(procedure_name):
+    """Body and status of pricing_suggestions."""
+    params = {'procedure_name': procedure_name}
+    return response_cache.get_or_set('pricing_suggestions', params, lambda: _pricing_suggestions(procedure_name)), status.HTTP_200_OK
+
+
+def catalog_names(params, catalog, field):
+    """Every name of a catalog, sorted; with ``prefix`` and/or ``limit``, those that match (autocomplete).
+
+    Autocomplete is not cached: this worker's index of the catalog answers
+    it in memory, after one lookup of the catalog's version.
+    """
+    prefix = params.get('prefix', '')
+    if not prefix and 'limit' not in params:
+        return response_cache.get_or_set(field, {}, lambda: {field: catalog_index(catalog).names()}), status.HTTP_200_OK
+    try:
+        limit = autocomplete_limit(params.get('limit'))
+    except ValueError as e:
+        return {'detail': str(e)}, status.HTTP_400_BAD_REQUEST
+    return {field: catalog_index(catalog).search(prefix, limit)}, status.HTTP_200_OK
+
+
+def procedures(params):
+    return catalog_names(params, Procedure, 'procedures')
+
+
+def surgeons(params):
+    return catalog_names(params, Surgeon, 'surgeons')
+
+
+def _dashboard():
+    total_quotes = Quote.objects.count()
+    recent = Quote.objects.with_package().order_by('-created_at')[:5]
+    top = Quote.objects.values('procedure_name').annotate(count=Count('id')).order_by('-count')[:5]
+    return {
+        'total_quotes': total_quotes,
+        'recent_quotes': QuoteSerializer(recent, many=True).data,
+        'top_procedures': [{'name': t['procedure_name'], 'count': t['count']} for t in top]
+    }
+
+
+def dashboard():
+    """Body and status of dashboard."""
+    return response_cache.get_or_set('dashboard', {}, _dashboard), status.HTTP_200_OK
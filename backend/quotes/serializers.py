@@ -1,6 +1,9 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Quote, SurgicalPackage
 
+from app.services.bulk_quotes import BULK_BATCH_SIZE
+
 
 class SurgicalPackageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -8,12 +11,30 @@ class SurgicalPackageSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class QuoteListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        # Save every package and then every quote, BULK_BATCH_SIZE rows per INSERT
+        packages = []
+        quotes = []
+        for item in validated_data:
+            item = dict(item)
+            package_data = item.pop('surgical_package', None)
+            package = SurgicalPackage(**package_data) if package_data else None
+            if package:
+                packages.append(package)
+            quotes.append(Quote(surgical_package=package, **item))
+        with transaction.atomic():
+            SurgicalPackage.objects.bulk_create(packages, batch_size=BULK_BATCH_SIZE)
+            return Quote.objects.bulk_create(quotes, batch_size=BULK_BATCH_SIZE)
+
+
 class QuoteSerializer(serializers.ModelSerializer):
     surgical_package = SurgicalPackageSerializer(required=False, allow_null=True)
 
     class Meta:
         model = Quote
-        fields = '__all__'
+        exclude = ('procedure_name_search', 'surgeon_name_search', 'procedure_key', 'search_names', 'search_text')
+        list_serializer_class = QuoteListSerializer
 
     def create(self, validated_data):
         package_data = validated_data.pop('surgical_package', None)
@@ -37,3 +58,13 @@ class QuoteSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
         return instance
+
+
+class BulkQuoteSerializer(QuoteSerializer):
+    """QuoteSerializer for one item of a bulk create.
+
+    Given ids are checked for all the items at once (see
+    ``views.create_quotes_bulk``) rather than with one query per item.
+    """
+    class Meta(QuoteSerializer.Meta):
+        extra_kwargs = {'id': {'validators': []}}
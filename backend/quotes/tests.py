@@ -1,7 +1,50 @@
-from django.urls import reverse
-from rest_framework.test import APITestCase
+import asyncio
+import bisect
+import csv
+import io
+import json
+import os
+import random
+import signal
+import tempfile
+import time
+import unittest
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 
+from app.services import pdf_service
+from app.services.catalog import PrefixIndex
+from app.services.conditional import etag_matches
+from app.services.import_jobs import ImportJobRunner, ImportJobStore
+from app.services.pdf_cache import PDFCache
+from app.services.pdf_service import PDFQueueFull, PDFWorkQueue
+from app.services.pdf_templates import LayoutTemplate, Region, TemplateRegistry
+from app.services.quantile_sketch import TDigest
+from app.services.quote_parser import REQUIRED_FIELDS, missing_required, parse_quote_from_text
+from app.services.response_cache import SQLiteCache
+from app.services.sandbox import SANDBOX_AVAILABLE, SandboxMemoryError, run_limited
+from app.services.search import query_terms, search_terms, stem
+from app.services.trigrams import TrigramIndex
+from benchmarks.corpus import generate_corpus, make_pdf
+from quotes import async_views, imports, views
+from quotes.cache import response_cache
+from quotes.imports import import_quotes
+from quotes.models import Procedure, ProcedureStats, Quote, Surgeon, SurgicalPackage
+
 
 class QuotesAPITest(APITestCase):
     def test_create_quote(self):
@@ -116,3 +159,1291 @@ class QuotesAPITest(APITestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertIn('total_quotes', resp.data)
         self.assertGreaterEqual(resp.data['total_quotes'], 3)
+
+
+_cache_dir = tempfile.TemporaryDirectory()
+_cache_patcher = mock.patch.object(pdf_service, 'pdf_cache', PDFCache(Path(_cache_dir.name) / 'cache.sqlite3'))
+_response_cache_patcher = mock.patch.object(response_cache, 'cache', SQLiteCache(Path(_cache_dir.name) / 'responses.sqlite3', {}))
+
+
+def setUpModule():
+    # Keep the PDF and response caches of test runs out of backend/data
+    _cache_patcher.start()
+    _response_cache_patcher.start()
+
+
+def tearDownModule():
+    _response_cache_patcher.stop()
+    _cache_patcher.stop()
+    _cache_dir.cleanup()
+
+
+SAMPLE_QUOTE_TEXT = """HOSPITAL ANGELES - COTIZACION QUIRURGICA
+Paciente: EXP-2024-0012  Edad: 45 años  Teléfono: (55) 1234-5678
+Correo: Juan.Perez@example.com
+Procedimiento: Colecistectomía laparoscópica programada
+Cirujano: Dr. Roberto Martinez Lopez
+Duración: 3 horas
+Anestesia general balanceada
+Total: $10,000.00
+Ambulatorio. Incluye antibiótico e implante de malla.
+"""
+
+
+class QuoteSearchIndexTest(APITestCase):
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # The test table is tiny; make the planner show whether an index *can* be used
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, *names):
+        plan = self.explain(queryset)
+        self.assertTrue(any(name in plan for name in names), f'none of {names} in plan:\n{plan}')
+
+    def test_search_columns_are_folded(self):
+        quote = Quote.objects.create(procedure_name='  Colecistectomía   LAPAROSCÓPICA', surgeon_name='Dr. Peña', surgery_duration_hours=1)
+        self.assertEqual((quote.procedure_name_search, quote.surgeon_name_search), ('colecistectomia laparoscopica', 'dr. pena'))
+        Quote.objects.bulk_create([Quote(procedure_name='Artroscopía', surgery_duration_hours=1)])
+        self.assertEqual(Quote.objects.get(procedure_name='Artroscopía').procedure_name_search, 'artroscopia')
+
+        resp = self.client.get('/api/quotes/', {'procedure_name': 'COLECISTECTOMIA'})
+        self.assertEqual([q['procedure_name'] for q in resp.data], ['  Colecistectomía   LAPAROSCÓPICA'])
+        self.assertNotIn('procedure_name_search', resp.data[0])
+        self.assertEqual(self.client.get('/api/pricing-suggestions/colecistectomia laparoscopica/').data['quote_count'], 1)
+
+    @unittest.skipUnless(connection.vendor in ('sqlite', 'postgresql'), 'EXPLAIN output checked for SQLite and PostgreSQL only')
+    def test_filters_use_indexes(self):
+        prefix = 'quotes_quote_procedure_name_search' if connection.vendor == 'postgresql' else 'quote_procedure_search_nocase'
+        self.assertUsesIndex(Quote.objects.filter(procedure_name_search__startswith='cole'), prefix)
+        self.assertUsesIndex(Quote.objects.filter(procedure_name_search='colecistectomia'), 'quotes_quote_procedure_name_search')
+        surgeon = 'quotes_quote_surgeon_name_search' if connection.vendor == 'postgresql' else 'quote_surgeon_search_nocase'
+        self.assertUsesIndex(Quote.objects.filter(surgeon_name_search__startswith='rob'), surgeon)
+        self.assertUsesIndex(Quote.objects.order_by('-created_at')[:5], 'quote_created_at_id_idx')
+        self.assertUsesIndex(Quote.objects.filter(status='borrador'), 'quote_status_idx')
+        self.assertUsesIndex(Quote.objects.values('procedure_name').annotate(count=Count('id')), 'quote_procedure_name_idx')
+        stats = 'quotes_procedurestats_procedure_key' if connection.vendor == 'postgresql' else 'procedure_stats_key_nocase'
+        self.assertUsesIndex(ProcedureStats.objects.filter(procedure_key__startswith='artro'), stats)
+
+
+class FullTextSearchTest(APITestCase):
+    def search(self, q, **params):
+        return self.client.get('/api/quotes/search/', {'q': q, **params})
+
+    def names(self, q, **params):
+        resp = self.search(q, **params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK, resp.data)
+        return [quote['procedure_name'] for quote in resp.data['results']]
+
+    def test_ranked_stemmed_and_accent_insensitive(self):
+        Quote.objects.create(procedure_name='Colecistectomía', notes='Antecedente de apendicectomías', surgery_duration_hours=1)
+        Quote.objects.create(procedure_name='Apendicectomía laparoscópica', surgeon_name='Dr. Pérez', surgery_duration_hours=1)
+        Quote.objects.create(procedure_name='Artroscopía', procedure_description='Ambas rodillas', surgery_duration_hours=1)
+
+        # Names rank above notes; plurals, case and accents do not matter
+        self.assertEqual(self.names('APENDICECTOMIA'), ['Apendicectomía laparoscópica', 'Colecistectomía'])
+        self.assertEqual(self.names('apendicectomías laparoscópicas'), ['Apendicectomía laparoscópica'])
+        self.assertEqual(self.names('rodilla'), ['Artroscopía'])
+        self.assertEqual(self.names('perez'), ['Apendicectomía laparoscópica'])
+        self.assertEqual(self.names('bypass'), [])
+        self.assertNotIn('search_names', self.search('rodilla').data['results'][0])
+
+        page = self.search('apendicectomia', limit=1).data
+        self.assertEqual(page['next_offset'], 1)
+        page = self.search('apendicectomia', limit=1, offset=1).data
+        self.assertEqual([q['procedure_name'] for q in page['results']], ['Colecistectomía'])
+        self.assertIsNone(page['next_offset'])
+
+        for params in ({'q': ''}, {'q': 'de la'}, {'q': 'rodilla', 'offset': '-1'}, {'q': 'rodilla', 'limit': 'x'}):
+            self.assertEqual(self.client.get('/api/quotes/search/', params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_every_write(self):
+        quote = Quote.objects.create(procedure_name='Rinoplastia', notes='Control en una semana', surgery_duration_hours=1)
+        self.assertEqual(self.names('semana'), ['Rinoplastia'])
+        quote.notes = 'Control al mes'
+        quote.save()
+        self.assertEqual(self.names('semana'), [])
+        self.assertEqual(self.names('meses'), ['Rinoplastia'])
+
+        Quote.objects.filter(pk=quote.pk).update(procedure_description='Septoplastia asociada')
+        self.assertEqual(self.names('septoplastia'), ['Rinoplastia'])
+        self.assertEqual(self.names('mes'), ['Rinoplastia'])
+
+        Quote.objects.bulk_create([Quote(procedure_name='Mamoplastia', surgery_duration_hours=1)])
+        self.assertEqual(self.names('mamoplastias'), ['Mamoplastia'])
+        for _ in import_quotes(io.BytesIO(b'{"procedure_name": "Blefaroplastia", "notes": "Septoplastia previa"}\n'), 'ndjson'):
+            pass
+        self.assertEqual(sorted(self.names('septoplastia')), ['Blefaroplastia', 'Rinoplastia'])
+
+        quote.delete()
+        Quote.objects.filter(procedure_name='Mamoplastia').delete()
+        self.assertEqual(self.names('septoplastia'), ['Blefaroplastia'])
+        self.assertEqual(self.names('mamoplastia'), [])
+
+
+class SearchTermsTest(SimpleTestCase):
+    def test_terms(self):
+        self.assertEqual(search_terms('Apendicectomía LAPAROSCÓPICA de urgencia'), ['apendicectomi', 'laparoscopic', 'urgenci'])
+        self.assertEqual(search_terms('Rodillas, tumores y luces'), ['rodill', 'tumor', 'luz'])
+        # Short words are kept whole
+        self.assertEqual(search_terms('Dr. Peña, 3 meses'), ['dr', 'pena', '3', 'mes'])
+        self.assertEqual(stem('prótesis'), 'prótesis')
+        self.assertEqual(query_terms('rodilla RODILLAS'), ['rodill'])
+
+
+class QuotePaginationTest(APITestCase):
+    def setUp(self):
+        for i in range(7):
+            Quote.objects.create(procedure_name=f'Procedimiento {i}', surgery_duration_hours=1)
+        # Several quotes share a timestamp so pages must break ties on id
+        first = Quote.objects.order_by('created_at').first().created_at
+        Quote.objects.filter(procedure_name__in=['Procedimiento 2', 'Procedimiento 3', 'Procedimiento 4']).update(created_at=first)
+
+    def test_pages_cover_every_quote_once(self):
+        expected = [str(pk) for pk in Quote.objects.order_by('-created_at', '-id').values_list('id', flat=True)]
+        seen, cursor = [], None
+        while True:
+            resp = self.client.get('/api/quotes/', {'limit': 2, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(resp.data['results']), 2)
+            seen += [str(q['id']) for q in resp.data['results']]
+            cursor = resp.data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_filters_apply_to_pages(self):
+        resp = self.client.get('/api/quotes/', {'limit': 10, 'procedure_name': 'procedimiento 1'})
+        self.assertEqual([q['procedure_name'] for q in resp.data['results']], ['Procedimiento 1'])
+        self.assertIsNone(resp.data['next_cursor'])
+
+    def test_without_parameters_returns_a_list(self):
+        resp = self.client.get('/api/quotes/')
+        self.assertIsInstance(resp.data, list)
+        self.assertEqual(len(resp.data), 7)
+
+    def test_bad_cursor_or_limit_is_rejected(self):
+        self.assertEqual(self.client.get('/api/quotes/', {'cursor': 'no-es-un-cursor'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/quotes/', {'limit': '0'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/api/quotes/', {'limit': 'diez'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProcedureStatsTest(APITestCase):
+    def create(self, procedure_name, facility_fee, equipment_costs=0.0):
+        resp = self.client.post('/api/quotes/create/', {
+            'procedure_name': procedure_name, 'surgery_duration_hours': 1,
+            'facility_fee': facility_fee, 'equipment_costs': equipment_costs,
+        }, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        return resp.data['id']
+
+    def snapshot(self):
+        return list(ProcedureStats.objects.order_by('pk').values('procedure_key', 'quote_count', 'sum_facility_fee',
+                                                                 'sum_equipment_costs', 'sum_total_cost', 'min_total_cost', 'max_total_cost', 'sketches'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        ProcedureStats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_stats_follow_quote_changes(self):
+        cheap = self.create('Artroscopía de rodilla', 100.0)
+        dear = self.create('ARTROSCOPIA de rodilla', 300.0, 50.0)
+        self.create('Apendicectomía', 80.0)
+        stats = ProcedureStats.objects.get(pk='artroscopia rodilla')
+        self.assertEqual((stats.quote_count, stats.sum_total_cost, stats.min_total_cost, stats.max_total_cost), (2, 450.0, 100.0, 350.0))
+        self.assertMatchesRebuild()
+
+        self.client.put(f'/api/quotes/{dear}/update/', {'facility_fee': 500.0}, format='json')
+        self.assertEqual(ProcedureStats.objects.get(pk='artroscopia rodilla').max_total_cost, 550.0)
+        self.assertMatchesRebuild()
+
+        # The cheapest quote goes; the minimum must be looked up again
+        self.client.delete(f'/api/quotes/{cheap}/delete/')
+        self.assertEqual(ProcedureStats.objects.get(pk='artroscopia rodilla').min_total_cost, 550.0)
+        self.assertMatchesRebuild()
+
+        self.client.put(f'/api/quotes/{dear}/update/', {'procedure_name': 'Apendicectomía'}, format='json')
+        self.assertFalse(ProcedureStats.objects.filter(pk='artroscopia rodilla').exists())
+        self.assertEqual(ProcedureStats.objects.get(pk='apendicectomia').quote_count, 2)
+        self.assertMatchesRebuild()
+
+    def test_bulk_create_and_queryset_delete(self):
+        Quote.objects.bulk_create([Quote(procedure_name='Hernioplastía', surgery_duration_hours=1, total_cost=cost) for cost in (10.0, 20.0, 30.0)])
+        self.assertEqual(ProcedureStats.objects.get(pk='hernioplastia').sum_total_cost, 60.0)
+        Quote.objects.filter(total_cost__gt=15).delete()
+        stats = ProcedureStats.objects.get(pk='hernioplastia')
+        self.assertEqual((stats.quote_count, stats.max_total_cost), (1, 10.0))
+
+    def test_pricing_suggestions_read_stats(self):
+        self.create('Colecistectomía laparoscópica', 100.0, 20.0)
+        self.create('colecistectomia  laparoscopica', 200.0)
+        resp = self.client.get('/api/pricing-suggestions/colecistectomia laparoscopica/')
+        self.assertEqual(resp.data['quote_count'], 2)
+        self.assertEqual(resp.data['avg_facility_fee'], 150.0)
+        self.assertEqual((resp.data['min_total_cost'], resp.data['max_total_cost']), (120.0, 200.0))
+        self.assertEqual(resp.data['quantiles']['total_cost']['median'], 160.0)
+        self.assertEqual(self.client.get('/api/pricing-suggestions/rinoplastia/').data['quote_count'], 0)
+
+    def test_suggestions_match_the_procedure_key(self):
+        self.create('Bypass gástrico', 100.0)
+        self.create('Bypass gástrico en Y de Roux', 300.0)
+        self.create('Apendicectomía', 80.0)
+        self.assertEqual(Quote.objects.get(procedure_name='Bypass gástrico en Y de Roux').procedure_key, 'bypass gastrico roux')
+
+        def suggestion(name):
+            data = self.client.get(f'/api/pricing-suggestions/{name}/').data
+            return data['quote_count'], data['match'], data['matched_procedures']
+
+        # The procedure itself, not every procedure that starts like it
+        self.assertEqual(suggestion('BYPASS GASTRICO'), (1, 'exact', ['Bypass gástrico']))
+        self.assertEqual(suggestion('bypass gástrico y roux'), (1, 'exact', ['Bypass gástrico en Y de Roux']))
+        # While it is being typed, the procedures that start with it, as candidates: their prices are not pooled
+        self.assertEqual(suggestion('bypass'), (0, 'prefix', ['Bypass gástrico', 'Bypass gástrico en Y de Roux']))
+        self.assertEqual(self.client.get('/api/pricing-suggestions/bypass/').data['suggested_total'], 0)
+        # Misspelt, the most similar one
+        self.assertEqual(suggestion('apendisectomia'), (1, 'similar', ['Apendicectomía']))
+        self.assertEqual(suggestion('rinoplastia'), (0, None, []))
+        self.assertEqual(suggestion('de la'), (0, None, []))
+        with mock.patch('quotes.reads.PRICING_SIMILAR_MATCH', False):
+            self.assertEqual(suggestion('apendisectomía'), (0, None, []))
+
+    def test_quantiles_resist_outliers(self):
+        for fee in (1000.0, 1100.0, 1200.0, 1300.0, 250000.0):
+            self.create('Rinoplastía', fee)
+        resp = self.client.get('/api/pricing-suggestions/rinoplastia/')
+        self.assertEqual(resp.data['quantiles']['facility_fee'], {'p25': 1100.0, 'median': 1200.0, 'p75': 1300.0, 'p90': 150520.0})
+        self.assertGreater(resp.data['avg_facility_fee'], 50000)
+
+    def test_rebuild_command(self):
+        self.create('Rinoplastía', 100.0)
+        ProcedureStats.objects.update(quote_count=99)
+        out = io.StringIO()
+        call_command('rebuild_procedure_stats', 'Rinoplastia', stdout=out)
+        self.assertEqual(ProcedureStats.objects.get(pk='rinoplastia').quote_count, 1)
+        self.assertIn('1 procedimientos', out.getvalue())
+
+
+class CatalogTest(APITestCase):
+    def quote(self, procedure_name, surgeon_name=None):
+        return Quote.objects.create(procedure_name=procedure_name, surgeon_name=surgeon_name, surgery_duration_hours=1)
+
+    def counts(self, catalog):
+        return dict(catalog.objects.values_list('key', 'quote_count'))
+
+    def test_near_duplicates_are_one_entry(self):
+        self.quote('Apendicectomía', 'Dr. Pérez')
+        self.quote(' apendicectomia ', 'dr.  perez')
+        self.quote('Bypass gástrico')
+        self.assertEqual(self.client.get('/api/procedures/').data['procedures'], ['Apendicectomía', 'Bypass gástrico'])
+        self.assertEqual(self.client.get('/api/surgeons/').data['surgeons'], ['Dr. Pérez'])
+        self.assertEqual(self.counts(Procedure), {'apendicectomia': 2, 'bypass gastrico': 1})
+
+    def test_kept_up_to_date_by_writes(self):
+        first = self.quote('Artroscopía', 'Dra. López')
+        self.quote('Artroscopía')
+        first.procedure_name = 'Rinoplastía'
+        first.save()
+        self.assertEqual(self.counts(Procedure), {'artroscopia': 1, 'rinoplastia': 1})
+        first.delete()
+        self.assertEqual(self.counts(Procedure), {'artroscopia': 1})
+        self.assertEqual(self.counts(Surgeon), {})
+
+        Quote.objects.bulk_create([Quote(procedure_name='Artroscopía', surgeon_name='Dr. Ruiz') for _ in range(2)])
+        self.assertEqual(self.counts(Procedure), {'artroscopia': 3})
+        Quote.objects.filter(surgeon_name='Dr. Ruiz').update(surgeon_name='Dr. Ruíz Gómez')
+        self.assertEqual(self.counts(Surgeon), {'dr. ruiz gomez': 2})
+        self.assertEqual(Quote.objects.filter(surgeon_name_search='dr. ruiz gomez').count(), 2)
+        Quote.objects.filter(surgeon_name__isnull=False).delete()
+        self.assertEqual((self.counts(Procedure), self.counts(Surgeon)), ({'artroscopia': 1}, {}))
+
+    def test_autocomplete(self):
+        for name in ('Apendicectomía', 'Apendicectomía laparoscópica', 'Cirugía de apéndice', 'Artroscopía'):
+            self.quote(name)
+        resp = self.client.get('/api/procedures/', {'prefix': 'APEN'})
+        # Whole-name matches first, then those of a later word
+        self.assertEqual(resp.data['procedures'], ['Apendicectomía', 'Apendicectomía laparoscópica', 'Cirugía de apéndice'])
+        self.assertEqual(self.client.get('/api/procedures/', {'prefix': 'apen', 'limit': 1}).data['procedures'], ['Apendicectomía'])
+        self.assertEqual(self.client.get('/api/procedures/', {'limit': 2}).data['procedures'], ['Apendicectomía', 'Apendicectomía laparoscópica'])
+        self.assertEqual(self.client.get('/api/procedures/', {'prefix': 'x', 'limit': 'y'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        # A new name reaches this worker's index on the next lookup
+        self.quote('Apendicitis aguda')
+        self.assertIn('Apendicitis aguda', self.client.get('/api/procedures/', {'prefix': 'apendici'}).data['procedures'])
+        self.quote('Dr. Pérez', 'Dr. Pérez')
+        self.assertEqual(self.client.get('/api/surgeons/', {'prefix': 'pere'}).data['surgeons'], ['Dr. Pérez'])
+
+    def test_imports_and_rebuild(self):
+        content = '\n'.join(json.dumps({'procedure_name': name, 'surgeon_name': 'Dra. Vega'}) for name in ('Rinoplastía', 'rinoplastia'))
+        resp = self.client.post('/api/quotes/import/', {'file': SimpleUploadedFile('q.ndjson', content.encode())}, format='multipart')
+        b''.join(resp.streaming_content)
+        self.assertEqual((self.counts(Procedure), self.counts(Surgeon)), ({'rinoplastia': 2}, {'dra. vega': 2}))
+
+        Procedure.objects.all().delete()
+        Surgeon.objects.update(quote_count=7)
+        out = io.StringIO()
+        call_command('rebuild_catalogs', stdout=out)
+        self.assertIn('1 procedimientos, 1 cirujanos', out.getvalue())
+        self.assertEqual((self.counts(Procedure), self.counts(Surgeon)), ({'rinoplastia': 2}, {'dra. vega': 2}))
+
+
+class PrefixIndexTest(SimpleTestCase):
+    def test_search(self):
+        index = PrefixIndex([('dr. perez lopez', 'Dr. Pérez López'), ('dra. lopez', 'Dra. López'), ('lopez diaz', 'López Díaz')])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.names(), ['Dr. Pérez López', 'Dra. López', 'López Díaz'])
+        self.assertEqual(index.search('López'), ['López Díaz', 'Dr. Pérez López', 'Dra. López'])
+        self.assertEqual(index.search('lopez', limit=2), ['López Díaz', 'Dr. Pérez López'])
+        self.assertEqual(index.search('perez l'), ['Dr. Pérez López'])
+        self.assertEqual(index.search('ruiz'), [])
+        self.assertEqual(index.search('', limit=1), ['Dr. Pérez López'])
+
+
+class TrigramIndexTest(SimpleTestCase):
+    def test_similar(self):
+        index = TrigramIndex([('apendicectomia', 'Apendicectomía'), ('colecistectomia laparoscopica', 'x'), ('colecistectomia abierta', 'y')])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.similar('apendisectomia')[0][0], 'apendicectomia')
+        self.assertEqual([key for key, _ in index.similar('colecistectomia laparoscopia', limit=2)], ['colecistectomia laparoscopica', 'colecistectomia abierta'])
+        self.assertEqual(index.similar('rinoplastia'), [])
+        self.assertEqual(index.similar(''), [])
+
+
+class QuantileSketchTest(SimpleTestCase):
+    def assertRankError(self, digest, values, max_error):
+        values = sorted(values)
+        for q in (0.01, 0.25, 0.5, 0.75, 0.9, 0.99):
+            rank = bisect.bisect_right(values, digest.quantile(q)) / len(values)
+            self.assertLess(abs(rank - q), max_error, f'q={q}')
+
+    def test_small_sets_are_exact(self):
+        digest = TDigest.from_values([5.0, 1.0, 3.0, 2.0, 4.0])
+        self.assertEqual([digest.quantile(q) for q in (0, 0.25, 0.5, 1)], [1.0, 2.0, 3.0, 5.0])
+        self.assertIsNone(TDigest().quantile(0.5))
+
+    def test_large_sets_stay_small_and_accurate(self):
+        rng = random.Random(7)
+        values = [rng.lognormvariate(9, 0.8) for _ in range(20000)]
+        digest = TDigest.from_values(values)
+        self.assertLess(len(digest.to_dict()['centroids']), 200)
+        self.assertRankError(digest, values, 0.005)
+
+    def test_merge_and_round_trip(self):
+        rng = random.Random(3)
+        first = [rng.uniform(0, 1000) for _ in range(5000)]
+        second = [rng.uniform(500, 3000) for _ in range(3000)]
+        merged = TDigest.from_dict(json.loads(json.dumps(TDigest.from_values(first).to_dict())))
+        merged.merge(TDigest.from_values(second))
+        self.assertEqual((merged.min, merged.max, merged.count), (min(first + second), max(first + second), 8000))
+        self.assertRankError(merged, first + second, 0.01)
+
+
+class ResponseCacheTest(APITestCase):
+    def setUp(self):
+        # Counts of earlier tests go to the counters that clear() drops
+        response_cache.flush_counts()
+        response_cache.cache.clear()
+        Quote.objects.create(procedure_name='Artroscopía', surgeon_name='Dra. López', surgery_duration_hours=1)
+
+    def test_reads_are_cached_until_a_quote_write(self):
+        self.assertEqual(self.client.get('/api/procedures/').data['procedures'], ['Artroscopía'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/procedures/').data['procedures'], ['Artroscopía'])
+            self.client.get('/api/procedures/')
+        self.assertEqual(self.client.get('/api/cache-stats/').data['hits'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post('/api/quotes/create/', {'procedure_name': 'Rinoplastía', 'surgery_duration_hours': 1}, format='json')
+        self.assertTrue(callbacks)
+        self.assertEqual(sorted(self.client.get('/api/procedures/').data['procedures']), ['Artroscopía', 'Rinoplastía'])
+        stats = self.client.get('/api/cache-stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (2, 2))
+
+    def test_hits_are_counted_without_writing_to_the_cache(self):
+        self.client.get('/api/procedures/')
+        with mock.patch.object(response_cache.cache, 'incr') as incr, mock.patch.object(response_cache.cache, 'set') as store:
+            for _ in range(3):
+                self.client.get('/api/procedures/')
+        incr.assert_not_called()
+        store.assert_not_called()
+        stats = self.client.get('/api/cache-stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (3, 1))
+
+    def test_every_cached_endpoint_sees_writes(self):
+        for url in ('/api/surgeons/', '/api/dashboard/', '/api/pricing-suggestions/artroscopia/'):
+            self.client.get(url)
+        Quote.objects.filter(procedure_name='Artroscopía').update(surgeon_name='Dr. Ruiz')
+        self.assertEqual(self.client.get('/api/surgeons/').data['surgeons'], ['Dr. Ruiz'])
+        Quote.objects.create(procedure_name='Artroscopía', surgery_duration_hours=1, total_cost=100.0)
+        self.assertEqual(self.client.get('/api/dashboard/').data['total_quotes'], 2)
+        self.assertEqual(self.client.get('/api/pricing-suggestions/artroscopia/').data['quote_count'], 2)
+
+    def test_broken_cache_does_not_fail_requests(self):
+        with mock.patch.object(response_cache, 'cache', SQLiteCache(_cache_dir.name, {})):
+            resp = self.client.get('/api/procedures/')
+        self.assertEqual(resp.data['procedures'], ['Artroscopía'])
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'cache.sqlite3'
+
+    def test_entries_are_shared_between_instances(self):
+        first, second = SQLiteCache(self.path, {}), SQLiteCache(self.path, {})
+        first.set('clave', {'a': [1, 2]})
+        self.assertEqual(second.get('clave'), {'a': [1, 2]})
+        self.assertFalse(second.add('clave', 'otro'))
+        self.assertTrue(second.delete('clave'))
+        self.assertIsNone(first.get('clave'))
+
+    def test_incr_and_expiry(self):
+        cache = SQLiteCache(self.path, {})
+        with self.assertRaises(ValueError):
+            cache.incr('contador')
+        cache.add('contador', 1, timeout=None)
+        self.assertEqual(cache.incr('contador', 2), 3)
+        cache.set('efímero', 'x', timeout=-1)
+        self.assertIsNone(cache.get('efímero'))
+        self.assertTrue(cache.add('efímero', 'y'))
+
+    def test_culls_beyond_max_entries(self):
+        cache = SQLiteCache(self.path, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+        cache.set('permanente', 1, timeout=None)
+        for i in range(30):
+            cache.set(f'k{i}', i)
+        self.assertEqual(cache.get('permanente'), 1)
+        self.assertEqual(cache.get('k29'), 29)
+        self.assertLessEqual(sum(cache.get(f'k{i}') is not None for i in range(30)), 11)
+
+
+class QueryCountTest(APITestCase):
+    """Pin the number of queries of each read endpoint, whatever the number of quotes."""
+
+    def setUp(self):
+        for i in range(6):
+            package = SurgicalPackage.objects.create(hospital_stay_nights=i)
+            self.quote = Quote.objects.create(procedure_name=f'Procedimiento {i % 2}', surgery_duration_hours=1, surgical_package=package)
+
+    def test_list_quotes(self):
+        # Change counter (for the ETag), quotes with their packages
+        with self.assertNumQueries(2):
+            resp = self.client.get('/api/quotes/')
+        self.assertEqual(len(resp.data), 6)
+        self.assertIsNotNone(resp.data[0]['surgical_package'])
+        with self.assertNumQueries(2):
+            self.client.get('/api/quotes/', {'limit': 3, 'procedure_name': 'procedimiento'})
+
+    def test_retrieve_quote(self):
+        # Version (for the ETag), quote with its package
+        with self.assertNumQueries(2):
+            resp = self.client.get(f'/api/quotes/{self.quote.pk}/')
+        self.assertEqual(resp.data['surgical_package']['hospital_stay_nights'], 5)
+
+    def test_dashboard(self):
+        # Change counter, count, recent quotes with their packages, top procedures
+        with self.assertNumQueries(4):
+            resp = self.client.get('/api/dashboard/')
+        self.assertEqual(len(resp.data['recent_quotes']), 5)
+
+    def test_catalog_endpoints(self):
+        # Catalog version, then its entries for this worker's index (the catalog changed in setUp)
+        for url in ('/api/procedures/', '/api/surgeons/'):
+            with self.subTest(url=url), self.assertNumQueries(2):
+                self.client.get(url)
+        # Autocomplete, once the index is current: the catalog version alone
+        with self.assertNumQueries(1):
+            resp = self.client.get('/api/procedures/', {'prefix': 'proc', 'limit': 1})
+        self.assertEqual(resp.data['procedures'], ['Procedimiento 0'])
+        with self.assertNumQueries(1):
+            self.client.get('/api/pricing-suggestions/procedimiento/')
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.quote = Quote.objects.create(procedure_name='Artroscopia', surgery_duration_hours=1, facility_fee=100)
+
+    def test_not_modified_without_reading_quotes(self):
+        for url in (f'/api/quotes/{self.quote.pk}/', '/api/quotes/', '/api/dashboard/'):
+            with self.subTest(url=url):
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200)
+                etag = resp['ETag']
+                self.assertTrue(etag.startswith('"'))
+                self.assertIn('Last-Modified', resp)
+                # Only the version or change counter is read; no quote is loaded or serialized
+                with self.assertNumQueries(1):
+                    resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(resp.status_code, 304)
+                self.assertEqual(resp['ETag'], etag)
+                self.assertEqual(resp.content, b'')
+
+    def test_writes_change_etags(self):
+        urls = (f'/api/quotes/{self.quote.pk}/', '/api/quotes/', '/api/dashboard/')
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        resp = self.client.put(f'/api/quotes/{self.quote.pk}/update/', {'facility_fee': 200}, format='json')
+        self.assertEqual(resp.data['version'], 1)
+        for url in urls:
+            with self.subTest(url=url):
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(resp.status_code, 200)
+                self.assertNotEqual(resp['ETag'], etags[url])
+
+        # Another quote's write leaves this quote's ETag alone, but not the lists'
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Quote.objects.create(procedure_name='Otra', surgery_duration_hours=1)
+        self.assertEqual(self.client.get(urls[0], HTTP_IF_NONE_MATCH=etags[urls[0]]).status_code, 304)
+        self.assertEqual(self.client.get(urls[1], HTTP_IF_NONE_MATCH=etags[urls[1]]).status_code, 200)
+
+        Quote.objects.filter(pk=self.quote.pk).update(status='enviada')
+        self.assertEqual(self.client.get(urls[0], HTTP_IF_NONE_MATCH=etags[urls[0]]).status_code, 200)
+
+    def test_etag_depends_on_parameters(self):
+        etag = self.client.get('/api/quotes/')['ETag']
+        self.assertNotEqual(self.client.get('/api/quotes/', {'limit': 5})['ETag'], etag)
+        self.assertEqual(self.client.get('/api/quotes/', {'limit': 5}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        resp = self.client.get('/api/quotes/')
+        self.assertEqual(self.client.get('/api/quotes/', HTTP_IF_MODIFIED_SINCE=resp['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(f'/api/quotes/{self.quote.pk}/', HTTP_IF_MODIFIED_SINCE=resp['Last-Modified']).status_code, 304)
+
+    def test_unknown_quote(self):
+        self.assertEqual(self.client.get('/api/quotes/nope/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", W/"b"', '"b"'))
+        self.assertTrue(etag_matches('*', '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+
+
+class AsyncReadViewsTest(APITestCase):
+    """quotes.async_views answer as the views of quotes.views they stand for."""
+
+    def setUp(self):
+        for i in range(4):
+            package = SurgicalPackage.objects.create(hospital_stay_nights=i)
+            self.quote = Quote.objects.create(
+                procedure_name=f'Artroscopia de rodilla {i % 2}', surgeon_name='Dra. Pérez',
+                surgery_duration_hours=1, facility_fee=100 * i, surgical_package=package,
+            )
+
+    def get(self, view, path, params=None, method='get'):
+        request = getattr(RequestFactory(), method)(path, params)
+        request.resolver_match = resolve(path)
+        kwargs = request.resolver_match.kwargs
+        response = async_to_sync(view)(request, **kwargs) if asyncio.iscoroutinefunction(view) else view(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response.status_code, response.content, response.get('ETag')
+
+    def test_same_responses(self):
+        cursor = self.client.get('/api/quotes/', {'limit': 2}).data['next_cursor']
+        cases = [
+            ('list_quotes', '/api/quotes/', None),
+            ('list_quotes', '/api/quotes/', {'limit': 2, 'cursor': cursor, 'surgeon_name': 'dra'}),
+            ('list_quotes', '/api/quotes/', {'cursor': 'x'}),
+            ('retrieve_quote', f'/api/quotes/{self.quote.pk}/', None),
+            ('retrieve_quote', '/api/quotes/nope/', None),
+            ('dashboard', '/api/dashboard/', None),
+            ('procedures', '/api/procedures/', None),
+            ('procedures', '/api/procedures/', {'prefix': 'artro', 'limit': 1}),
+            ('surgeons', '/api/surgeons/', {'limit': 'x'}),
+            ('pricing_suggestions', '/api/pricing-suggestions/artroscopia rodilla/', None),
+            ('pricing_suggestions', '/api/pricing-suggestions/artroscopia de rodila 1/', None),
+        ]
+        # Computed by each view, not read back from the other's cache
+        with mock.patch.object(response_cache, 'timeout', 0):
+            for name, path, params in cases:
+                with self.subTest(path=path, params=params):
+                    expected = self.get(getattr(views, name), path, params)
+                    self.assertEqual(self.get(getattr(async_views, name), path, params), expected)
+
+    def test_get_only(self):
+        status_code, content, _ = self.get(async_views.dashboard, '/api/dashboard/', method='post')
+        self.assertEqual(status_code, 405)
+        self.assertEqual(json.loads(content), {'detail': 'Method "POST" not allowed.'})
+
+
+class BulkCreateTest(APITestCase):
+    url = '/api/quotes/bulk/'
+
+    def item(self, **fields):
+        return {'procedure_name': 'Artroscopia', 'surgery_duration_hours': 1, 'facility_fee': 100, 'equipment_costs': 50, **fields}
+
+    def test_invalid_items_do_not_stop_valid_ones(self):
+        existing = Quote.objects.create(procedure_name='Otra', surgery_duration_hours=1)
+        items = [
+            self.item(surgical_package={'hospital_stay_nights': 2}),
+            self.item(procedure_name=None),
+            'no es una cotización',
+            self.item(id=str(existing.pk)),
+            self.item(id='nuevo-1', facility_fee='abc'),
+            self.item(id='nuevo-2'),
+            self.item(id='nuevo-2'),
+        ]
+        resp = self.client.post(self.url, items, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(resp.data['quotes_created'], 2)
+        self.assertEqual([error['index'] for error in resp.data['errors']], [1, 2, 3, 4, 6])
+        self.assertIn('procedure_name', resp.data['errors'][0]['errors'])
+        self.assertIn('facility_fee', resp.data['errors'][3]['errors'])
+        self.assertIn('id', resp.data['errors'][4]['errors'])
+
+        first = Quote.objects.get(pk=resp.data['quote_ids'][0])
+        self.assertEqual(first.total_cost, 150)
+        self.assertEqual(first.surgical_package.hospital_stay_nights, 2)
+        self.assertEqual(resp.data['quote_ids'][1], 'nuevo-2')
+        self.assertEqual(ProcedureStats.objects.get(procedure_key='artroscopia').quote_count, 2)
+
+    def test_query_count_does_not_grow_with_items(self):
+        def queries(count):
+            items = [self.item(surgical_package={'hospital_stay_nights': i}) for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                resp = self.client.post(self.url, items, format='json')
+            self.assertEqual(resp.data['quotes_created'], count)
+            return len(captured)
+
+        # A handful of multi-row INSERTs (SQLite caps the rows per statement) and
+        # of stats and catalog updates, not two per quote
+        self.assertLess(queries(300), 40)
+        self.assertEqual(Quote.objects.count(), 300)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.post(self.url, {'procedure_name': 'x'}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.post(self.url, [self.item(procedure_name='')], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(resp.data['quotes_created'], 0)
+        with mock.patch('quotes.views.BULK_MAX_QUOTES', 2):
+            resp = self.client.post(self.url, [self.item()] * 3, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Quote.objects.exists())
+
+
+class ExportTest(APITestCase):
+    url = '/api/quotes/export/'
+
+    def setUp(self):
+        package = SurgicalPackage.objects.create(hospital_stay_nights=2, medications_included=['Analgésico'], dietary_plan=True)
+        self.first = Quote.objects.create(procedure_name='Artroscopía', surgeon_name='Dr. Núñez', surgery_duration_hours=1, facility_fee=100, surgical_package=package)
+        self.second = Quote.objects.create(procedure_name='Apendicectomía', surgery_duration_hours=2, additional_equipment=['Láser, 2'])
+
+    def content(self, resp):
+        self.assertTrue(resp.streaming)
+        return b''.join(resp.streaming_content).decode('utf-8')
+
+    def test_csv(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="cotizaciones-', resp['Content-Disposition'])
+        content = self.content(resp)
+        self.assertTrue(content.startswith('\ufeff'))
+        rows = list(csv.DictReader(io.StringIO(content.lstrip('\ufeff'))))
+        self.assertEqual([row['id'] for row in rows], [str(self.second.pk), str(self.first.pk)])
+        self.assertEqual(json.loads(rows[0]['additional_equipment']), ['Láser, 2'])
+        self.assertEqual(rows[0]['surgical_package.hospital_stay_nights'], '')
+        self.assertEqual(rows[1]['surgeon_name'], 'Dr. Núñez')
+        self.assertEqual(rows[1]['facility_fee'], '100.0')
+        self.assertEqual(rows[1]['is_ambulatory'], 'true')
+        self.assertEqual(rows[1]['surgical_package.hospital_stay_nights'], '2')
+        self.assertEqual(json.loads(rows[1]['surgical_package.medications_included']), ['Analgésico'])
+
+    def test_ndjson_with_filters(self):
+        resp = self.client.get(self.url, {'format': 'ndjson', 'procedure_name': 'artroscopia'})
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        lines = self.content(resp).splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record['id'], str(self.first.pk))
+        self.assertEqual(record['surgical_package']['medications_included'], ['Analgésico'])
+        self.assertNotIn('procedure_name_search', record)
+
+        lines = self.content(self.client.get(self.url, {'format': 'ndjson'})).splitlines()
+        self.assertIsNone(json.loads(lines[0])['surgical_package'])
+
+    def test_streams_rows_as_read(self):
+        for i in range(5):
+            Quote.objects.create(procedure_name=f'Procedimiento {i}', surgery_duration_hours=1)
+        # Nothing is read until the body is
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url, {'format': 'ndjson'})
+        with mock.patch('app.services.quote_export.EXPORT_BATCH_ROWS', 3), self.assertNumQueries(1):
+            chunks = list(resp.streaming_content)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).count(b'\n'), 7)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(self.url, {'format': 'xlsx'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImportTest(APITestCase):
+    url = '/api/quotes/import/'
+
+    def upload(self, name, content, **data):
+        resp = self.client.post(self.url, {'file': SimpleUploadedFile(name, content.encode('utf-8')), **data}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return [json.loads(line) for line in b''.join(resp.streaming_content).decode('utf-8').splitlines()]
+
+    def test_export_imports_back(self):
+        package = SurgicalPackage.objects.create(hospital_stay_nights=2, medications_included=['Analgésico'], dietary_plan=True)
+        Quote.objects.create(procedure_name='Artroscopía', surgeon_name='Dr. Núñez', facility_fee=100, anesthesia_fee=20, surgical_package=package)
+        Quote.objects.create(procedure_name='Apendicectomía', additional_equipment=['Láser, 2'], is_ambulatory=False)
+        exported = {quote.pk: quote for quote in Quote.objects.with_package()}
+        content = b''.join(self.client.get('/api/quotes/export/').streaming_content).decode('utf-8')
+        Quote.objects.all().delete()
+
+        lines = self.upload('cotizaciones.csv', content)
+        self.assertEqual(lines[-1]['result']['quotes_created'], 2)
+        self.assertEqual(lines[-1]['result']['rejected'], 0)
+        for quote in Quote.objects.with_package():
+            original = exported[quote.pk]
+            self.assertEqual(quote.created_at, original.created_at)
+            self.assertEqual(quote.additional_equipment, original.additional_equipment)
+            self.assertEqual(quote.is_ambulatory, original.is_ambulatory)
+            self.assertEqual(quote.surgeon_name_search, original.surgeon_name_search)
+            self.assertEqual(quote.surgical_package is None, original.surgical_package is None)
+        package = Quote.objects.get(procedure_name='Artroscopía').surgical_package
+        self.assertEqual((package.hospital_stay_nights, package.medications_included, package.dietary_plan), (2, ['Analgésico'], True))
+        # total_cost is computed as create_quote does
+        self.assertEqual(ProcedureStats.objects.get(procedure_key='artroscopia').sum_total_cost, 120)
+
+        # Importing it again only finds ids that are taken
+        lines = self.upload('cotizaciones.csv', content)
+        self.assertEqual([line['errors'] for line in lines if 'row' in line], [{'id': ['Ya existe una cotización con este id']}] * 2)
+        self.assertEqual(Quote.objects.count(), 2)
+
+    def test_spreadsheet_csv(self):
+        content = 'procedure_name;facility_fee;additional_materials;is_ambulatory;surgical_package.hospital_stay_nights\n' \
+                  'Colecistectomía;1500;"Malla; grapas";no;3\n' \
+                  ';10;;;\n' \
+                  'Hernioplastia;mil;;sí;\n'
+        lines = self.upload('hoja.csv', content)
+        self.assertEqual([line['row'] for line in lines if 'row' in line], [3, 4])
+        self.assertIn('procedure_name', lines[0]['errors'])
+        self.assertIn('facility_fee', lines[1]['errors'])
+        quote = Quote.objects.get()
+        self.assertEqual((quote.facility_fee, quote.total_cost, quote.is_ambulatory), (1500, 1500, False))
+        self.assertEqual(quote.additional_materials, ['Malla', 'grapas'])
+        self.assertEqual(quote.surgical_package.hospital_stay_nights, 3)
+
+    def test_ndjson_in_batches(self):
+        records = [{'procedure_name': f'Procedimiento {i % 2}', 'facility_fee': i} for i in range(5)]
+        content = '\n'.join(json.dumps(record) for record in records) + '\nno es json\n[1]\n'
+        with mock.patch('quotes.imports.IMPORT_BATCH_ROWS', 3):
+            lines = self.upload('datos.txt', content, format='ndjson')
+        self.assertEqual([line['progress']['quotes_created'] for line in lines if 'progress' in line], [3, 5, 5])
+        self.assertEqual([line['row'] for line in lines if 'row' in line], [6, 7])
+        self.assertEqual(lines[-1]['result'], {'success': True, 'message': '5 de 7 cotizaciones importadas', 'rows': 7, 'quotes_created': 5, 'rejected': 2})
+        self.assertEqual(ProcedureStats.objects.get(procedure_key='procedimiento 0').quote_count, 3)
+        self.assertEqual(Quote.objects.filter(procedure_name_search='procedimiento 1').count(), 2)
+
+    def test_out_of_range_and_non_finite_values_are_rejected(self):
+        content = '{"procedure_name": "Artroscopía", "patient_age": 40}\n' \
+                  '{"procedure_name": "x", "patient_age": 100000000000000000000}\n' \
+                  '{"procedure_name": "x", "facility_fee": NaN}\n' \
+                  '{"procedure_name": "x", "surgical_package": {"hospital_stay_nights": -100000000000000000000}}\n'
+        lines = self.upload('datos.ndjson', content)
+        self.assertEqual([(line['row'], list(line['errors'])) for line in lines if 'row' in line], [
+            (2, ['patient_age']), (3, ['facility_fee']), (4, ['surgical_package.hospital_stay_nights']),
+        ])
+        self.assertEqual(lines[-1]['result']['quotes_created'], 1)
+        self.assertEqual(Quote.objects.get().patient_age, 40)
+
+    def test_batch_the_database_refuses_is_rejected(self):
+        records = [{'procedure_name': f'Procedimiento {i}'} for i in range(4)]
+        content = ''.join(json.dumps(record) + '\n' for record in records)
+        save = imports._save
+        calls = []
+
+        def failing_save(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OverflowError('Python int too large to convert to SQLite INTEGER')
+            return save(*args)
+        with mock.patch('quotes.imports.IMPORT_BATCH_ROWS', 2), mock.patch('quotes.imports._save', failing_save):
+            lines = self.upload('datos.ndjson', content)
+        self.assertEqual([line['row'] for line in lines if 'row' in line], [1, 2])
+        self.assertIn('non_field_errors', lines[0]['errors'])
+        self.assertEqual(lines[-1]['result'], {'success': True, 'message': '2 de 4 cotizaciones importadas', 'rows': 4, 'quotes_created': 2, 'rejected': 2})
+        self.assertEqual(sorted(Quote.objects.values_list('procedure_name', flat=True)), ['Procedimiento 2', 'Procedimiento 3'])
+
+    def test_unknown_format(self):
+        resp = self.client.post(self.url, {'file': SimpleUploadedFile('datos.xlsx', b'x')}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'cotizaciones.ndjson'
+            path.write_text('{"procedure_name": "Artroscopía", "created_at": "2023-05-01T10:00:00Z"}\n{"facility_fee": 1}\n')
+            out = io.StringIO()
+            call_command('import_quotes', str(path), stdout=out)
+            self.assertIn('1 de 2 cotizaciones importadas; 1 filas rechazadas', out.getvalue())
+            errors = Path(f'{path}.errors.ndjson').read_text().splitlines()
+            self.assertEqual(json.loads(errors[0]), {'row': 2, 'errors': {'procedure_name': ['This field is required.']}})
+        self.assertEqual(Quote.objects.get().created_at.year, 2023)
+
+
+class QuoteParserTest(SimpleTestCase):
+    def test_parse_quote_from_text(self):
+        data = parse_quote_from_text(SAMPLE_QUOTE_TEXT)
+        self.assertEqual(data['patient_id'], 'EXP-2024-0012')
+        self.assertEqual(data['patient_age'], 45)
+        self.assertEqual(data['patient_email'], 'Juan.Perez@example.com')
+        self.assertTrue(data['procedure_name'].startswith('Procedimiento: Colecistectomía'))
+        self.assertTrue(data['surgeon_name'].startswith('Roberto Martinez Lopez'))
+        self.assertEqual(data['surgery_duration_hours'], 3)
+        self.assertEqual(data['anesthesia_type'], 'Anestesia general')
+        # total is split 60/30/10 when no individual costs are listed
+        self.assertAlmostEqual(data['facility_fee'], 6000.0)
+        self.assertAlmostEqual(data['equipment_costs'], 3000.0)
+        self.assertAlmostEqual(data['anesthesia_fee'], 1000.0)
+        self.assertTrue(data['is_ambulatory'])
+        self.assertEqual(data['surgical_package']['medications_included'], ['Antibiótico'])
+        self.assertEqual(data['additional_equipment'], ['Implante'])
+
+    def test_parse_quote_from_empty_text(self):
+        data = parse_quote_from_text('')
+        self.assertEqual(data['procedure_name'], '')
+        self.assertEqual(data['surgery_duration_hours'], 0)
+
+    def test_missing_required_on_partial_data(self):
+        self.assertEqual(missing_required({}), list(REQUIRED_FIELDS))
+        self.assertEqual(missing_required({'procedure_name': 'Apendicectomía', 'anesthesia_fee': 500.0}), ['surgery_duration_hours'])
+        self.assertEqual(missing_required(parse_quote_from_text(SAMPLE_QUOTE_TEXT)), [])
+        self.assertEqual(pdf_service.recognized_fields({'facility_fee': 100.0}),
+                         {'costs': {'facility_fee': 100.0, 'equipment_costs': 0, 'anesthesia_fee': 0}})
+
+
+class PDFExtractionTest(SimpleTestCase):
+    def test_pages_without_text(self):
+        pdf = make_pdf([['Primera'], [], ['Tercera']])
+        with mock.patch('pdfplumber.page.Page.extract_text', side_effect=['Primera', None, 'Tercera']):
+            self.assertEqual(pdf_service.extract_text_from_pdf(pdf), 'Primera\n\nTercera')
+
+    def test_early_exit_stops_after_required_fields(self):
+        pages = [['Procedimiento: Colecistectomía laparoscópica'], ['Duración: 3 horas', 'Total: $10,000.00']]
+        pdf = make_pdf(pages + [['Anexo %d' % n] for n in range(5)])
+        seen = []
+        text = pdf_service.extract_text_from_pdf(pdf, on_page=lambda done, total: seen.append(done), early_exit=True)
+        self.assertEqual(seen, [1, 2])
+        self.assertNotIn('Anexo', text)
+        self.assertIn('Anexo 4', pdf_service.extract_text_from_pdf(pdf, early_exit=False))
+
+
+class PDFTemplateTest(SimpleTestCase):
+    LINES = ['HOSPITAL ANGELES - COTIZACION', 'Procedimiento: Colecistectomía laparoscópica',
+             'Duración: 3 horas', 'Total: $10,000.00', 'Notas internas que no se leen']
+
+    def extract(self, pdf, template):
+        return pdf_service.extract_and_parse(pdf, cache=PDFCache(max_entries=0), templates=TemplateRegistry([template]))
+
+    def test_known_layout_reads_only_its_regions(self):
+        template = LayoutTemplate('angeles', (Region((0, 45, 595, 69)), Region((0, 69, 595, 81))), header='hospital angeles')
+        # In-process, so the mock sees any full-text extraction
+        with mock.patch.object(pdf_service, 'PDF_SANDBOX', False), mock.patch.object(pdf_service, 'extract_text_from_pdf') as extract:
+            text, data, _ = self.extract(make_pdf([self.LINES]), template)
+        extract.assert_not_called()
+        self.assertNotIn('Notas', text)
+        self.assertEqual(data['surgery_duration_hours'], 3)
+        self.assertAlmostEqual(data['facility_fee'], 6000.0)
+
+    def test_falls_back_when_regions_miss_required_fields(self):
+        template = LayoutTemplate('angeles', (Region((0, 45, 595, 69)),), header='hospital angeles')
+        text, data, _ = self.extract(make_pdf([self.LINES]), template)
+        self.assertIn('Notas', text)
+        self.assertAlmostEqual(data['facility_fee'], 6000.0)
+
+    def test_unknown_layout_uses_full_text(self):
+        template = LayoutTemplate('otro', (Region((0, 45, 595, 69)),), header='clinica del valle')
+        text, data, _ = self.extract(make_pdf([self.LINES]), template)
+        self.assertIn('Notas', text)
+
+    def test_load_templates_from_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'templates.json'
+            path.write_text('[{"name": "a", "header": "x", "regions": [{"bbox": [0, 0, 10, 10], "table": true}]}]')
+            registry = TemplateRegistry.load(path)
+            self.assertEqual(registry.templates[0].regions, (Region((0, 0, 10, 10), 0, True),))
+            path.write_text('[{"name": "sin huella", "regions": []}]')
+            self.assertEqual(TemplateRegistry.load(path).templates, [])
+
+
+class PDFBudgetTest(SimpleTestCase):
+    def test_rejects_documents_over_page_limit(self):
+        with mock.patch.object(pdf_service, 'PDF_MAX_PAGES', 2):
+            result = pdf_service.process_pdf(('q.pdf', make_pdf([['Página de límite']] * 3)))
+        self.assertFalse(result['success'])
+        self.assertEqual(result['errors'], ['El PDF tiene más de 2 páginas'])
+
+    @unittest.skipUnless(SANDBOX_AVAILABLE, 'requires fork and resource limits')
+    def test_kills_extraction_past_deadline(self):
+        with mock.patch.object(pdf_service, 'PDF_EXTRACT_TIMEOUT_SECONDS', 0.5), \
+                mock.patch.object(pdf_service, 'extract_text_from_pdf', side_effect=lambda *args: time.sleep(30)):
+            started = time.monotonic()
+            result = pdf_service.process_pdf(('q.pdf', make_pdf([['Extracción lenta']])))
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(result['message'], 'El PDF excede los límites de procesamiento')
+        self.assertEqual(result['errors'], ['La extracción superó el tiempo límite de 0.5 segundos'])
+
+    @unittest.skipUnless(SANDBOX_AVAILABLE, 'requires fork and resource limits')
+    def test_memory_cap(self):
+        with self.assertRaises(SandboxMemoryError):
+            run_limited(bytearray, 512 * 1024 * 1024, memory_bytes=64 * 1024 * 1024)
+        self.assertEqual(run_limited(sum, [1, 2, 3], memory_bytes=64 * 1024 * 1024), 6)
+
+
+class UploadPDFStreamTest(APITestCase):
+    def read_events(self, resp):
+        body = b''.join(resp.streaming_content).decode()
+        events = []
+        for message in body.strip().split('\n\n'):
+            event, data = message.split('\n')
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_streams_pages_and_fields_before_result(self):
+        pdf = make_pdf([
+            ['Procedimiento: Reemplazo total de cadera', 'Duración: 4 horas'],
+            ['Detalle de costos', 'Instalaciones: $40,000'],
+        ])
+        resp = self.client.post('/api/upload-pdf/stream/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        self.assertEqual(resp['Content-Type'], 'text/event-stream')
+        events = self.read_events(resp)
+
+        self.assertEqual([e for e in events if e[0] == 'page'], [
+            ('page', {'page': 1, 'pages_total': 2}), ('page', {'page': 2, 'pages_total': 2}),
+        ])
+        fields = {data['field']: data['page'] for event, data in events if event == 'field'}
+        self.assertEqual(fields, {'procedure_name': 1, 'surgery_duration_hours': 1, 'costs': 2})
+        self.assertLess(events.index(('page', {'page': 1, 'pages_total': 2})), events.index(next(e for e in events if e[0] == 'field')))
+
+        event, result = events[-1]
+        self.assertEqual(event, 'result')
+        self.assertTrue(result['success'])
+        self.assertEqual(result['quotes_created'], 1)
+        self.assertEqual(Quote.objects.get().facility_fee, 40000)
+        self.assertEqual(views.pdf_work_queue.pending, 0)
+
+    def test_refused_when_the_pdf_queue_is_full(self):
+        queue = PDFWorkQueue(max_workers=1, max_queue=0)
+        queue.reserve()
+        pdf = make_pdf([['Procedimiento: Apendicectomía']])
+        spooled = []
+
+        def spool(*args):
+            spooled.append(pdf_service.spool_to_disk(*args))
+            return spooled[-1]
+        with mock.patch.object(views, 'pdf_work_queue', queue), mock.patch.object(views, 'spool_to_disk', spool):
+            resp = self.client.post('/api/upload-pdf/stream/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp['Retry-After'], str(pdf_service.PDF_RETRY_AFTER_SECONDS))
+        self.assertEqual(queue.pending, 1)
+        self.assertFalse(os.path.exists(spooled[0]))
+
+    def test_unread_stream_gives_its_place_back(self):
+        queue = PDFWorkQueue(max_workers=1, max_queue=0)
+        pdf = make_pdf([['Procedimiento: Apendicectomía']])
+        with mock.patch.object(views, 'pdf_work_queue', queue):
+            resp = self.client.post('/api/upload-pdf/stream/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+            self.assertEqual(queue.pending, 1)
+            # The client left before the first event
+            resp.close()
+        self.assertEqual(queue.pending, 0)
+
+
+class BenchmarkCorpusTest(SimpleTestCase):
+    def test_corpus_is_reproducible_and_parseable(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            documents = generate_corpus(first, sizes=(1, 2))
+            again = generate_corpus(second, sizes=(1, 2))
+            self.assertEqual([d.name for d in documents], ['text-001', 'text-002', 'table-001', 'table-002'])
+            for doc, other in zip(documents, again):
+                self.assertEqual(doc.path.read_bytes(), other.path.read_bytes())
+                result = pdf_service.process_pdf((doc.name + '.pdf', str(doc.path)))
+                self.assertTrue(result['success'], result['errors'])
+
+
+class UploadPDFBatchTest(APITestCase):
+    def test_batch_upload_pdfs_and_zip(self):
+        good = make_pdf([SAMPLE_QUOTE_TEXT.splitlines()])
+        incomplete = make_pdf([['Cotizacion sin datos del procedimiento']])
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('lote/uno.pdf', good)
+            zf.writestr('lote/notas.txt', 'no es un PDF')
+        files = [
+            SimpleUploadedFile('lote.zip', archive.getvalue(), content_type='application/zip'),
+            SimpleUploadedFile('dos.pdf', good, content_type='application/pdf'),
+            SimpleUploadedFile('tres.pdf', incomplete, content_type='application/pdf'),
+        ]
+        resp = self.client.post('/api/upload-pdf/batch/', {'files': files}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['quotes_created'], 2)
+        self.assertEqual([r['filename'] for r in resp.data['results']], ['lote/uno.pdf', 'lote/notas.txt', 'dos.pdf', 'tres.pdf'])
+        self.assertEqual([r['success'] for r in resp.data['results']], [True, False, True, False])
+
+        quote_id = resp.data['results'][0]['quote_id']
+        quote = self.client.get(f'/api/quotes/{quote_id}/').data
+        self.assertEqual(quote['surgery_duration_hours'], 3)
+        self.assertAlmostEqual(quote['total_cost'], 10000.0)
+        self.assertEqual(quote['surgical_package']['medications_included'], ['Antibiótico'])
+
+    def test_zip_with_too_many_members(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for i in range(pdf_service.MAX_BATCH_FILES + 1):
+                zf.writestr(f'{i}.pdf', b'%PDF-1.4')
+        with mock.patch('app.services.pdf_service.spool_to_disk') as spool:
+            resp = self.client.post('/api/upload-pdf/batch/', {'files': [SimpleUploadedFile('lote.zip', archive.getvalue())]}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        # Rejected from the ZIP's directory, before any member is extracted
+        spool.assert_not_called()
+
+    def test_zip_bomb(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('bomba.pdf', bytes(pdf_service.PDF_MAX_UPLOAD_BYTES + 1))
+        self.assertLess(len(archive.getvalue()), 1024 * 1024)
+        resp = self.client.post('/api/upload-pdf/batch/', {'files': [SimpleUploadedFile('lote.zip', archive.getvalue())]}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_total_size_is_capped_across_uploads(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for i in range(3):
+                zf.writestr(f'{i}.pdf', bytes(400))
+        uploads = [('lote.zip', io.BytesIO(archive.getvalue())), ('suelto.pdf', io.BytesIO(bytes(400)))]
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(len(pdf_service.spool_batch(uploads[:1], directory, max_bytes=1200)), 3)
+            uploads[0][1].seek(0)
+            with self.assertRaises(pdf_service.UploadTooLarge):
+                pdf_service.spool_batch(uploads, directory, max_bytes=1500)
+            uploads[0][1].seek(0)
+            with self.assertRaises(pdf_service.TooManyBatchFiles):
+                pdf_service.spool_batch(uploads, directory, max_files=3)
+
+
+    def test_busy_pool(self):
+        queue = PDFWorkQueue(max_workers=1, max_queue=0)
+        queue.reserve()
+        files = [SimpleUploadedFile('uno.pdf', make_pdf([SAMPLE_QUOTE_TEXT.splitlines()]))]
+        with mock.patch('quotes.views.pdf_work_queue', queue):
+            resp = self.client.post('/api/upload-pdf/batch/', {'files': files}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', resp)
+
+
+    def test_upload_after_a_worker_died(self):
+        queue = PDFWorkQueue(max_workers=1, max_queue=1)
+        try:
+            os.kill(queue.submit(os.getpid).result(), signal.SIGKILL)
+            with self.assertRaises(BrokenProcessPool):
+                queue.submit(time.sleep, 10).result(timeout=30)
+            files = [SimpleUploadedFile('uno.pdf', make_pdf([SAMPLE_QUOTE_TEXT.splitlines()]))]
+            with mock.patch('quotes.views.pdf_work_queue', queue):
+                resp = self.client.post('/api/upload-pdf/batch/', {'files': files}, format='multipart')
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertEqual(resp.data['quotes_created'], 1)
+        finally:
+            queue.shutdown()
+
+
+class PDFWorkQueueTest(SimpleTestCase):
+    def test_rejects_work_beyond_concurrency_and_queue(self):
+        queue = PDFWorkQueue(max_workers=1, max_queue=1)
+        try:
+            running = queue.submit(time.sleep, 0.5)
+            waiting = queue.submit(time.sleep, 0)
+            with self.assertRaises(PDFQueueFull):
+                queue.submit(time.sleep, 0)
+            running.result()
+            waiting.result()
+            self.assertEqual(queue.pending, 0)
+            queue.submit(time.sleep, 0).result()
+        finally:
+            queue.shutdown()
+
+
+    def test_map_shares_the_pool_places(self):
+        queue = PDFWorkQueue(max_workers=2, max_queue=0)
+        try:
+            self.assertEqual(queue.map(abs, [-1, -2, -3, -4, -5]), [1, 2, 3, 4, 5])
+            self.assertEqual(queue.pending, 0)
+            # One place left: the batch runs one item at a time instead of failing
+            running = queue.submit(time.sleep, 0.3)
+            self.assertEqual(queue.map(abs, [-1, -2]), [1, 2])
+            running.result()
+            queue.reserve()
+            queue.reserve()
+            with self.assertRaises(PDFQueueFull):
+                queue.map(abs, [-1])
+        finally:
+            queue.shutdown()
+
+
+    def test_replaces_a_pool_broken_by_a_dead_worker(self):
+        queue = PDFWorkQueue(max_workers=1, max_queue=1)
+        try:
+            pid = queue.submit(os.getpid).result()
+            running = queue.submit(time.sleep, 10)
+            os.kill(pid, signal.SIGKILL)
+            with self.assertRaises(BrokenProcessPool):
+                running.result(timeout=30)
+            self.assertEqual(queue.pending, 0)
+            self.assertEqual(queue.submit(abs, -1).result(timeout=30), 1)
+            self.assertEqual(queue.map(abs, [-2, -3]), [2, 3])
+        finally:
+            queue.shutdown()
+
+
+class ImportJobTest(APITransactionTestCase):
+    def setUp(self):
+        from quotes import views
+        self.directory = tempfile.TemporaryDirectory()
+        self.runner = ImportJobRunner(ImportJobStore(self.directory.name), save=views._save_imported_quote, max_workers=1)
+        patcher = mock.patch.object(views, '_import_job_runner', self.runner)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(self.runner.shutdown)
+
+    def wait_for_job(self, job_id):
+        for _ in range(100):
+            job = self.client.get(f'/api/import-jobs/{job_id}/').data
+            if job['state'] in ('done', 'failed'):
+                return job
+            time.sleep(0.05)
+        self.fail('import job did not finish')
+
+    def test_import_job_lifecycle(self):
+        pdf = make_pdf([SAMPLE_QUOTE_TEXT.splitlines(), ['Términos y condiciones']])
+        resp = self.client.post('/api/import-jobs/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+
+        job = self.wait_for_job(resp.data['id'])
+        self.assertEqual(job['state'], 'done')
+        self.assertEqual((job['pages_done'], job['pages_total']), (2, 2))
+        self.assertEqual(job['result']['quotes_created'], 1)
+        self.assertEqual(self.client.get(f"/api/quotes/{job['quote_id']}/").status_code, status.HTTP_200_OK)
+
+    def test_import_job_reports_failure(self):
+        pdf = make_pdf([['Sin datos']])
+        resp = self.client.post('/api/import-jobs/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        job = self.wait_for_job(resp.data['id'])
+        self.assertEqual(job['state'], 'failed')
+        self.assertEqual(job['result']['errors'], ['No se pudo identificar el procedimiento'])
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/api/import-jobs/missing/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pool_broken_by_a_dead_worker_is_replaced(self):
+        self.runner.resume()
+        with self.runner._lock:
+            pool = self.runner._live_pool()
+        os.kill(pool.submit(os.getpid).result(), signal.SIGKILL)
+        with self.assertRaises(BrokenProcessPool):
+            pool.submit(time.sleep, 0).result(timeout=30)
+
+        pdf = make_pdf([SAMPLE_QUOTE_TEXT.splitlines()])
+        resp = self.client.post('/api/import-jobs/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.wait_for_job(resp.data['id'])['state'], 'done')
+        self.assertIsNot(self.runner._pool, pool)
+
+    def test_job_that_cannot_start_goes_back_to_the_queue(self):
+        self.runner.resume()
+        pdf = make_pdf([SAMPLE_QUOTE_TEXT.splitlines()])
+        with mock.patch.object(ProcessPoolExecutor, 'submit', side_effect=RuntimeError('cannot fork')):
+            with self.assertRaises(RuntimeError):
+                self.runner.create('q.pdf', io.BytesIO(pdf))
+        [job_id] = self.runner.store.pending()
+        self.assertEqual(self.runner.store.get(job_id)['state'], 'queued')
+        # The next upload starts it as well
+        job = self.runner.create('q2.pdf', io.BytesIO(pdf))
+        self.assertEqual(self.wait_for_job(job_id)['state'], 'done')
+        self.assertEqual(self.wait_for_job(job['id'])['state'], 'done')
+
+    def test_pending_jobs_resume_after_a_restart(self):
+        from quotes import views
+        # Recorded by a process that stopped before running it
+        store = ImportJobStore(self.directory.name)
+        job = store.create('q.pdf', io.BytesIO(make_pdf([SAMPLE_QUOTE_TEXT.splitlines()])))
+        self.assertEqual(job['state'], 'queued')
+        # A new process: polling alone starts it
+        with mock.patch.object(views, '_import_job_runner', None), mock.patch.object(views, 'ImportJobStore', lambda: store):
+            try:
+                job = self.wait_for_job(job['id'])
+            finally:
+                views._import_job_runner.shutdown()
+        self.assertEqual(job['state'], 'done')
+        self.assertEqual(job['result']['quotes_created'], 1)
+
+
+class PDFCacheTest(APITestCase):
+    def test_repeat_upload_skips_extraction(self):
+        pdf = make_pdf([SAMPLE_QUOTE_TEXT.splitlines(), ['Cache test page']])
+        resp = self.client.post('/api/upload-pdf/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(resp.data['cache_hit'])
+
+        with mock.patch.object(pdf_service, 'extract_text_from_pdf') as extract:
+            resp = self.client.post('/api/upload-pdf/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        extract.assert_not_called()
+        self.assertTrue(resp.data['cache_hit'])
+        self.assertEqual(resp.data['extracted_data']['surgery_duration_hours'], 3)
+
+    def test_partial_text_is_not_reused_for_other_settings(self):
+        pdf = make_pdf([SAMPLE_QUOTE_TEXT.splitlines(), ['Anexo de la cotización']])
+        template = LayoutTemplate('angeles', (Region((0, 0, 595, 200)),), header='hospital angeles')
+        with tempfile.TemporaryDirectory() as directory, mock.patch.object(pdf_service, 'PDF_SANDBOX', False):
+            cache = PDFCache(Path(directory) / 'cache.sqlite3')
+            with mock.patch.object(pdf_service, 'PDF_EARLY_EXIT', True):
+                text, _, hit = pdf_service.extract_and_parse(pdf, cache=cache, templates=TemplateRegistry())
+            self.assertNotIn('Anexo', text)
+            text, _, hit = pdf_service.extract_and_parse(pdf, cache=cache, templates=TemplateRegistry())
+            self.assertFalse(hit)
+            self.assertIn('Anexo', text)
+            text, _, hit = pdf_service.extract_and_parse(pdf, cache=cache, templates=TemplateRegistry([template]))
+            self.assertFalse(hit)
+            self.assertNotIn('Anexo', text)
+            text, _, hit = pdf_service.extract_and_parse(pdf, cache=cache, templates=TemplateRegistry())
+            self.assertTrue(hit)
+            self.assertIn('Anexo', text)
+
+    def test_template_fingerprint_follows_the_templates(self):
+        registry = TemplateRegistry([LayoutTemplate('angeles', (Region((0, 0, 595, 200)),), header='hospital angeles')])
+        before = registry.fingerprint()
+        self.assertEqual(TemplateRegistry(list(registry.templates)).fingerprint(), before)
+        registry.templates[0] = registry.templates[0]._replace(regions=(Region((0, 0, 595, 100)),))
+        self.assertNotEqual(registry.fingerprint(), before)
+        self.assertNotEqual(TemplateRegistry().fingerprint(), before)
+
+    def test_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PDFCache(Path(directory) / 'cache.sqlite3', max_entries=2)
+            cache.put('a', 'text a', '1', {})
+            cache.put('b', 'text b', '1', {})
+            self.assertIsNotNone(cache.get('a'))
+            cache.put('c', 'text c', '1', {})
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a')[0], 'text a')
+            self.assertEqual(cache.get('c')[0], 'text c')
+
+
+class UploadSizeLimitTest(APITestCase):
+    def test_rejects_oversized_upload_before_reading_it(self):
+        pdf = make_pdf([SAMPLE_QUOTE_TEXT.splitlines()])
+        with mock.patch('quotes.views.PDF_MAX_UPLOAD_BYTES', 100), mock.patch('quotes.views.UPLOAD_OVERHEAD_BYTES', 0):
+            resp = self.client.post('/api/upload-pdf/', {'file': SimpleUploadedFile('q.pdf', pdf)}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_rejects_oversized_zip_member(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('grande.pdf', make_pdf([SAMPLE_QUOTE_TEXT.splitlines()]))
+        with mock.patch.object(pdf_service, 'PDF_MAX_UPLOAD_BYTES', 100):
+            resp = self.client.post('/api/upload-pdf/batch/', {'files': [SimpleUploadedFile('lote.zip', archive.getvalue())]}, format='multipart')
+        self.assertEqual(resp.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
@@ -1,16 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# The most read endpoints, as coroutines when ASYNC_READ_VIEWS is on (see quotes.reads)
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
 
 urlpatterns = [
     path('', views.root, name='root'),
     path('upload-pdf/', views.upload_pdf, name='upload_pdf'),
-    path('quotes/', views.list_quotes, name='list_quotes'),
+    path('upload-pdf/batch/', views.upload_pdf_batch, name='upload_pdf_batch'),
+    path('upload-pdf/stream/', views.upload_pdf_stream, name='upload_pdf_stream'),
+    path('import-jobs/', views.create_import_job, name='create_import_job'),
+    path('import-jobs/<str:job_id>/', views.retrieve_import_job, name='retrieve_import_job'),
+    path('quotes/', read_views.list_quotes, name='list_quotes'),
     path('quotes/create/', views.create_quote, name='create_quote'),
-    path('quotes/<str:quote_id>/', views.retrieve_quote, name='retrieve_quote'),
+    path('quotes/bulk/', views.create_quotes_bulk, name='create_quotes_bulk'),
+    path('quotes/export/', views.export_quotes, name='export_quotes'),
+    path('quotes/import/', views.import_quotes_file, name='import_quotes'),
+    path('quotes/search/', views.search_quotes, name='search_quotes'),
+    path('quotes/<str:quote_id>/', read_views.retrieve_quote, name='retrieve_quote'),
     path('quotes/<str:quote_id>/update/', views.update_quote, name='update_quote'),
     path('quotes/<str:quote_id>/delete/', views.delete_quote, name='delete_quote'),
-    path('pricing-suggestions/<str:procedure_name>/', views.pricing_suggestions, name='pricing_suggestions'),
-    path('procedures/', views.procedures, name='procedures'),
-    path('surgeons/', views.surgeons, name='surgeons'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('pricing-suggestions/<str:procedure_name>/', read_views.pricing_suggestions, name='pricing_suggestions'),
+    path('procedures/', read_views.procedures, name='procedures'),
+    path('surgeons/', read_views.surgeons, name='surgeons'),
+    path('dashboard/', read_views.dashboard, name='dashboard'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
 ]
@@ -2,64 +2,84 @@ from rest_framework.decorators import api_view, parser_classes
 from rest_framework.parsers import MultiPartParser, FileUploadParser
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Avg, Count
+from .cache import response_cache
+from .fulltext import search_quote_ids
 from .models import Quote
-from .serializers import QuoteSerializer
+from .serializers import BulkQuoteSerializer, QuoteSerializer
+from django.db import close_old_connections, transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-import pdfplumber
-import io
-import re
-
-
-def extract_text_from_pdf(pdf_content: bytes) -> str:
-    try:
-        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-            text = ''
-            for page in pdf.pages:
-                text += page.extract_text() or ''
-        return text
-    except Exception:
-        return ''
-
-
-def parse_quote_from_text(text: str) -> dict:
-    # Simplified parsing adapted from server.py logic
-    quote_data = {
-        'procedure_name': '',
-        'surgery_duration_hours': 0,
-        'anesthesia_type': '',
-        'facility_fee': 0.0,
-        'equipment_costs': 0.0,
-        'anesthesia_fee': 0.0,
-        'other_costs': 0.0,
-        'total_cost': 0.0,
-        'created_by': 'Importación PDF',
-        'notes': 'Cotización importada desde PDF',
-    }
-
-    t = text.replace('\n', ' ').replace('\t', ' ')
-    t = re.sub(r'\s+', ' ', t).strip()
-
-    # procedure
-    m = re.search(r'(?:procedimiento|procedure|cirugía|surgery|operación)[\s:]*([^$\d]{5,100})', t, re.I)
-    if m:
-        quote_data['procedure_name'] = m.group(1).strip()[:200]
-
-    # duration
-    m = re.search(r'(?:duración|duration|tiempo)[\s:]*(\d+)[\s]*(?:horas?|hours?)', t, re.I)
-    if m:
-        quote_data['surgery_duration_hours'] = int(m.group(1))
-
-    # costs
-    m = re.search(r'(?:total|costo total|total cost)[\s:$]*(\$?[\d,]+\.?\d*)', t, re.I)
-    if m:
-        v = m.group(1).replace('$', '').replace(',', '')
+from django.views.decorators.http import require_GET
+import os
+import tempfile
+
+from app.services.bulk_quotes import BULK_MAX_QUOTES, BULK_TOO_MANY, chunked, total_cost
+from app.services.import_jobs import ImportJobRunner, ImportJobStore
+from app.services.pagination import page_size
+from app.services.pdf_service import (
+    MAX_BATCH_FILES, PDF_MAX_BATCH_UPLOAD_BYTES, PDF_MAX_UPLOAD_BYTES, PDF_RETRY_AFTER_SECONDS, UPLOAD_OVERHEAD_BYTES,
+    PDFQueueFull, PDFWorkQueue, TooManyBatchFiles, UploadTooLarge, iter_process_pdf, process_pdf, process_pdf_batch, spool_batch, spool_to_disk, sse_event,
+)
+from app.services.quote_export import (
+    EXPORT_BATCH_ROWS, EXPORT_FORMATS, INVALID_FORMAT, PACKAGE_FIELDS, QUOTE_FIELDS, export_filename, iter_export,
+)
+from app.services.quote_import import IMPORT_MAX_UPLOAD_BYTES, import_format
+from app.services.search import MAX_SEARCH_OFFSET, query_terms, search_offset
+from . import reads
+from .imports import import_quotes
+from .reads import conditional, filter_quotes, quote_validators, quotes_validators
+
+UPLOAD_TOO_LARGE = f'El archivo supera el máximo de {PDF_MAX_UPLOAD_BYTES // (1024 * 1024)} MB'
+BATCH_TOO_LARGE = (
+    f'Cada PDF admite hasta {PDF_MAX_UPLOAD_BYTES // (1024 * 1024)} MB '
+    f'y el lote hasta {PDF_MAX_BATCH_UPLOAD_BYTES // (1024 * 1024)} MB'
+)
+IMPORT_TOO_LARGE = f'El archivo supera el máximo de {IMPORT_MAX_UPLOAD_BYTES // (1024 * 1024)} MB'
+
+# This worker's process pool for batch uploads, shared by all of them (see PDF_MAX_CONCURRENCY / PDF_MAX_QUEUE);
+# streamed uploads take a place of it too
+pdf_work_queue = PDFWorkQueue()
+
+
+def _content_length_exceeds(request, limit):
+    # Checked before request.FILES is touched, so oversized bodies are never read
+    content_length = request.META.get('CONTENT_LENGTH') or ''
+    return content_length.isdigit() and int(content_length) > limit
+
+
+def _too_large():
+    return Response({'detail': UPLOAD_TOO_LARGE}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+def _queue_full():
+    return Response(
+        {'detail': 'Demasiados PDFs en proceso, intente de nuevo más tarde'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': str(PDF_RETRY_AFTER_SECONDS)},
+    )
+
+
+class _StreamWithCleanup:
+    """Iterates ``events``, then calls ``cleanup()`` once, even for a response closed before it was read.
+
+    A generator's ``finally`` would not run when Django closes the response
+    of a client that left before the first event; Django calls ``close()``.
+    """
+
+    def __init__(self, events, cleanup):
+        self.events = events
+        self.cleanup = cleanup
+
+    def __iter__(self):
         try:
-            quote_data['total_cost'] = float(v)
-        except:
-            pass
+            yield from self.events
+        finally:
+            self.close()
 
-    return quote_data
+    def close(self):
+        cleanup, self.cleanup = self.cleanup, None
+        if cleanup is not None:
+            self.events.close()
+            cleanup()
 
 
 @api_view(['GET'])
@@ -70,28 +90,160 @@ def root(request):
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FileUploadParser])
 def upload_pdf(request):
+    if _content_length_exceeds(request, PDF_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES):
+        return _too_large()
     file = request.FILES.get('file')
     if not file or not file.name.lower().endswith('.pdf'):
         return Response({'detail': 'Solo se permiten archivos PDF'}, status=status.HTTP_400_BAD_REQUEST)
+    if file.size > PDF_MAX_UPLOAD_BYTES:
+        return _too_large()
 
-    content = file.read()
-    text = extract_text_from_pdf(content)
-    if not text:
-        return Response({'success': False, 'message': 'No se pudo extraer texto del PDF', 'quotes_created': 0}, status=status.HTTP_400_BAD_REQUEST)
+    # Django has already spooled large uploads to disk; read the PDF from there
+    body, code = _save_upload_result(process_pdf((file.name, file)))
+    return Response(body, status=code)
 
-    quote_data = parse_quote_from_text(text)
-    if not quote_data.get('procedure_name') or quote_data.get('surgery_duration_hours') == 0:
-        return Response({'success': False, 'message': 'Información insuficiente en el PDF', 'quotes_created': 0, 'extracted_data': quote_data}, status=status.HTTP_400_BAD_REQUEST)
 
-    # calculate total if not set
-    if not quote_data.get('total_cost'):
-        quote_data['total_cost'] = quote_data.get('facility_fee', 0) + quote_data.get('equipment_costs', 0) + quote_data.get('anesthesia_fee', 0) + quote_data.get('other_costs', 0)
+def _save_upload_result(result):
+    """Save the quote of a processed upload; returns the response body and status."""
+    if not result['success']:
+        return {'success': False, 'message': result['message'], 'quotes_created': 0, 'extracted_data': result['extracted_data'], 'errors': result['errors'], 'cache_hit': result['cache_hit']}, status.HTTP_400_BAD_REQUEST
 
+    quote_data = result['extracted_data']
     serializer = QuoteSerializer(data=quote_data)
     if serializer.is_valid():
         serializer.save()
-        return Response({'success': True, 'message': 'Cotización creada exitosamente desde PDF', 'quotes_created': 1, 'extracted_data': quote_data})
-    return Response({'success': False, 'message': 'Error validando datos', 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return {'success': True, 'message': 'Cotización creada exitosamente desde PDF', 'quotes_created': 1, 'extracted_data': quote_data, 'cache_hit': result['cache_hit']}, status.HTTP_200_OK
+    return {'success': False, 'message': 'Error validando datos', 'errors': serializer.errors}, status.HTTP_400_BAD_REQUEST
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FileUploadParser])
+def upload_pdf_stream(request):
+    """Like upload_pdf, but streams page and field events (SSE) while the PDF is extracted.
+
+    The last event, ``result``, carries the body upload_pdf would have returned.
+    """
+    if _content_length_exceeds(request, PDF_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES):
+        return _too_large()
+    file = request.FILES.get('file')
+    if not file or not file.name.lower().endswith('.pdf'):
+        return Response({'detail': 'Solo se permiten archivos PDF'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # Copied out because the response is streamed after the request's uploads are closed
+        pdf_path = spool_to_disk(file)
+    except UploadTooLarge:
+        return _too_large()
+    # Extraction runs in its own child process, but still counts against the PDF work queue
+    try:
+        pdf_work_queue.reserve()
+    except PDFQueueFull:
+        os.unlink(pdf_path)
+        return _queue_full()
+
+    def events():
+        for event, data in iter_process_pdf((file.name, pdf_path)):
+            if event == 'result':
+                data, _ = _save_upload_result(data)
+            yield sse_event(event, data)
+
+    def cleanup():
+        pdf_work_queue.release()
+        os.unlink(pdf_path)
+
+    response = StreamingHttpResponse(_StreamWithCleanup(events(), cleanup), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep proxies such as nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def upload_pdf_batch(request):
+    if _content_length_exceeds(request, PDF_MAX_BATCH_UPLOAD_BYTES):
+        return _too_large()
+    uploads = request.FILES.getlist('files') or request.FILES.getlist('file')
+    if not uploads:
+        return Response({'detail': 'Solo se permiten archivos PDF'}, status=status.HTTP_400_BAD_REQUEST)
+
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            items = spool_batch(((upload.name, upload) for upload in uploads), directory)
+        except UploadTooLarge:
+            return Response({'detail': BATCH_TOO_LARGE}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except TooManyBatchFiles:
+            return Response({'detail': f'Máximo {MAX_BATCH_FILES} archivos por lote'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = process_pdf_batch(items, pdf_work_queue)
+        except PDFQueueFull:
+            return _queue_full()
+
+    valid = []
+    for result in results:
+        if not result['success']:
+            continue
+        serializer = QuoteSerializer(data=result['extracted_data'])
+        if serializer.is_valid():
+            valid.append((result, serializer.validated_data))
+        else:
+            result.update(success=False, message='Error validando datos', errors=serializer.errors)
+
+    quotes = QuoteSerializer(many=True).create([data for _, data in valid]) if valid else []
+    for (result, _), quote in zip(valid, quotes):
+        result['quote_id'] = str(quote.pk)
+
+    return Response({
+        'success': bool(quotes),
+        'message': f'{len(quotes)} de {len(results)} cotizaciones creadas desde PDF',
+        'quotes_created': len(quotes),
+        'results': results,
+    })
+
+
+def _save_imported_quote(quote_data):
+    # Runs on an import job callback thread, which has its own DB connection
+    try:
+        serializer = QuoteSerializer(data=quote_data)
+        serializer.is_valid(raise_exception=True)
+        return str(serializer.save().pk)
+    finally:
+        close_old_connections()
+
+
+_import_job_runner = None
+
+
+def get_import_job_runner():
+    """This process's import job runner; the first upload or status lookup after a restart resumes pending jobs."""
+    global _import_job_runner
+    if _import_job_runner is None:
+        _import_job_runner = ImportJobRunner(ImportJobStore(), save=_save_imported_quote)
+        _import_job_runner.resume()
+    return _import_job_runner
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def create_import_job(request):
+    if _content_length_exceeds(request, PDF_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES):
+        return _too_large()
+    file = request.FILES.get('file')
+    if not file or not file.name.lower().endswith('.pdf'):
+        return Response({'detail': 'Solo se permiten archivos PDF'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        job = get_import_job_runner().create(file.name, file)
+    except UploadTooLarge:
+        return _too_large()
+    return Response(job, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def retrieve_import_job(request, job_id):
+    job = get_import_job_runner().store.get(job_id)
+    if job is None:
+        return Response({'detail': 'Trabajo de importación no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(job)
 
 
 @api_view(['POST'])
@@ -106,29 +258,181 @@ def create_quote(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _with_total_cost(item):
+    try:
+        return {**item, 'total_cost': total_cost(item)}
+    except (TypeError, ValueError):
+        # Left for the serializer to report against the bad field
+        return item
+
+
+def _nest_package(row):
+    # values() row -> quote dict with a nested surgical_package, as export_record() wants
+    package = {field: row.pop(f'surgical_package__{field}') for field in PACKAGE_FIELDS}
+    row['surgical_package'] = package if row['surgical_package'] is not None else None
+    return row
+
+
+@require_GET
+def export_quotes(request):
+    """Stream the quotes, filtered as by list_quotes, as ``?format=csv`` (default) or ``ndjson``.
+
+    Rows are read through a cursor and written as they come, so memory use
+    does not grow with the export. A plain Django view, because DRF takes
+    ``format`` for its own content negotiation.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'detail': INVALID_FORMAT}, status=status.HTTP_400_BAD_REQUEST)
+    qs = filter_quotes(Quote.objects.order_by('-created_at', '-id'), request.GET)
+    rows = qs.values(*QUOTE_FIELDS, 'surgical_package', *(f'surgical_package__{field}' for field in PACKAGE_FIELDS))
+    quotes = (_nest_package(row) for row in rows.iterator(chunk_size=EXPORT_BATCH_ROWS))
+    response = StreamingHttpResponse(iter_export(quotes, export_format), content_type=EXPORT_FORMATS[export_format][0])
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(export_format)}"'
+    return response
+
+
+@api_view(['POST'])
+def create_quotes_bulk(request):
+    """Create a list of quotes in one transaction, a few INSERTs for all of them.
+
+    Each item is validated on its own: invalid ones are reported in
+    ``errors`` by their index in the list and the others are still created.
+    """
+    items = request.data
+    if not isinstance(items, list):
+        return Response({'detail': 'Se esperaba una lista de cotizaciones'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > BULK_MAX_QUOTES:
+        return Response({'detail': BULK_TOO_MANY}, status=status.HTTP_400_BAD_REQUEST)
+
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'errors': {'non_field_errors': ['Se esperaba un objeto']}})
+            continue
+        serializer = BulkQuoteSerializer(data=_with_total_cost(item))
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    with transaction.atomic():
+        # Ids sent by the client must be new, and unique within the request
+        given = [data['id'] for _, data in valid if data.get('id')]
+        taken = set()
+        for chunk in chunked(given):
+            taken.update(Quote.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        new = []
+        for index, data in valid:
+            quote_id = data.get('id')
+            if quote_id and quote_id in taken:
+                errors.append({'index': index, 'errors': {'id': ['Ya existe una cotización con este id']}})
+                continue
+            if quote_id:
+                taken.add(quote_id)
+            new.append(data)
+        quotes = BulkQuoteSerializer(many=True).create(new) if new else []
+
+    errors.sort(key=lambda error: error['index'])
+    return Response({
+        'success': bool(quotes),
+        'message': f'{len(quotes)} de {len(items)} cotizaciones creadas',
+        'quotes_created': len(quotes),
+        'quote_ids': [str(quote.pk) for quote in quotes],
+        'errors': errors,
+    }, status=status.HTTP_201_CREATED if quotes else status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def import_quotes_file(request):
+    """Import the quotes of an uploaded CSV or NDJSON ``file`` (see quotes.imports).
+
+    The format comes from the file name, or from a ``format`` field. The
+    response streams the import's error file as it goes (NDJSON): one line
+    per rejected row, a progress line after each batch and the result last.
+    """
+    if _content_length_exceeds(request, IMPORT_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES):
+        return Response({'detail': IMPORT_TOO_LARGE}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    file = request.FILES.get('file')
+    if not file:
+        return Response({'detail': 'Se requiere un archivo CSV o NDJSON'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        file_format = import_format(file.name, request.data.get('format'))
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # Copied out because the response is streamed after the request's uploads are closed
+        path = spool_to_disk(file, max_bytes=IMPORT_MAX_UPLOAD_BYTES, suffix=f'.{file_format}')
+    except UploadTooLarge:
+        return Response({'detail': IMPORT_TOO_LARGE}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def lines():
+        try:
+            with open(path, 'rb') as stream:
+                yield from import_quotes(stream, file_format)
+        finally:
+            os.unlink(path)
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@conditional(quotes_validators)
 @api_view(['GET'])
 def list_quotes(request):
-    procedure_name = request.GET.get('procedure_name')
-    surgeon_name = request.GET.get('surgeon_name')
-    qs = Quote.objects.all().order_by('-created_at')
-    if procedure_name:
-        qs = qs.filter(procedure_name__icontains=procedure_name)
-    if surgeon_name:
-        qs = qs.filter(surgeon_name__icontains=surgeon_name)
-    serializer = QuoteSerializer(qs, many=True)
-    return Response(serializer.data)
+    """List quotes newest first.
+
+    With ``limit`` and/or ``cursor`` the response is one page,
+    ``{"results": [...], "next_cursor": ...}``; pass ``next_cursor`` back as
+    ``cursor`` for the following page. Without them every quote is returned
+    as a plain list.
+    """
+    body, code = reads.quote_list(request.GET)
+    return Response(body, status=code)
+
+
+@conditional(quotes_validators)
+@api_view(['GET'])
+def search_quotes(request):
+    """Quotes with every word of ``q`` in their procedure or surgeon name, description or notes.
+
+    Words are matched ignoring case and accents and by their stem (see
+    app.services.search), through the full-text index of quotes.fulltext.
+    Best matches come first, name matches above the others, then the newest.
+    One page of ``limit`` quotes per response, ``{"results": [...],
+    "next_offset": ...}``; pass ``next_offset`` back as ``offset`` for the
+    following page.
+    """
+    query = request.GET.get('q', '')
+    if not query_terms(query):
+        return Response({'detail': 'Indique al menos una palabra para buscar'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = page_size(request.GET.get('limit'))
+        offset = search_offset(request.GET.get('offset'))
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    ids = search_quote_ids(query, limit + 1, offset)
+    quotes = Quote.objects.with_package().in_bulk(ids[:limit])
+    return Response({
+        'results': QuoteSerializer([quotes[pk] for pk in ids[:limit] if pk in quotes], many=True).data,
+        'next_offset': offset + limit if len(ids) > limit and offset + limit <= MAX_SEARCH_OFFSET else None,
+    })
 
+
+@conditional(quote_validators)
 @api_view(['GET'])
 def retrieve_quote(request, quote_id):
-    quote = get_object_or_404(Quote, pk=quote_id)
-    serializer = QuoteSerializer(quote)
-    return Response(serializer.data)
+    body, code = reads.quote_detail(quote_id)
+    return Response(body, status=code)
 
 
 @api_view(['PUT'])
 def update_quote(request, quote_id):
-    quote = get_object_or_404(Quote, pk=quote_id)
+    quote = get_object_or_404(Quote.objects.with_package(), pk=quote_id)
     data = request.data.copy()
     data['total_cost'] = float(data.get('facility_fee', quote.facility_fee)) + float(data.get('equipment_costs', quote.equipment_costs)) + float(data.get('anesthesia_fee', quote.anesthesia_fee)) + float(data.get('other_costs', quote.other_costs))
     # allow partial updates so clients can send only fields they want to change
@@ -146,39 +450,35 @@ def delete_quote(request, quote_id):
     return Response({'message': 'Cotización eliminada exitosamente'})
 
 
+# The endpoints below are read far more often than quotes change; their
+# responses are cached until the next quote write (see quotes.reads)
+
 @api_view(['GET'])
 def pricing_suggestions(request, procedure_name):
-    qs = Quote.objects.filter(procedure_name__icontains=procedure_name)
-    stats = qs.aggregate(avg_facility_fee=Avg('facility_fee'), avg_equipment_costs=Avg('equipment_costs'), avg_total_cost=Avg('total_cost'), count=Count('id'))
-    return Response({
-        'procedure_name': procedure_name,
-        'avg_facility_fee': round(stats['avg_facility_fee'] or 0, 2),
-        'avg_equipment_costs': round(stats['avg_equipment_costs'] or 0, 2),
-        'avg_total_cost': round(stats['avg_total_cost'] or 0, 2),
-        'quote_count': stats['count'] or 0,
-        'suggested_total': round(stats['avg_total_cost'] or 0, 2)
-    })
+    body, code = reads.pricing_suggestions(procedure_name)
+    return Response(body, status=code)
 
 
 @api_view(['GET'])
 def procedures(request):
-    procedures = Quote.objects.values_list('procedure_name', flat=True).distinct()
-    return Response({'procedures': list(procedures)})
+    body, code = reads.procedures(request.GET)
+    return Response(body, status=code)
 
 
 @api_view(['GET'])
 def surgeons(request):
-    surgeons = Quote.objects.values_list('surgeon_name', flat=True).distinct()
-    return Response({'surgeons': list(surgeons)})
+    body, code = reads.surgeons(request.GET)
+    return Response(body, status=code)
 
 
+@conditional(quotes_validators)
 @api_view(['GET'])
 def dashboard(request):
-    total_quotes = Quote.objects.count()
-    recent = Quote.objects.order_by('-created_at')[:5]
-    top = Quote.objects.values('procedure_name').annotate(count=Count('id')).order_by('-count')[:5]
-    return Response({
-        'total_quotes': total_quotes,
-        'recent_quotes': QuoteSerializer(recent, many=True).data,
-        'top_procedures': [{'name': t['procedure_name'], 'count': t['count']} for t in top]
-    })
+    body, code = reads.dashboard()
+    return Response(body, status=code)
+
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Hit and miss counts of the response cache, across every worker."""
+    return Response(response_cache.stats())
@@ -1,18 +1,49 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, List, Optional, Union
 import uuid
 from datetime import datetime, timezone, date, time
 from decimal import Decimal
-import pdfplumber
+import asyncio
+import json
 import re
-import io
+import tempfile
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from backend.app.services.bulk_quotes import BULK_BATCH_SIZE, BULK_MAX_QUOTES, BULK_TOO_MANY, chunked
+from backend.app.services.catalog import CatalogIndex, PrefixIndex, autocomplete_limit, name_counts
+from backend.app.services.conditional import http_date, is_fresh, make_etag
+from backend.app.services.import_jobs import ImportJobRunner, ImportJobStore
+from backend.app.services.pagination import InvalidCursor, decode_cursor, encode_cursor, page_size
+from backend.app.services.pdf_service import (
+    MAX_BATCH_FILES, PDF_MAX_BATCH_UPLOAD_BYTES, PDF_MAX_UPLOAD_BYTES, PDF_RETRY_AFTER_SECONDS,
+    UPLOAD_OVERHEAD_BYTES, PDFQueueFull, PDFWorkQueue, TooManyBatchFiles, UploadTooLarge,
+    iter_process_pdf, process_pdf, process_pdf_batch, spool_batch, spool_to_disk, sse_event,
+)
+from backend.app.services.quote_export import (
+    EXPORT_BATCH_ROWS, EXPORT_FORMATS, INVALID_FORMAT, aiter_export, export_filename,
+)
+from backend.app.services.quote_import import (
+    IMPORT_BATCH_ROWS, IMPORT_MAX_UPLOAD_BYTES, ImportLog, import_format, iter_records,
+)
+from backend.app.services.response_cache import RESPONSE_CACHE_PATH, ResponseCache, SQLiteCache
+from backend.app.services.search import MAX_SEARCH_OFFSET, SEARCH_SOURCE_FIELDS, fold, query_terms, quote_search_fields, search_offset
+from backend.app.services.procedure_stats import (
+    PROCEDURE_KEY_VERSION, SUMMED_FIELDS, combine_stats, dump_sketches, matching_rows, pricing_suggestion,
+    procedure_key, quote_totals,
+)
+from backend.app.services.trigrams import PRICING_SIMILAR_MATCH, TrigramIndex
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -28,245 +59,273 @@ app = FastAPI()
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Bounded process pool for PDF uploads (see PDF_MAX_CONCURRENCY / PDF_MAX_QUEUE)
+pdf_work_queue = PDFWorkQueue()
+
+# Responses of the read-mostly endpoints, cached in a SQLite file every worker
+# shares until the next quote write (see response_cache). The key prefix keeps
+# them apart from the Django backend's if both use the same file.
+response_cache = ResponseCache(SQLiteCache(RESPONSE_CACHE_PATH, {"KEY_PREFIX": "mongo", "OPTIONS": {"MAX_ENTRIES": 5000}}))
+
+# Largest request body accepted by each upload route, checked before the body is read
+UPLOAD_LIMITS = {
+    "/api/upload-pdf": PDF_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES,
+    "/api/import-jobs": PDF_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES,
+    "/api/upload-pdf/stream": PDF_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES,
+    "/api/upload-pdf/batch": PDF_MAX_BATCH_UPLOAD_BYTES,
+    "/api/quotes/import": IMPORT_MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES,
+}
+UPLOAD_TOO_LARGE = f"El archivo supera el máximo de {PDF_MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+BATCH_TOO_LARGE = (
+    f"Cada PDF admite hasta {PDF_MAX_UPLOAD_BYTES // (1024 * 1024)} MB "
+    f"y el lote hasta {PDF_MAX_BATCH_UPLOAD_BYTES // (1024 * 1024)} MB"
+)
+IMPORT_TOO_LARGE = f"El archivo supera el máximo de {IMPORT_MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+
 # Helper functions for MongoDB serialization
 def prepare_for_mongo(data):
-    if isinstance(data.get('created_at'), datetime):
-        data['created_at'] = data['created_at'].isoformat()
+    for field in ('created_at', 'updated_at'):
+        if isinstance(data.get(field), datetime):
+            data[field] = data[field].isoformat()
+    # Keys of the quote's procedure_stats and catalog documents
+    data['procedure_key'] = procedure_key(data.get('procedure_name'))
+    data['surgeon_key'] = fold(data.get('surgeon_name'))
+    # Stemmed terms for the text index (see search)
+    data.update(quote_search_fields(data))
     return data
 
 def parse_from_mongo(item):
-    if isinstance(item.get('created_at'), str):
-        item['created_at'] = datetime.fromisoformat(item['created_at'])
+    for field in ('created_at', 'updated_at'):
+        if isinstance(item.get(field), str):
+            item[field] = datetime.fromisoformat(item[field])
     return item
 
-# PDF Processing Functions
-def extract_text_from_pdf(pdf_content: bytes) -> str:
-    """Extract text from PDF using pdfplumber"""
-    try:
-        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        logging.error(f"Error extracting text from PDF: {e}")
-        return ""
-
-def parse_quote_from_text(text: str) -> dict:
-    """Parse quote information from extracted text using regex patterns"""
-    quote_data = {
-        "patient_id": None,
-        "patient_age": None,
-        "patient_phone": None,
-        "patient_email": None,
-        "procedure_name": "",
-        "procedure_code": None,
-        "procedure_description": None,
-        "surgeon_name": "",
-        "surgeon_specialty": None,
-        "facility_fee": 0.0,
-        "equipment_costs": 0.0,
-        "anesthesia_fee": 0.0,
-        "other_costs": 0.0,
-        "surgery_duration_hours": 0,
-        "anesthesia_type": "",
-        "additional_equipment": [],
-        "additional_materials": [],
-        "is_ambulatory": True,
-        "hospital_nights": 0,
-        "created_by": "Importación PDF",
-        "notes": "Cotización importada desde PDF",
-        "surgical_package": {
-            "medications_included": [],
-            "postoperative_care": [],
-            "hospital_stay_nights": 0,
-            "special_equipment": [],
-            "dietary_plan": False,
-            "additional_services": []
-        }
-    }
+# Running per-procedure totals behind pricing suggestions (see procedure_stats).
+# Mongo multi-document transactions need a replica set, so each stats document
+# carries a version and is rewritten only if nobody changed it since it was
+# read; rebuild_procedure_stats() repairs any drift.
+STATS_PROJECTION = {"_id": 0, "procedure_name": 1, **{field: 1 for field in SUMMED_FIELDS}}
+
+async def insert_quotes(quotes: List[dict]) -> Dict[int, str]:
+    """Insert quote documents and add them to their procedures' stats.
     
-    # Clean text for better parsing
-    text = text.replace('\n', ' ').replace('\t', ' ')
-    text = re.sub(r'\s+', ' ', text).strip()
+    Several quotes are inserted BULK_BATCH_SIZE per round trip, unordered so
+    that one failing document does not stop the rest; returns the errors of
+    those that failed, by their index in quotes.
+    """
+    failed = {}
+    if len(quotes) == 1:
+        await db.quotes.insert_one(quotes[0])
+    else:
+        for start in range(0, len(quotes), BULK_BATCH_SIZE):
+            try:
+                await db.quotes.insert_many(quotes[start:start + BULK_BATCH_SIZE], ordered=False)
+            except BulkWriteError as e:
+                for error in e.details["writeErrors"]:
+                    failed[start + error["index"]] = error["errmsg"]
+    inserted = [quote for index, quote in enumerate(quotes) if index not in failed]
+    await add_procedure_stats(inserted)
+    await add_to_catalogs(inserted)
+    await quotes_changed()
+    return failed
+
+async def bump_counter(name: str):
+    await db.counters.update_one(
+        {"_id": name}, {"$inc": {"value": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}, upsert=True
+    )
+
+async def claim_version(name: str, version) -> bool:
+    """Set counter name to version; True only for the one caller that changed it.
     
-    # Patient ID patterns
-    patient_id_patterns = [
-        r'(?:paciente|patient|id|expediente|número)[\s:]*([A-Z0-9\-]+)',
-        r'ID[\s:]*([A-Z0-9\-]+)',
-        r'No\.?\s*([A-Z0-9\-]+)'
-    ]
-    for pattern in patient_id_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            quote_data["patient_id"] = match.group(1).strip()
-            break
-    
-    # Age patterns
-    age_patterns = [
-        r'(?:edad|age|años)[\s:]*(\d{1,3})',
-        r'(\d{1,3})\s*(?:años|years old)'
-    ]
-    for pattern in age_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            quote_data["patient_age"] = int(match.group(1))
-            break
-    
-    # Phone patterns
-    phone_patterns = [
-        r'(?:teléfono|telefono|phone|tel)[\s:]*([0-9\-\s\(\)]+)',
-        r'(\(?[0-9]{3}\)?[-.\s]?[0-9]{3}[-.\s]?[0-9]{4})'
-    ]
-    for pattern in phone_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            phone = re.sub(r'[^\d]', '', match.group(1))
-            if len(phone) >= 10:
-                quote_data["patient_phone"] = match.group(1).strip()
-            break
-    
-    # Email patterns
-    email_pattern = r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-    match = re.search(email_pattern, text)
-    if match:
-        quote_data["patient_email"] = match.group(1).strip()
-    
-    # Procedure name patterns
-    procedure_patterns = [
-        r'(?:procedimiento|procedure|cirugía|surgery|operación)[\s:]*([^$\d\n]{10,80})',
-        r'(?:reemplazo|replacement|bypass|apendicectomía|appendectomy)[\s\w]*',
-        r'(?:artroscopia|laparoscopia|endoscopia)[\s\w]*'
-    ]
-    for pattern in procedure_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            procedure = match.group(0).strip()
-            if len(procedure) > 5:
-                quote_data["procedure_name"] = procedure[:80]
-                break
-    
-    # Surgeon name patterns (optional)
-    surgeon_patterns = [
-        r'(?:dr\.?|doctor|dra\.?|doctora|cirujano|surgeon)[\s]*([A-Za-záéíóúñÁÉÍÓÚÑ\s]{5,40})',
-        r'médico[\s:]*([A-Za-záéíóúñÁÉÍÓÚÑ\s]{5,40})'
-    ]
-    for pattern in surgeon_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            surgeon = match.group(1).strip()
-            if len(surgeon) > 3:
-                quote_data["surgeon_name"] = surgeon[:40]
-                break
-    
-    # Duration patterns (hours only)
-    duration_patterns = [
-        r'(?:duración|duration|tiempo)[\s:]*(\d+)[\s]*(?:horas?|hours?|hrs?)',
-        r'(\d+)[\s]*(?:horas?|hours?|hrs?)[\s]*(?:de[\s]*)?(?:cirugía|surgery|operación)',
-        r'(?:cirugía|surgery)[\s]*(?:de[\s]*)?(\d+)[\s]*(?:horas?|hours?|hrs?)'
-    ]
-    for pattern in duration_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
+    Startup upgrades run in every worker: the one that wins the claim does
+    the work, the others go on. If that worker dies halfway, run the
+    upgrade's CLI command (see __main__).
+    """
+    try:
+        result = await db.counters.update_one({"_id": name, "value": {"$ne": version}}, {"$set": {"value": version}}, upsert=True)
+    except DuplicateKeyError:
+        # Already at version: the upsert found no match and tried to insert it again
+        return False
+    return bool(result.modified_count or result.upserted_id is not None)
+
+async def quotes_changed():
+    """Record a write to the quotes: bump their change counter (list ETags) and drop cached responses"""
+    await bump_counter("quotes")
+    await invalidate_responses()
+
+async def invalidate_responses():
+    """Stop serving responses cached before a quote write; call once the write is done"""
+    await run_in_threadpool(response_cache.invalidate)
+
+async def update_procedure_stats(key: str, change):
+    """Replace the stats document of key with await change(current or None); None deletes it"""
+    while True:
+        stats = await db.procedure_stats.find_one({"key": key}, {"_id": 0})
+        new = await change(stats)
+        if new is not None:
+            new = {**new, "key": key, "sketches": dump_sketches(new["sketches"])}
+        if stats is None:
+            if new is None:
+                return
             try:
-                hours = int(match.group(1))
-                if 1 <= hours <= 24:
-                    quote_data["surgery_duration_hours"] = hours
-                    break
-            except:
+                await db.procedure_stats.insert_one({**new, "version": 1})
+                return
+            except DuplicateKeyError:
                 continue
+        version = {"key": key, "version": stats["version"]}
+        if new is None:
+            result = await db.procedure_stats.delete_one(version)
+            if result.deleted_count:
+                return
+        else:
+            result = await db.procedure_stats.update_one(version, {"$set": {**new, "version": stats["version"] + 1}})
+            if result.matched_count:
+                return
+
+async def add_procedure_stats(quotes: List[dict]):
+    for key, totals in quote_totals(quotes).items():
+        async def add(stats, totals=totals):
+            if stats is None:
+                return totals
+            return {**combine_stats([stats, totals]), "procedure_name": stats["procedure_name"]}
+        await update_procedure_stats(key, add)
+
+async def remove_procedure_stats(quote: dict, exclude_id: Optional[str] = None):
+    """Take a quote out of its procedure's stats.
     
-    # Anesthesia type patterns
-    anesthesia_patterns = [
-        r'(?:anestesia|anesthesia)[\s]*(?:general|epidural|regional|local|sedación)',
-        r'(?:bloqueo|block)[\s]*(?:epidural|regional)',
-        r'(?:sedación|sedation)[\s]*(?:básica|basic)?'
-    ]
-    for pattern in anesthesia_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            quote_data["anesthesia_type"] = match.group(0).strip()
-            break
-    
-    # Cost patterns (Mexican Pesos)
-    cost_patterns = {
-        "facility_fee": [
-            r'(?:instalaciones|facilities|hospital)[\s:$]*(\$?[\d,]+\.?\d*)',
-            r'(?:costo.*hospital)[\s:$]*(\$?[\d,]+\.?\d*)'
-        ],
-        "equipment_costs": [
-            r'(?:equipos|equipment|instrumental)[\s:$]*(\$?[\d,]+\.?\d*)',
-            r'(?:materiales|supplies)[\s:$]*(\$?[\d,]+\.?\d*)'
-        ],
-        "anesthesia_fee": [
-            r'(?:anestesia|anesthesia)[\s:$]*(\$?[\d,]+\.?\d*)'
+    Sketches cannot forget a value, so the stats are recomputed from the
+    procedure's other quotes: those stored, less exclude_id.
+    """
+    key = procedure_key(quote.get("procedure_name"))
+    async def remove(stats):
+        if stats is None:
+            return None
+        remaining = await db.quotes.find({"procedure_key": key, "id": {"$ne": exclude_id}}, STATS_PROJECTION).to_list(None)
+        totals = quote_totals(remaining).get(key)
+        return totals and {**totals, "procedure_name": stats["procedure_name"]}
+    await update_procedure_stats(key, remove)
+
+# Procedure and surgeon catalogs (see catalog): {key, name, quote_count}
+# documents counted up and down by quote writes. A catalog's counter is
+# bumped when one of its documents is added or deleted, which is when the
+# workers' autocomplete indexes reload it.
+CATALOGS = {"procedures": "procedure_name", "surgeons": "surgeon_name"}
+catalog_indexes = {catalog: CatalogIndex() for catalog in CATALOGS}
+# and this worker's trigram index of the procedure_stats keys (see trigrams)
+procedure_trigram_index = CatalogIndex(TrigramIndex)
+
+async def add_to_catalogs(quotes: List[dict]):
+    for catalog, field in CATALOGS.items():
+        counts = name_counts(quote.get(field) for quote in quotes)
+        if not counts:
+            continue
+        updates = [
+            UpdateOne({"key": key}, {"$inc": {"quote_count": count}, "$setOnInsert": {"name": name}}, upsert=True)
+            for key, (name, count) in counts.items()
         ]
-    }
+        try:
+            result = await db[catalog].bulk_write(updates, ordered=False)
+            added = result.upserted_count
+        except BulkWriteError as e:
+            # Two writers upserting the same new key: the loser retries, which now finds it
+            added = e.details["nUpserted"]
+            for error in e.details["writeErrors"]:
+                added += (await db[catalog].bulk_write([updates[error["index"]]])).upserted_count
+        if added:
+            await bump_counter(catalog)
+
+async def remove_from_catalogs(quotes: List[dict]):
+    for catalog, field in CATALOGS.items():
+        counts = name_counts(quote.get(field) for quote in quotes)
+        if not counts:
+            continue
+        await db[catalog].bulk_write([
+            UpdateOne({"key": key}, {"$inc": {"quote_count": -count}}) for key, (_, count) in counts.items()
+        ], ordered=False)
+        result = await db[catalog].delete_many({"key": {"$in": list(counts)}, "quote_count": {"$lte": 0}})
+        if result.deleted_count:
+            await bump_counter(catalog)
+
+async def rebuild_catalogs(catalogs: Optional[List[str]] = None) -> Dict[str, int]:
+    """Recount catalogs (all by default) from the quotes; returns the number of entries of each"""
+    catalogs = catalogs or list(CATALOGS)
+    names = {catalog: [] for catalog in catalogs}
+    async for quote in db.quotes.find({}, {"_id": 0, **{CATALOGS[catalog]: 1 for catalog in catalogs}}):
+        for catalog in catalogs:
+            names[catalog].append(quote.get(CATALOGS[catalog]))
+    sizes = {}
+    for catalog, catalog_names in names.items():
+        counts = name_counts(catalog_names)
+        await db[catalog].delete_many({})
+        if counts:
+            await db[catalog].insert_many([{"key": key, "name": name, "quote_count": count} for key, (name, count) in counts.items()])
+        await bump_counter(catalog)
+        sizes[catalog] = len(counts)
+    await invalidate_responses()
+    return sizes
+
+async def catalog_index(catalog: str) -> PrefixIndex:
+    """This worker's PrefixIndex of a catalog, reloaded if the catalog changed since it was built"""
+    counter = await db.counters.find_one({"_id": catalog}) or {}
+    version = (counter.get("value", 0), counter.get("updated_at"))
+    index = catalog_indexes[catalog]
+    if index.stale(version):
+        index.update(version, [(entry["key"], entry["name"]) async for entry in db[catalog].find({}, {"_id": 0, "key": 1, "name": 1})])
+    return index.current
+
+async def procedure_trigrams() -> TrigramIndex:
+    """This worker's TrigramIndex of the procedure keys, reloaded if the procedure catalog changed since it was built.
     
-    for cost_type, patterns in cost_patterns.items():
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                cost_str = match.group(1).replace('$', '').replace(',', '')
-                try:
-                    quote_data[cost_type] = float(cost_str)
-                    break
-                except ValueError:
-                    continue
-    
-    # Total cost patterns
-    total_patterns = [
-        r'(?:total|costo total|total cost)[\s:$]*(\$?[\d,]+\.?\d*)',
-        r'(?:suma|amount)[\s:$]*(\$?[\d,]+\.?\d*)'
-    ]
-    total_cost = 0
-    for pattern in total_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            cost_str = match.group(1).replace('$', '').replace(',', '')
-            try:
-                total_cost = float(cost_str)
-                break
-            except ValueError:
-                continue
+    A new or deleted procedure_stats document comes with a new or deleted
+    procedures catalog entry, so the catalog's counter tells when the keys changed.
+    """
+    counter = await db.counters.find_one({"_id": "procedures"}) or {}
+    version = (counter.get("value", 0), counter.get("updated_at"))
+    if procedure_trigram_index.stale(version):
+        entries = [(stats["key"], stats["procedure_name"]) async for stats in db.procedure_stats.find({}, {"_id": 0, "key": 1, "procedure_name": 1})]
+        procedure_trigram_index.update(version, entries)
+    return procedure_trigram_index.current
+
+# Bumped whenever quote_search_fields() changes, so that the stored terms get recomputed
+SEARCH_FIELDS_VERSION = 1
+
+async def fill_search_fields():
+    """Compute search_names/search_text again for every quote (and for those stored before full-text search)"""
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in SEARCH_SOURCE_FIELDS}}
+    updates = []
+    async for quote in db.quotes.find({}, projection):
+        updates.append(UpdateOne({"id": quote["id"]}, {"$set": quote_search_fields(quote)}))
+        if len(updates) == BULK_BATCH_SIZE:
+            await db.quotes.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.quotes.bulk_write(updates, ordered=False)
+
+async def rebuild_procedure_stats() -> int:
+    """Recompute procedure_stats from the quotes; returns the number of procedures"""
+    totals = {}
+    updates = []
+    async for quote in db.quotes.find({}, {**STATS_PROJECTION, "id": 1, "procedure_key": 1}):
+        quote_totals([quote], totals)
+        # Quotes saved before procedure_key existed, or under a previous procedure_key(), need it
+        key = procedure_key(quote.get("procedure_name"))
+        if quote.get("procedure_key") != key:
+            updates.append(UpdateOne({"id": quote["id"]}, {"$set": {"procedure_key": key}}))
+        if len(updates) >= 500:
+            await db.quotes.bulk_write(updates)
+            updates = []
+    if updates:
+        await db.quotes.bulk_write(updates)
     
-    # If no individual costs found but total exists, distribute proportionally
-    if total_cost > 0 and (quote_data["facility_fee"] + quote_data["equipment_costs"] + quote_data["anesthesia_fee"]) == 0:
-        quote_data["facility_fee"] = total_cost * 0.6  # 60% facilities
-        quote_data["equipment_costs"] = total_cost * 0.3  # 30% equipment
-        quote_data["anesthesia_fee"] = total_cost * 0.1  # 10% anesthesia
-    
-    # Extract medications and services from text
-    medication_keywords = ['antibiótico', 'analgésico', 'antiinflamatorio', 'medicamento', 'fármaco']
-    for keyword in medication_keywords:
-        if keyword in text.lower():
-            quote_data["surgical_package"]["medications_included"].append(keyword.title())
-    
-    # Extract special equipment
-    equipment_keywords = ['prótesis', 'implante', 'stent', 'marcapasos', 'dispositivo', 'laparoscopia', 'artroscopia']
-    for keyword in equipment_keywords:
-        if keyword in text.lower():
-            quote_data["additional_equipment"].append(keyword.title())
-    
-    # Hospital stay patterns
-    nights_patterns = [
-        r'(\d+)\s*(?:noches?|nights?|días?|days?)\s*(?:hospitalización|hospital)',
-        r'(?:hospitalización|hospital)[\s:]*(\d+)\s*(?:noches?|días?)',
-        r'(?:ambulatori[ao]|outpatient)'
-    ]
-    for pattern in nights_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            if 'ambulatori' in match.group(0).lower() or 'outpatient' in match.group(0).lower():
-                quote_data["is_ambulatory"] = True
-                quote_data["hospital_nights"] = 0
-            else:
-                nights = int(match.group(1)) if match.group(1).isdigit() else 0
-                quote_data["hospital_nights"] = nights
-                quote_data["is_ambulatory"] = nights == 0
-            break
-    
-    return quote_data
+    await db.procedure_stats.delete_many({})
+    if totals:
+        await db.procedure_stats.insert_many([
+            {**row, "key": key, "sketches": dump_sketches(row["sketches"]), "version": 1} for key, row in totals.items()
+        ])
+    # The trigram indexes of the keys may have to reload
+    await bump_counter("procedures")
+    await invalidate_responses()
+    return len(totals)
 
 # Define Models
 class SurgicalPackage(BaseModel):
@@ -318,6 +377,9 @@ class Quote(BaseModel):
     created_by: str
     status: str = "borrador"
     notes: Optional[str] = None
+    # Bumped by every update; the quote's ETag is derived from it
+    version: int = 0
+    updated_at: Optional[datetime] = None
 
 class QuoteCreate(BaseModel):
     patient_id: Optional[str] = None
@@ -343,6 +405,22 @@ class QuoteCreate(BaseModel):
     created_by: str
     notes: Optional[str] = None
 
+class ImportedQuote(QuoteCreate):
+    # Kept when given, so that an export imports back as is
+    id: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class BulkQuoteError(BaseModel):
+    index: int
+    errors: Dict[str, List[str]]
+
+class BulkQuoteResult(BaseModel):
+    success: bool
+    message: str
+    quotes_created: int
+    quote_ids: List[str]
+    errors: List[BulkQuoteError]
+
 class PricingSuggestion(BaseModel):
     procedure_name: str
     avg_facility_fee: float
@@ -350,6 +428,13 @@ class PricingSuggestion(BaseModel):
     avg_total_cost: float
     quote_count: int
     suggested_total: float
+    min_total_cost: float = 0
+    max_total_cost: float = 0
+    # {"total_cost": {"p25", "median", "p75", "p90"}, ...} for each cost field
+    quantiles: Dict[str, Dict[str, float]] = {}
+    # How the procedures matched ("exact", "prefix" or "similar") and their names
+    match: Optional[str] = None
+    matched_procedures: List[str] = []
 
 class PDFProcessResult(BaseModel):
     success: bool
@@ -357,6 +442,60 @@ class PDFProcessResult(BaseModel):
     quotes_created: int
     extracted_data: Optional[dict] = None
     errors: Optional[List[str]] = None
+    cache_hit: bool = False
+
+class PDFFileResult(BaseModel):
+    filename: str
+    success: bool
+    message: str
+    quote_id: Optional[str] = None
+    extracted_data: Optional[dict] = None
+    errors: Optional[List[str]] = None
+    cache_hit: bool = False
+
+class PDFBatchResult(BaseModel):
+    success: bool
+    message: str
+    quotes_created: int
+    results: List[PDFFileResult]
+
+class ImportJob(BaseModel):
+    id: str
+    filename: str
+    state: str
+    pages_done: int
+    pages_total: Optional[int] = None
+    quote_id: Optional[str] = None
+    result: Optional[PDFProcessResult] = None
+    created_at: datetime
+    updated_at: datetime
+
+class QuotePage(BaseModel):
+    results: List[Quote]
+    next_cursor: Optional[str] = None
+
+class SearchPage(BaseModel):
+    results: List[Quote]
+    next_offset: Optional[int] = None
+
+# Conditional GETs (see conditional): the validators are read first, and a
+# client whose copy is current gets a 304 before any quote is loaded
+
+def not_modified(request: Request, response: Response, etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """Put the validators on response; return a 304 if the request's copy is current"""
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    response.headers.update(headers)
+    if is_fresh(request.headers.get("if-none-match"), request.headers.get("if-modified-since"), etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return None
+
+async def quotes_validators(request: Request):
+    """ETag and Last-Modified of a response computed from all quotes, per endpoint and parameters"""
+    counter = await db.counters.find_one({"_id": "quotes"}) or {}
+    etag = make_etag(request.url.path, counter.get("value", 0), sorted(request.query_params.multi_items()))
+    return etag, counter.get("updated_at")
 
 # API Routes
 @api_router.get("/")
@@ -369,67 +508,29 @@ async def upload_pdf(file: UploadFile = File(...)):
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
     
+    # Stream the upload to disk; worker processes open it by path
     try:
-        # Read PDF content
-        pdf_content = await file.read()
-        
-        # Extract text from PDF
-        extracted_text = extract_text_from_pdf(pdf_content)
-        
-        if not extracted_text:
-            return PDFProcessResult(
-                success=False,
-                message="No se pudo extraer texto del PDF",
-                quotes_created=0,
-                errors=["PDF vacío o no se pudo procesar"]
-            )
-        
-        # Parse quote data from text
-        quote_data = parse_quote_from_text(extracted_text)
-        
-        # Validate required fields
-        if not quote_data["procedure_name"]:
-            return PDFProcessResult(
-                success=False,
-                message="Información insuficiente en el PDF",
-                quotes_created=0,
-                extracted_data=quote_data,
-                errors=["No se pudo identificar el procedimiento"]
-            )
-            
-        if quote_data["surgery_duration_hours"] == 0:
-            return PDFProcessResult(
-                success=False,
-                message="Información insuficiente en el PDF",
-                quotes_created=0,
-                extracted_data=quote_data,
-                errors=["No se pudo identificar la duración de la cirugía en horas"]
-            )
-        
-        if not quote_data["anesthesia_type"]:
-            quote_data["anesthesia_type"] = "Anestesia General"  # Default
-        
-        # Calculate total cost
-        total_cost = (quote_data["facility_fee"] + 
-                     quote_data["equipment_costs"] + 
-                     quote_data["anesthesia_fee"] + 
-                     quote_data["other_costs"])
-        
-        quote_data['total_cost'] = total_cost
-        
-        # Create Quote object
-        quote_obj = Quote(**quote_data)
-        
-        # Save to database
-        quote_mongo = prepare_for_mongo(quote_obj.dict())
-        await db.quotes.insert_one(quote_mongo)
-        
-        return PDFProcessResult(
-            success=True,
-            message="Cotización creada exitosamente desde PDF",
-            quotes_created=1,
-            extracted_data=quote_data
+        pdf_path = await run_in_threadpool(spool_to_disk, file.file)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=UPLOAD_TOO_LARGE)
+    
+    # Extract and parse on the PDF work queue so the event loop stays free
+    try:
+        future = pdf_work_queue.submit(process_pdf, (file.filename, pdf_path))
+    except PDFQueueFull:
+        os.unlink(pdf_path)
+        raise HTTPException(
+            status_code=503,
+            detail="Demasiados PDFs en proceso, intente de nuevo más tarde",
+            headers={"Retry-After": str(PDF_RETRY_AFTER_SECONDS)}
         )
+    
+    try:
+        try:
+            result = await asyncio.wrap_future(future)
+        finally:
+            os.unlink(pdf_path)
+        return await save_pdf_result(result)
         
     except Exception as e:
         logging.error(f"Error processing PDF: {e}")
@@ -440,37 +541,390 @@ async def upload_pdf(file: UploadFile = File(...)):
             errors=[str(e)]
         )
 
-@api_router.post("/quotes", response_model=Quote)
-async def create_quote(quote_data: QuoteCreate):
+async def save_pdf_result(result: dict) -> PDFProcessResult:
+    """Save the quote of a processed upload and build the upload response"""
+    if not result["success"]:
+        return PDFProcessResult(
+            success=False,
+            message=result["message"],
+            quotes_created=0,
+            extracted_data=result["extracted_data"],
+            errors=result["errors"],
+            cache_hit=result["cache_hit"]
+        )
+    
+    quote_data = result["extracted_data"]
+    
+    # Create Quote object
+    quote_obj = Quote(**quote_data)
+    
+    # Save to database
+    quote_mongo = prepare_for_mongo(quote_obj.model_dump())
+    await insert_quotes([quote_mongo])
+    
+    return PDFProcessResult(
+        success=True,
+        message=result["message"],
+        quotes_created=1,
+        extracted_data=quote_data,
+        cache_hit=result["cache_hit"]
+    )
+
+@api_router.post("/upload-pdf/stream")
+async def upload_pdf_stream(file: UploadFile = File(...)):
+    """Like /upload-pdf, but streams page and field events (SSE) while the PDF is extracted.
+    
+    The last event, "result", carries the PDFProcessResult.
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
+    
+    try:
+        pdf_path = await run_in_threadpool(spool_to_disk, file.file)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=UPLOAD_TOO_LARGE)
+    
+    # Extraction runs in its own child process, but still counts against the PDF work queue
+    try:
+        pdf_work_queue.reserve()
+    except PDFQueueFull:
+        os.unlink(pdf_path)
+        raise HTTPException(
+            status_code=503,
+            detail="Demasiados PDFs en proceso, intente de nuevo más tarde",
+            headers={"Retry-After": str(PDF_RETRY_AFTER_SECONDS)}
+        )
+    
+    async def events():
+        try:
+            async for event, data in iterate_in_threadpool(iter_process_pdf((file.filename, pdf_path))):
+                if event == "result":
+                    try:
+                        data = (await save_pdf_result(data)).model_dump()
+                    except Exception as e:
+                        logging.error(f"Error processing PDF: {e}")
+                        data = PDFProcessResult(success=False, message=f"Error procesando PDF: {str(e)}", quotes_created=0, errors=[str(e)]).model_dump()
+                yield sse_event(event, data)
+        finally:
+            pdf_work_queue.release()
+            os.unlink(pdf_path)
+    
+    # X-Accel-Buffering keeps proxies such as nginx from buffering the stream
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.post("/upload-pdf/batch", response_model=PDFBatchResult)
+async def upload_pdf_batch(files: List[UploadFile] = File(...)):
+    """Process many PDFs (or a ZIP of PDFs) in parallel and save every valid quote at once"""
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            items = await run_in_threadpool(spool_batch, [(upload.filename, upload.file) for upload in files], directory)
+        except UploadTooLarge:
+            raise HTTPException(status_code=413, detail=BATCH_TOO_LARGE)
+        except TooManyBatchFiles:
+            raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_FILES} archivos por lote")
+        
+        try:
+            results = await run_in_threadpool(process_pdf_batch, items, pdf_work_queue)
+        except PDFQueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Demasiados PDFs en proceso, intente de nuevo más tarde",
+                headers={"Retry-After": str(PDF_RETRY_AFTER_SECONDS)}
+            )
+    
+    quotes = []
+    saved = []
+    for result in results:
+        if result["success"]:
+            try:
+                quote_obj = Quote(**result["extracted_data"])
+            except Exception as e:
+                result.update(success=False, message="Error validando datos", errors=[str(e)])
+                continue
+            result["quote_id"] = quote_obj.id
+            quotes.append(prepare_for_mongo(quote_obj.model_dump()))
+            saved.append(result)
+    
+    failed = await insert_quotes(quotes) if quotes else {}
+    for index, message in failed.items():
+        saved[index].update(success=False, message="Error guardando la cotización", errors=[message], quote_id=None)
+    created = len(quotes) - len(failed)
+    
+    return PDFBatchResult(
+        success=bool(created),
+        message=f"{created} de {len(results)} cotizaciones creadas desde PDF",
+        quotes_created=created,
+        results=[PDFFileResult(**result) for result in results]
+    )
+
+def save_imported_quote(quote_data: dict) -> str:
+    """Save a quote parsed by an import job; called from a worker thread"""
+    quote_obj = Quote(**quote_data)
+    quote_mongo = prepare_for_mongo(quote_obj.model_dump())
+    asyncio.run_coroutine_threadsafe(insert_quotes([quote_mongo]), app.state.loop).result()
+    return quote_obj.id
+
+@api_router.post("/import-jobs", response_model=ImportJob, status_code=202)
+async def create_import_job(file: UploadFile = File(...)):
+    """Store a PDF and process it in the background; poll GET /import-jobs/{id} for the result"""
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
+    
+    try:
+        job = await run_in_threadpool(app.state.import_jobs.create, file.filename, file.file)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=UPLOAD_TOO_LARGE)
+    return ImportJob(**job)
+
+@api_router.get("/import-jobs/{job_id}", response_model=ImportJob)
+async def get_import_job(job_id: str):
+    job = await run_in_threadpool(app.state.import_jobs.store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo de importación no encontrado")
+    return ImportJob(**job)
+
+def new_quote(quote_data: QuoteCreate) -> Quote:
     # Calculate total cost
     total_cost = (quote_data.facility_fee + 
                  quote_data.equipment_costs + (quote_data.anesthesia_fee or 0) + 
                  (quote_data.other_costs or 0))
     
-    quote_dict = quote_data.dict()
+    quote_dict = quote_data.model_dump()
     quote_dict['total_cost'] = total_cost
-    quote_obj = Quote(**quote_dict)
+    return Quote(**quote_dict)
+
+def validation_messages(error: ValidationError) -> Dict[str, List[str]]:
+    """{field: [messages]} of a pydantic ValidationError, as the bulk and import endpoints report them"""
+    messages = {}
+    for item in error.errors():
+        field = ".".join(str(part) for part in item["loc"]) or "non_field_errors"
+        messages.setdefault(field, []).append(item["msg"])
+    return messages
+
+@api_router.post("/quotes", response_model=Quote)
+async def create_quote(quote_data: QuoteCreate):
+    quote_obj = new_quote(quote_data)
     
     # Prepare for MongoDB
-    quote_mongo = prepare_for_mongo(quote_obj.dict())
-    await db.quotes.insert_one(quote_mongo)
+    quote_mongo = prepare_for_mongo(quote_obj.model_dump())
+    await insert_quotes([quote_mongo])
     
     return quote_obj
 
-@api_router.get("/quotes", response_model=List[Quote])
-async def get_quotes(procedure_name: Optional[str] = None, surgeon_name: Optional[str] = None):
+@api_router.post("/quotes/bulk", response_model=BulkQuoteResult, status_code=201)
+async def create_quotes_bulk(items: List[Any], response: Response):
+    """Create a list of quotes, BULK_BATCH_SIZE per insert.
+    
+    Each item is validated on its own: invalid ones (and any the database
+    rejects) are reported in errors by their index and the others are still
+    created.
+    """
+    if len(items) > BULK_MAX_QUOTES:
+        raise HTTPException(status_code=400, detail=BULK_TOO_MANY)
+    
+    indexes = []
+    quotes = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            quote_obj = new_quote(QuoteCreate.model_validate(item))
+        except ValidationError as e:
+            errors.append(BulkQuoteError(index=index, errors=validation_messages(e)))
+            continue
+        indexes.append(index)
+        quotes.append(prepare_for_mongo(quote_obj.model_dump()))
+    
+    failed = await insert_quotes(quotes) if quotes else {}
+    errors.extend(BulkQuoteError(index=indexes[i], errors={"non_field_errors": [message]}) for i, message in failed.items())
+    created = [quote["id"] for i, quote in enumerate(quotes) if i not in failed]
+    if not created:
+        response.status_code = 400
+    return BulkQuoteResult(
+        success=bool(created),
+        message=f"{len(created)} de {len(items)} cotizaciones creadas",
+        quotes_created=len(created),
+        quote_ids=created,
+        errors=sorted(errors, key=lambda error: error.index)
+    )
+
+def quote_filter(procedure_name: Optional[str], surgeon_name: Optional[str]) -> dict:
     filter_query = {}
     if procedure_name:
         filter_query["procedure_name"] = {"$regex": procedure_name, "$options": "i"}
     if surgeon_name:
         filter_query["surgeon_name"] = {"$regex": surgeon_name, "$options": "i"}
+    return filter_query
+
+@api_router.get("/quotes/export")
+async def export_quotes(format: str = "csv", procedure_name: Optional[str] = None, surgeon_name: Optional[str] = None):
+    """Stream the quotes, filtered as by GET /quotes, as CSV (default) or NDJSON.
+    
+    Documents are read through the cursor and written as they come, so memory
+    use does not grow with the export.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=INVALID_FORMAT)
+    cursor = db.quotes.find(quote_filter(procedure_name, surgeon_name), {"_id": 0})
+    cursor = cursor.sort([("created_at", -1), ("id", -1)]).batch_size(EXPORT_BATCH_ROWS)
+    return StreamingResponse(
+        aiter_export(cursor, format),
+        media_type=EXPORT_FORMATS[format][0],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format)}"'}
+    )
+
+def imported_quote(record: dict) -> dict:
+    """The Mongo document of an imported record; ValidationError if it is invalid"""
+    quote_data = ImportedQuote.model_validate(record)
+    quote_obj = new_quote(QuoteCreate(**quote_data.model_dump(exclude={"id", "created_at"})))
+    return prepare_for_mongo({**quote_obj.model_dump(), **quote_data.model_dump(include={"id", "created_at"}, exclude_none=True)})
+
+async def import_quote_lines(stream, file_format: str):
+    """Import the quotes of a CSV/NDJSON file; yields the lines of its error file (see ImportLog).
     
-    quotes = await db.quotes.find(filter_query).sort("created_at", -1).to_list(1000)
-    parsed_quotes = [parse_from_mongo(quote) for quote in quotes]
-    return [Quote(**quote) for quote in parsed_quotes]
+    The file is read IMPORT_BATCH_ROWS rows at a time in a worker thread;
+    each batch is validated and inserted with insert_quotes(). Rows whose id
+    is already taken are rejected.
+    """
+    log = ImportLog()
+    async for batch in iterate_in_threadpool(chunked(iter_records(stream, file_format), IMPORT_BATCH_ROWS)):
+        log.rows += len(batch)
+        rows = []
+        quotes = []
+        for row, record, error in batch:
+            if error is not None:
+                yield log.reject(row, {"non_field_errors": [error]})
+                continue
+            try:
+                quotes.append(imported_quote(record))
+                rows.append(row)
+            except ValidationError as e:
+                yield log.reject(row, validation_messages(e))
+        
+        taken = set()
+        for ids in chunked([quote["id"] for quote in quotes]):
+            taken.update(quote["id"] for quote in await db.quotes.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(None))
+        new_rows = []
+        new_quotes = []
+        for row, quote in zip(rows, quotes):
+            if quote["id"] in taken:
+                yield log.reject(row, {"id": ["Ya existe una cotización con este id"]})
+                continue
+            taken.add(quote["id"])
+            new_rows.append(row)
+            new_quotes.append(quote)
+        failed = await insert_quotes(new_quotes) if new_quotes else {}
+        for index, message in failed.items():
+            yield log.reject(new_rows[index], {"non_field_errors": [message]})
+        log.created += len(new_quotes) - len(failed)
+        yield log.progress()
+    yield log.result()
+
+@api_router.post("/quotes/import")
+async def import_quotes(file: UploadFile = File(...), format: Optional[str] = Form(None)):
+    """Import the quotes of a CSV or NDJSON file, in the layout of /quotes/export.
+    
+    The format comes from the file name, or from the format field. The
+    response streams the import's error file as it goes (NDJSON): one line
+    per rejected row, a progress line after each batch and the result last.
+    """
+    try:
+        file_format = import_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        path = await run_in_threadpool(spool_to_disk, file.file, None, IMPORT_MAX_UPLOAD_BYTES, f".{file_format}")
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=IMPORT_TOO_LARGE)
+    
+    async def lines():
+        try:
+            with open(path, "rb") as stream:
+                async for line in import_quote_lines(stream, file_format):
+                    yield line
+        finally:
+            os.unlink(path)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@api_router.get("/quotes/search", response_model=SearchPage)
+async def search_quotes(request: Request, response: Response, q: str = "",
+                        limit: Optional[str] = None, offset: Optional[str] = None):
+    """Quotes with every word of q in their procedure or surgeon name, description or notes.
+    
+    Words are matched ignoring case and accents and by their stem (see
+    search), through the text index of search_names/search_text. Best
+    matches come first, name matches above the others, then the newest. One
+    SearchPage of limit quotes per response; pass next_offset back as offset
+    for the following page.
+    """
+    terms = query_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Indique al menos una palabra para buscar")
+    try:
+        size = page_size(limit)
+        skip = search_offset(offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    unchanged = not_modified(request, response, *await quotes_validators(request))
+    if unchanged:
+        return unchanged
+    
+    # Quoted, each term is a phrase, and a document must have every phrase (bare words would match any)
+    text_filter = {"$text": {"$search": " ".join(f'"{term}"' for term in terms)}}
+    score = {"$meta": "textScore"}
+    cursor = db.quotes.find(text_filter, {"score": score}).sort([("score", score), ("created_at", -1), ("id", -1)])
+    quotes = await cursor.skip(skip).limit(size + 1).to_list(size + 1)
+    next_offset = skip + size if len(quotes) > size and skip + size <= MAX_SEARCH_OFFSET else None
+    return SearchPage(results=[Quote(**parse_from_mongo(quote)) for quote in quotes[:size]], next_offset=next_offset)
+
+@api_router.get("/quotes", response_model=Union[QuotePage, List[Quote]])
+async def get_quotes(request: Request, response: Response,
+                     procedure_name: Optional[str] = None, surgeon_name: Optional[str] = None,
+                     limit: Optional[str] = None, cursor: Optional[str] = None):
+    """List quotes newest first.
+    
+    With limit and/or cursor the response is one QuotePage; pass next_cursor
+    back as cursor for the following page. Without them up to 1000 quotes are
+    returned as a plain list.
+    """
+    unchanged = not_modified(request, response, *await quotes_validators(request))
+    if unchanged:
+        return unchanged
+    
+    filter_query = quote_filter(procedure_name, surgeon_name)
+    if limit is None and cursor is None:
+        quotes = await db.quotes.find(filter_query).sort([("created_at", -1), ("id", -1)]).to_list(1000)
+        parsed_quotes = [parse_from_mongo(quote) for quote in quotes]
+        return [Quote(**quote) for quote in parsed_quotes]
+    
+    try:
+        size = page_size(limit)
+        if cursor:
+            created_at, quote_id = decode_cursor(cursor)
+            # Everything strictly after (created_at, id) in descending order
+            filter_query["created_at"] = {"$lte": created_at}
+            filter_query["$nor"] = [{"created_at": created_at, "id": {"$gte": quote_id}}]
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    quotes = await db.quotes.find(filter_query).sort([("created_at", -1), ("id", -1)]).limit(size + 1).to_list(size + 1)
+    next_cursor = encode_cursor(quotes[size - 1]["created_at"], quotes[size - 1]["id"]) if len(quotes) > size else None
+    return QuotePage(
+        results=[Quote(**parse_from_mongo(quote)) for quote in quotes[:size]],
+        next_cursor=next_cursor
+    )
 
 @api_router.get("/quotes/{quote_id}", response_model=Quote)
-async def get_quote(quote_id: str):
+async def get_quote(quote_id: str, request: Request, response: Response):
+    current = await db.quotes.find_one({"id": quote_id}, {"_id": 0, "version": 1, "created_at": 1, "updated_at": 1})
+    if not current:
+        raise HTTPException(status_code=404, detail="Cotización no encontrada")
+    current = parse_from_mongo(current)
+    etag = make_etag("quote", quote_id, current.get("version", 0))
+    unchanged = not_modified(request, response, etag, current.get("updated_at") or current.get("created_at"))
+    if unchanged:
+        return unchanged
+    
     quote = await db.quotes.find_one({"id": quote_id})
     if not quote:
         raise HTTPException(status_code=404, detail="Cotización no encontrada")
@@ -485,79 +939,93 @@ async def update_quote(quote_id: str, quote_data: QuoteCreate):
                  quote_data.equipment_costs + (quote_data.anesthesia_fee or 0) + 
                  (quote_data.other_costs or 0))
     
-    quote_dict = quote_data.dict()
+    quote_dict = quote_data.model_dump()
     quote_dict['total_cost'] = total_cost
     quote_dict['id'] = quote_id
+    quote_dict['updated_at'] = datetime.now(timezone.utc)
     
     # Prepare for MongoDB
     quote_mongo = prepare_for_mongo(quote_dict)
     
-    result = await db.quotes.replace_one({"id": quote_id}, quote_mongo)
-    if result.matched_count == 0:
+    # $set keeps the fields QuoteCreate lacks (created_at, status); $inc gives the quote a new ETag
+    previous = await db.quotes.find_one_and_update(
+        {"id": quote_id}, {"$set": quote_mongo, "$inc": {"version": 1}}, return_document=ReturnDocument.BEFORE
+    )
+    if previous is None:
         raise HTTPException(status_code=404, detail="Cotización no encontrada")
     
-    return Quote(**quote_dict)
+    await remove_procedure_stats(previous, exclude_id=quote_id)
+    await add_procedure_stats([quote_mongo])
+    for catalog, field in CATALOGS.items():
+        if fold(previous.get(field)) != fold(quote_mongo.get(field)):
+            await remove_from_catalogs([{field: previous.get(field)}])
+            await add_to_catalogs([{field: quote_mongo.get(field)}])
+    await quotes_changed()
+    return Quote(**parse_from_mongo({**previous, **quote_mongo, "version": previous.get("version", 0) + 1}))
 
 @api_router.delete("/quotes/{quote_id}")
 async def delete_quote(quote_id: str):
-    result = await db.quotes.delete_one({"id": quote_id})
-    if result.deleted_count == 0:
+    previous = await db.quotes.find_one_and_delete({"id": quote_id})
+    if previous is None:
         raise HTTPException(status_code=404, detail="Cotización no encontrada")
+    await remove_procedure_stats(previous)
+    await remove_from_catalogs([previous])
+    await quotes_changed()
     return {"message": "Cotización eliminada exitosamente"}
 
+# The endpoints below are read far more often than quotes change; their
+# responses are cached until the next quote write
+
 @api_router.get("/pricing-suggestions/{procedure_name}", response_model=PricingSuggestion)
 async def get_pricing_suggestions(procedure_name: str):
-    # Get historical quotes for this procedure
-    pipeline = [
-        {"$match": {"procedure_name": {"$regex": procedure_name, "$options": "i"}}},
-        {"$group": {
-            "_id": None,
-            "avg_facility_fee": {"$avg": "$facility_fee"},
-            "avg_equipment_costs": {"$avg": "$equipment_costs"},
-            "avg_total_cost": {"$avg": "$total_cost"},
-            "count": {"$sum": 1}
-        }}
-    ]
-    
-    result = await db.quotes.aggregate(pipeline).to_list(1)
-    
-    if not result:
-        return PricingSuggestion(
-            procedure_name=procedure_name,
-            avg_facility_fee=0,
-            avg_equipment_costs=0,
-            avg_total_cost=0,
-            quote_count=0,
-            suggested_total=0
-        )
-    
-    data = result[0]
-    suggested_total = data['avg_total_cost'] if data['avg_total_cost'] else 0
+    async def compute():
+        # The stats of the procedure with the search's key, else of those whose
+        # key starts with it, else of the most similar one
+        key = procedure_key(procedure_name)
+        rows, match = [], None
+        if key:
+            rows, match = matching_rows(key, await db.procedure_stats.find({"key": {"$regex": "^" + re.escape(key)}}, {"_id": 0}).to_list(None))
+            similar = (await procedure_trigrams()).similar(key) if not rows and PRICING_SIMILAR_MATCH else []
+            if similar:
+                rows, match = await db.procedure_stats.find({"key": similar[0][0]}, {"_id": 0}).to_list(None), "similar"
+        return PricingSuggestion(**pricing_suggestion(procedure_name, rows, match))
+    return await response_cache.aget_or_set("pricing_suggestions", {"procedure_name": procedure_name}, compute)
+
+async def catalog_names(catalog: str, prefix: Optional[str], limit: Optional[str]):
+    """Every name of a catalog, sorted; with prefix and/or limit, those that match (autocomplete).
     
-    return PricingSuggestion(
-        procedure_name=procedure_name,
-        avg_facility_fee=round(data['avg_facility_fee'] if data['avg_facility_fee'] else 0, 2),
-        avg_equipment_costs=round(data['avg_equipment_costs'] if data['avg_equipment_costs'] else 0, 2),
-        avg_total_cost=round(data['avg_total_cost'] if data['avg_total_cost'] else 0, 2),
-        quote_count=data['count'],
-        suggested_total=round(suggested_total, 2)
-    )
+    Autocomplete is not cached: this worker's index of the catalog answers it
+    in memory, after one lookup of the catalog's version.
+    """
+    if not prefix and limit is None:
+        async def compute():
+            return {catalog: (await catalog_index(catalog)).names()}
+        return await response_cache.aget_or_set(catalog, {}, compute)
+    try:
+        size = autocomplete_limit(limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {catalog: (await catalog_index(catalog)).search(prefix or "", size)}
 
 @api_router.get("/procedures")
-async def get_procedures():
+async def get_procedures(prefix: Optional[str] = None, limit: Optional[str] = None):
     """Get list of unique procedure names for filtering"""
-    procedures = await db.quotes.distinct("procedure_name")
-    return {"procedures": procedures}
+    return await catalog_names("procedures", prefix, limit)
 
 @api_router.get("/surgeons")
-async def get_surgeons():
+async def get_surgeons(prefix: Optional[str] = None, limit: Optional[str] = None):
     """Get list of unique surgeon names for filtering"""
-    surgeons = await db.quotes.distinct("surgeon_name")
-    return {"surgeons": surgeons}
+    return await catalog_names("surgeons", prefix, limit)
 
 @api_router.get("/dashboard")
-async def get_dashboard_stats():
+async def get_dashboard_stats(request: Request, response: Response):
     """Get dashboard statistics"""
+    unchanged = not_modified(request, response, *await quotes_validators(request))
+    if unchanged:
+        return unchanged
+    return await response_cache.aget_or_set("dashboard", {}, dashboard_stats)
+
+async def dashboard_stats():
     total_quotes = await db.quotes.count_documents({})
     
     # Recent quotes
@@ -578,9 +1046,24 @@ async def get_dashboard_stats():
         "top_procedures": [{"name": proc["_id"], "count": proc["count"]} for proc in top_procedures]
     }
 
+@api_router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit and miss counts of the response cache, across every worker"""
+    return await run_in_threadpool(response_cache.stats)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Answer 413 from Content-Length before an upload body is read"""
+    limit = UPLOAD_LIMITS.get(request.url.path)
+    content_length = request.headers.get("content-length", "")
+    if limit and content_length.isdigit() and int(content_length) > limit:
+        detail = IMPORT_TOO_LARGE if request.url.path == "/api/quotes/import" else UPLOAD_TOO_LARGE
+        return JSONResponse(status_code=413, content={"detail": detail})
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -596,6 +1079,86 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    # Listing order and keyset pagination key of GET /quotes
+    await db.quotes.create_index([("created_at", -1), ("id", -1)])
+    await db.quotes.create_index("procedure_key")
+    # Quotes are looked up by id, first for their version alone (conditional GETs)
+    await db.quotes.create_index("id")
+    # Full-text search; the terms are stemmed beforehand, so the index must not stem them again
+    await db.quotes.create_index(
+        [("search_names", "text"), ("search_text", "text")],
+        weights={"search_names": 2, "search_text": 1}, default_language="none", name="quote_text"
+    )
+    # A scan of every quote: once per SEARCH_FIELDS_VERSION, by one worker
+    if await claim_version("search_fields_version", SEARCH_FIELDS_VERSION):
+        await fill_search_fields()
+    await db.procedure_stats.create_index("key", unique=True)
+    # Stats and quotes keyed by an older procedure_key() are rekeyed once, by one worker
+    if await claim_version("procedure_key_version", PROCEDURE_KEY_VERSION):
+        await rebuild_procedure_stats()
+    for catalog in CATALOGS:
+        await db[catalog].create_index("key", unique=True)
+        # Catalogs start from the quotes stored before they existed. Every
+        # worker runs this; only the one that creates the counter rebuilds
+        try:
+            created = (await db.counters.update_one(
+                {"_id": catalog}, {"$setOnInsert": {"value": 0, "updated_at": datetime.now(timezone.utc)}}, upsert=True
+            )).upserted_id is not None
+        except DuplicateKeyError:
+            created = False
+        if created:
+            await rebuild_catalogs([catalog])
+
+@app.on_event("startup")
+async def start_import_jobs():
+    app.state.loop = asyncio.get_running_loop()
+    app.state.import_jobs = ImportJobRunner(ImportJobStore(), save=save_imported_quote)
+    # Jobs a previous run left queued or processing go on without waiting for a new upload
+    await run_in_threadpool(app.state.import_jobs.resume)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+    pdf_work_queue.shutdown()
+    app.state.import_jobs.shutdown()
+
+async def import_quotes_file(path: str, file_format: str, errors_path: str) -> dict:
+    """Import a file from disk, writing its error file to errors_path; returns the import's result"""
+    result = {}
+    with open(path, "rb") as stream, open(errors_path, "w", encoding="utf-8") as errors:
+        async for line in import_quote_lines(stream, file_format):
+            errors.write(line)
+            result = json.loads(line).get("result", result)
+    return result
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Tareas de mantenimiento de la base de datos")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-procedure-stats", help="recalcular las estadísticas por procedimiento")
+    commands.add_parser("rebuild-catalogs", help="recalcular los catálogos de procedimientos y cirujanos")
+    commands.add_parser("fill-search-fields", help="recalcular los términos de búsqueda de las cotizaciones")
+    import_parser = commands.add_parser("import-quotes", help="importar cotizaciones de un archivo CSV o NDJSON")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=list(EXPORT_FORMATS))
+    import_parser.add_argument("--errors", help="filas rechazadas y progreso (por defecto <path>.errors.ndjson)")
+    args = parser.parse_args()
+    if args.command == "import-quotes":
+        try:
+            file_format = import_format(args.path, args.format)
+        except ValueError as e:
+            parser.error(str(e))
+        errors_path = args.errors or f"{args.path}.errors.ndjson"
+        result = asyncio.run(import_quotes_file(args.path, file_format, errors_path))
+        print(f"{result['message']}; {result['rejected']} filas rechazadas (ver {errors_path})")
+    elif args.command == "fill-search-fields":
+        asyncio.run(fill_search_fields())
+        print("Términos de búsqueda recalculados")
+    elif args.command == "rebuild-catalogs":
+        sizes = asyncio.run(rebuild_catalogs())
+        print(f"Catálogos recalculados: {sizes['procedures']} procedimientos, {sizes['surgeons']} cirujanos")
+    else:
+        count = asyncio.run(rebuild_procedure_stats())
+        print(f"Estadísticas recalculadas para {count} procedimientos")
\ No newline at end of file
@@ -0,0 +1,448 @@
+"""Tests of server.py, the FastAPI + MongoDB app, through FastAPI's TestClient.
+
+MongoDB is replaced by mongomock behind a small async adapter shaped like
+the part of Motor that server.py uses. Install requirements-dev.txt and run
+from the repository root::
+
+    python -m pytest tests
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+# server.py and its services read these at import
+_DATA_DIR = tempfile.mkdtemp()
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "zafir_test")
+os.environ.setdefault("IMPORT_JOBS_DIR", os.path.join(_DATA_DIR, "import_jobs"))
+os.environ.setdefault("RESPONSE_CACHE_PATH", os.path.join(_DATA_DIR, "responses.sqlite3"))
+
+import mongomock
+from fastapi.testclient import TestClient
+from pymongo.errors import DuplicateKeyError
+
+import server
+from backend.app.services.pdf_service import PDF_RETRY_AFTER_SECONDS, PDFWorkQueue, spool_to_disk
+from backend.benchmarks.corpus import make_pdf
+
+
+class AsyncCursor:
+    """A mongomock cursor with the async methods of a Motor cursor"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def sort(self, *args):
+        self.cursor = self.cursor.sort(*args)
+        return self
+
+    def skip(self, count):
+        self.cursor = self.cursor.skip(count)
+        return self
+
+    def limit(self, count):
+        self.cursor = self.cursor.limit(count)
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def to_list(self, length):
+        documents = list(self.cursor)
+        return documents if length is None else documents[:length]
+
+    async def __aiter__(self):
+        for document in self.cursor:
+            yield document
+
+
+class AsyncCollection:
+    """A mongomock collection whose methods are coroutines, as Motor's are"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self.collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline):
+        return AsyncCursor(self.collection.aggregate(pipeline))
+
+    async def bulk_write(self, requests, ordered=True):
+        # mongomock's bulk_write does not take the UpdateOne of current pymongo
+        upserted = 0
+        for request in requests:
+            result = self.collection.update_one(request._filter, request._doc, upsert=bool(request._upsert))
+            upserted += result.upserted_id is not None
+        return SimpleNamespace(upserted_count=upserted)
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.database = mongomock.MongoClient().db
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = AsyncCollection(self.database[name])
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+QUOTE = {
+    "procedure_name": "Colecistectomía laparoscópica",
+    "surgeon_name": "Dra. Pérez",
+    "surgery_duration_hours": 2,
+    "anesthesia_type": "General",
+    "facility_fee": 1000.0,
+    "equipment_costs": 200.0,
+    "created_by": "tests",
+}
+
+
+class ServerTestCase(unittest.TestCase):
+    """Runs server.app, startup included, on a fresh in-memory database per test"""
+
+    def setUp(self):
+        self.db = AsyncDatabase()
+        patcher = mock.patch.object(server, "db", self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        server.response_cache.flush_counts()
+        server.response_cache.cache.clear()
+        self.client = self.enterContext(TestClient(server.app))
+
+    def create_quote(self, **fields):
+        resp = self.client.post("/api/quotes", json={**QUOTE, **fields})
+        self.assertEqual(resp.status_code, 200, resp.text)
+        return resp.json()
+
+    def counter(self, name):
+        return (self.db.counters.collection.find_one({"_id": name}) or {}).get("value", 0)
+
+    def stats(self, key):
+        return self.db.procedure_stats.collection.find_one({"key": key}, {"_id": 0})
+
+
+class PDFAdmissionTest(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        # One place, already taken
+        self.queue = PDFWorkQueue(max_workers=1, max_queue=0)
+        self.addCleanup(self.queue.shutdown)
+        self.queue.reserve()
+        patcher = mock.patch.object(server, "pdf_work_queue", self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pdf = make_pdf([["Procedimiento: Apendicectomía", "Duración: 1 horas", "Instalaciones: $9,000"]])
+
+    def assertRefused(self, resp):
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.headers["Retry-After"], str(PDF_RETRY_AFTER_SECONDS))
+        self.assertEqual(self.queue.pending, 1)
+        self.assertEqual(self.db.quotes.collection.count_documents({}), 0)
+
+    def test_upload_is_refused_when_the_queue_is_full(self):
+        spooled = []
+
+        def spool(*args):
+            spooled.append(spool_to_disk(*args))
+            return spooled[-1]
+        with mock.patch.object(server, "spool_to_disk", spool):
+            self.assertRefused(self.client.post("/api/upload-pdf", files={"file": ("q.pdf", self.pdf)}))
+        # The spooled upload is not left behind
+        self.assertFalse(os.path.exists(spooled[0]))
+
+    def test_stream_and_batch_are_refused_when_the_queue_is_full(self):
+        self.assertRefused(self.client.post("/api/upload-pdf/stream", files={"file": ("q.pdf", self.pdf)}))
+        self.assertRefused(self.client.post("/api/upload-pdf/batch", files=[("files", ("a.pdf", self.pdf)), ("files", ("b.pdf", self.pdf))]))
+
+    def test_upload_is_admitted_once_a_place_is_free(self):
+        self.queue.release()
+        resp = self.client.post("/api/upload-pdf", files={"file": ("q.pdf", self.pdf)})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["quotes_created"], 1)
+        self.assertEqual(self.db.quotes.collection.find_one()["facility_fee"], 9000)
+
+
+class ProcedureStatsTest(ServerTestCase):
+    """The optimistic (version compare-and-swap) updates of procedure_stats"""
+
+    def quote(self, total_cost):
+        return server.prepare_for_mongo({**QUOTE, "facility_fee": total_cost, "equipment_costs": 0.0, "total_cost": total_cost})
+
+    def test_update_retries_when_another_writer_got_in_first(self):
+        asyncio.run(server.add_procedure_stats([self.quote(100.0)]))
+        update_one = self.db.procedure_stats.update_one
+        writes = []
+
+        async def racing_update_one(filter, update):
+            if not writes:
+                # Another worker adds its quote between this one's read and write
+                writes.append(filter)
+                await server.add_procedure_stats([self.quote(300.0)])
+            return await update_one(filter, update)
+        with mock.patch.object(self.db.procedure_stats, "update_one", racing_update_one):
+            asyncio.run(server.add_procedure_stats([self.quote(200.0)]))
+
+        stats = self.stats("colecistectomia laparoscopica")
+        self.assertEqual(writes[0]["version"], 1)
+        self.assertEqual((stats["version"], stats["quote_count"], stats["sum_total_cost"]), (3, 3, 600.0))
+        self.assertEqual((stats["min_total_cost"], stats["max_total_cost"]), (100.0, 300.0))
+
+    def test_first_insert_race_falls_back_to_update(self):
+        insert_one = self.db.procedure_stats.insert_one
+        inserts = []
+
+        async def racing_insert_one(document):
+            if not inserts:
+                # Another worker creates the stats document first
+                inserts.append(document)
+                await server.add_procedure_stats([self.quote(300.0)])
+            return await insert_one(document)
+        with mock.patch.object(self.db.procedure_stats, "insert_one", racing_insert_one):
+            asyncio.run(server.add_procedure_stats([self.quote(100.0)]))
+
+        stats = self.stats("colecistectomia laparoscopica")
+        self.assertEqual((stats["version"], stats["quote_count"], stats["sum_total_cost"]), (2, 2, 400.0))
+        with self.assertRaises(DuplicateKeyError):
+            self.db.procedure_stats.collection.insert_one({"key": "colecistectomia laparoscopica"})
+
+    def test_stats_follow_quote_changes(self):
+        cheap = self.create_quote(facility_fee=100.0, equipment_costs=0.0)
+        dear = self.create_quote(facility_fee=300.0, equipment_costs=50.0)
+        stats = self.stats("colecistectomia laparoscopica")
+        self.assertEqual((stats["quote_count"], stats["min_total_cost"], stats["max_total_cost"]), (2, 100.0, 350.0))
+
+        self.client.delete(f"/api/quotes/{cheap['id']}")
+        self.assertEqual(self.stats("colecistectomia laparoscopica")["min_total_cost"], 350.0)
+
+        self.client.put(f"/api/quotes/{dear['id']}", json={**QUOTE, "procedure_name": "Apendicectomía"})
+        self.assertIsNone(self.stats("colecistectomia laparoscopica"))
+        self.assertEqual(self.stats("apendicectomia")["quote_count"], 1)
+        resp = self.client.get("/api/pricing-suggestions/apendicectomia")
+        self.assertEqual((resp.json()["quote_count"], resp.json()["match"]), (1, "exact"))
+
+
+class CountersTest(ServerTestCase):
+    def counters(self):
+        return tuple(self.counter(name) for name in ("quotes", "procedures", "surgeons"))
+
+    def test_writes_bump_the_counters(self):
+        # Startup builds the catalogs and stats, which counts as a change
+        quotes, procedures, surgeons = self.counters()
+        quote = self.create_quote()
+        self.assertEqual(self.counters(), (quotes + 1, procedures + 1, surgeons + 1))
+        self.create_quote()
+        # The catalogs only change when an entry is added or removed
+        self.assertEqual(self.counters(), (quotes + 2, procedures + 1, surgeons + 1))
+        self.assertEqual(self.db.procedures.collection.find_one({}, {"_id": 0}), {
+            "key": "colecistectomia laparoscopica", "name": "Colecistectomía laparoscópica", "quote_count": 2,
+        })
+
+        self.client.put(f"/api/quotes/{quote['id']}", json={**QUOTE, "surgeon_name": "Dr. Gómez"})
+        self.assertEqual(self.counters(), (quotes + 3, procedures + 1, surgeons + 2))
+        self.assertEqual(self.client.get("/api/surgeons").json(), {"surgeons": ["Dr. Gómez", "Dra. Pérez"]})
+        self.assertEqual(self.client.get("/api/surgeons", params={"prefix": "dr. g"}).json(), {"surgeons": ["Dr. Gómez"]})
+
+        self.client.delete(f"/api/quotes/{quote['id']}")
+        self.assertEqual(self.counters(), (quotes + 4, procedures + 1, surgeons + 3))
+        self.assertEqual(self.client.get("/api/surgeons").json(), {"surgeons": ["Dra. Pérez"]})
+
+    def test_conditional_get_follows_the_quotes_counter(self):
+        quote = self.create_quote()
+        resp = self.client.get("/api/quotes")
+        etag = resp.headers["ETag"]
+        self.assertEqual(self.client.get("/api/quotes", headers={"If-None-Match": etag}).status_code, 304)
+
+        detail = self.client.get(f"/api/quotes/{quote['id']}")
+        self.assertEqual(self.client.get(f"/api/quotes/{quote['id']}", headers={"If-None-Match": detail.headers["ETag"]}).status_code, 304)
+
+        self.client.put(f"/api/quotes/{quote['id']}", json={**QUOTE, "notes": "Cambiada"})
+        resp = self.client.get("/api/quotes", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()[0]["notes"], "Cambiada")
+        resp = self.client.get(f"/api/quotes/{quote['id']}", headers={"If-None-Match": detail.headers["ETag"]})
+        self.assertEqual((resp.status_code, resp.json()["version"]), (200, 1))
+
+
+class PaginationTest(ServerTestCase):
+    def test_pages_cover_every_quote_once(self):
+        self.client.post("/api/quotes/bulk", json=[{**QUOTE, "notes": str(n)} for n in range(7)])
+        # Ties on created_at are broken by id
+        self.db.quotes.collection.update_many({"notes": {"$in": ["2", "3", "4"]}}, {"$set": {"created_at": "2024-01-01T00:00:00+00:00"}})
+        expected = [quote["id"] for quote in self.client.get("/api/quotes").json()]
+
+        seen = []
+        params = {"limit": "3"}
+        while True:
+            page = self.client.get("/api/quotes", params=params).json()
+            seen.extend(quote["id"] for quote in page["results"])
+            if not page["next_cursor"]:
+                break
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 7)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/quotes", params={"cursor": "nope"}).status_code, 400)
+
+
+class BulkCreateTest(ServerTestCase):
+    def test_valid_quotes_are_created_and_invalid_ones_reported(self):
+        resp = self.client.post("/api/quotes/bulk", json=[QUOTE, {**QUOTE, "facility_fee": "mucho"}, QUOTE])
+        self.assertEqual(resp.status_code, 201)
+        body = resp.json()
+        self.assertEqual(body["quotes_created"], 2)
+        self.assertEqual([(error["index"], list(error["errors"])) for error in body["errors"]], [(1, ["facility_fee"])])
+        self.assertEqual(self.db.quotes.collection.count_documents({}), 2)
+        self.assertEqual(self.stats("colecistectomia laparoscopica")["quote_count"], 2)
+        self.assertEqual(self.counter("quotes"), 1)
+
+    def test_nothing_valid(self):
+        resp = self.client.post("/api/quotes/bulk", json=[{"procedure_name": "Apendicectomía"}])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["quotes_created"], 0)
+
+    def test_too_many_quotes(self):
+        with mock.patch.object(server, "BULK_MAX_QUOTES", 2):
+            resp = self.client.post("/api/quotes/bulk", json=[QUOTE] * 3)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.db.quotes.collection.count_documents({}), 0)
+
+
+class ExportImportTest(ServerTestCase):
+    def import_lines(self, name, content):
+        resp = self.client.post("/api/quotes/import", files={"file": (name, content)})
+        self.assertEqual(resp.status_code, 200)
+        return [json.loads(line) for line in resp.text.splitlines()]
+
+    def test_export_imports_back(self):
+        first = self.create_quote(procedure_name="Apendicectomía")
+        second = self.create_quote()
+        resp = self.client.get("/api/quotes/export")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("attachment", resp.headers["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(resp.content.decode("utf-8-sig"))))
+        self.assertEqual([row["id"] for row in rows], [second["id"], first["id"]])
+
+        filtered = self.client.get("/api/quotes/export", params={"format": "ndjson", "procedure_name": "apendi"})
+        self.assertEqual([json.loads(line)["id"] for line in filtered.text.splitlines()], [first["id"]])
+
+        with mock.patch.object(server, "db", AsyncDatabase()) as other:
+            lines = self.import_lines("quotes.csv", resp.content)
+            self.assertEqual(lines[-1]["result"]["quotes_created"], 2)
+            imported = other.quotes.collection.find_one({"id": first["id"]})
+            self.assertEqual(imported["procedure_name"], first["procedure_name"])
+            self.assertEqual(datetime.fromisoformat(imported["created_at"]), datetime.fromisoformat(first["created_at"]))
+            self.assertEqual(other.procedure_stats.collection.count_documents({}), 2)
+
+    def test_rejected_rows_are_reported(self):
+        taken = self.create_quote()
+        records = [{**QUOTE, "id": taken["id"]}, {**QUOTE, "facility_fee": "mucho"}, QUOTE]
+        lines = self.import_lines("quotes.ndjson", "".join(json.dumps(record) + "\n" for record in records).encode())
+        rejected = sorted((line["row"], list(line["errors"])) for line in lines if "row" in line)
+        self.assertEqual(rejected, [(1, ["id"]), (2, ["facility_fee"])])
+        self.assertEqual(lines[-1]["result"], {
+            "success": True, "message": "1 de 3 cotizaciones importadas", "rows": 3, "quotes_created": 1, "rejected": 2,
+        })
+        self.assertEqual(self.db.quotes.collection.count_documents({}), 2)
+
+
+class StartupTest(ServerTestCase):
+    """One-off startup work runs in one worker only, however many start together"""
+
+    def start_workers(self, count=2):
+        async def start():
+            await asyncio.gather(*(server.create_indexes() for _ in range(count)))
+        asyncio.run(start())
+
+    def test_catalogs_are_built_once(self):
+        # Quotes stored before the catalogs existed
+        self.db.quotes.collection.insert_many([
+            server.prepare_for_mongo({**QUOTE, "id": str(n), "total_cost": 1200.0}) for n in range(3)
+        ])
+        for catalog in server.CATALOGS:
+            self.db[catalog].collection.delete_many({})
+            self.db.counters.collection.delete_one({"_id": catalog})
+        with mock.patch.object(server, "rebuild_catalogs", wraps=server.rebuild_catalogs) as rebuild:
+            self.start_workers()
+        self.assertEqual(sorted(call.args[0][0] for call in rebuild.call_args_list), ["procedures", "surgeons"])
+        self.assertEqual(self.db.procedures.collection.find_one({}, {"_id": 0})["quote_count"], 3)
+        self.assertEqual(self.client.get("/api/surgeons").json(), {"surgeons": ["Dra. Pérez"]})
+
+    def test_procedure_stats_are_rekeyed_once(self):
+        quote = self.create_quote()
+        # Stats and quotes of an older procedure_key()
+        self.db.quotes.collection.update_one({"id": quote["id"]}, {"$set": {"procedure_key": "old"}})
+        self.db.procedure_stats.collection.update_one({}, {"$set": {"key": "old"}})
+        self.db.counters.collection.update_one({"_id": "procedure_key_version"}, {"$set": {"value": server.PROCEDURE_KEY_VERSION - 1}})
+        with mock.patch.object(server, "rebuild_procedure_stats", wraps=server.rebuild_procedure_stats) as rebuild:
+            self.start_workers()
+        self.assertEqual(rebuild.call_count, 1)
+        self.assertEqual(self.counter("procedure_key_version"), server.PROCEDURE_KEY_VERSION)
+        self.assertEqual([stats["key"] for stats in self.db.procedure_stats.collection.find()], ["colecistectomia laparoscopica"])
+        self.assertEqual(self.db.quotes.collection.find_one()["procedure_key"], "colecistectomia laparoscopica")
+
+    def test_search_fields_are_filled_once(self):
+        # A quote stored before full-text search
+        self.db.quotes.collection.insert_one(server.prepare_for_mongo({**QUOTE, "id": "old", "total_cost": 1200.0}))
+        self.db.quotes.collection.update_one({"id": "old"}, {"$unset": {"search_names": "", "search_text": ""}})
+        self.db.counters.collection.delete_one({"_id": "search_fields_version"})
+        with mock.patch.object(server, "fill_search_fields", wraps=server.fill_search_fields) as fill:
+            self.start_workers()
+            self.assertEqual(fill.call_count, 1)
+            self.assertIn("colecistectom", self.db.quotes.collection.find_one({"id": "old"})["search_names"])
+            # Later startups skip the scan
+            self.start_workers()
+            self.assertEqual(fill.call_count, 1)
+
+    def test_claim_version(self):
+        async def claims():
+            return [await server.claim_version("upgrade", 2), await server.claim_version("upgrade", 2), await server.claim_version("upgrade", 3)]
+        self.assertEqual(asyncio.run(claims()), [True, False, True])
+
+
+class SearchTest(ServerTestCase):
+    def test_text_index(self):
+        index = self.db.quotes.collection.index_information()["quote_text"]
+        self.assertEqual(index["key"], [("search_names", "text"), ("search_text", "text")])
+
+    def test_search_asks_the_text_index_for_every_term(self):
+        quote = self.create_quote(notes="Paciente con cálculos biliares")
+        stored = self.db.quotes.collection.find_one({"id": quote["id"]})
+        self.assertIn("colecistectom", stored["search_names"])
+
+        # mongomock has no $text: serve what the index would find and check the query
+        found = AsyncCursor(self.db.quotes.collection.find({"id": quote["id"]}))
+        with mock.patch.object(found, "sort", return_value=found), \
+                mock.patch.object(self.db.quotes, "find", return_value=found) as find:
+            resp = self.client.get("/api/quotes/search", params={"q": "colecistectomía biliares", "limit": "5"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([result["id"] for result in resp.json()["results"]], [quote["id"]])
+        query, projection = find.call_args.args
+        self.assertEqual(query["$text"]["$search"].count('"'), 4)
+        self.assertEqual(projection, {"score": {"$meta": "textScore"}})
+
+    def test_empty_query(self):
+        self.assertEqual(self.client.get("/api/quotes/search", params={"q": " "}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()